@@ -73,6 +73,10 @@ document.addEventListener('DOMContentLoaded', () => {
         
         // 3. ¡IMPORTANTE! Movemos el listener de los <select> al modal
         habModal.addEventListener('change', manejarCambioEstadoHabitacion);
+
+        // Un solo PUT con todos los cambios marcados
+        document.getElementById('btn-guardar-estados')
+            .addEventListener('click', guardarEstadosHabitaciones);
     }
     if (closeHabModalBtn) {
         // Cierra el modal con el botón X
@@ -413,21 +417,60 @@ function manejarClickPanelHabitacion(e) {
     popularYAbrirModalHabitaciones(tipoId, tipoNombre);
 }
 
-// 5. Llama a la API para ACTUALIZAR el estado (igual que antes)
-async function manejarCambioEstadoHabitacion(e) {
-    // Verificar que el evento vino de nuestro select
+// 5. Los cambios de estado quedan pendientes (marcados) hasta "Guardar cambios"
+function manejarCambioEstadoHabitacion(e) {
+    // "Cambiar todas a...": aplica el estado a todas las habitaciones del modal
+    if (e.target.id === 'estado-todas-select') {
+        const estado = e.target.value;
+        if (!estado) return;
+        document.querySelectorAll('#modal-habitaciones-lista .estado-habitacion-select').forEach(select => {
+            select.value = estado;
+            marcarCambioPendiente(select);
+        });
+        e.target.value = '';
+        actualizarBotonGuardarEstados();
+        return;
+    }
+
+    // Verificar que el evento vino de uno de nuestros select
     if (!e.target.classList.contains('estado-habitacion-select')) {
         return;
     }
 
-    const select = e.target;
-    const habitacionId = select.dataset.id;
-    const nuevoEstado = select.value;
-    
-    select.disabled = true;
-    
+    marcarCambioPendiente(e.target);
+    actualizarBotonGuardarEstados();
+}
+
+// Resalta la habitación si su estado elegido difiere del guardado
+function marcarCambioPendiente(select) {
+    const habitacion = todasLasHabitaciones.find(h => h.id === parseInt(select.dataset.id));
+    const pendiente = habitacion && habitacion.estado !== select.value;
+    select.closest('.habitacion-item').classList.toggle('pendiente', pendiente);
+}
+
+function obtenerCambiosPendientes() {
+    return Array.from(document.querySelectorAll('#modal-habitaciones-lista .habitacion-item.pendiente select'))
+        .map(select => ({ habitacion_id: parseInt(select.dataset.id), estado: select.value }));
+}
+
+function actualizarBotonGuardarEstados() {
+    const cantidad = obtenerCambiosPendientes().length;
+    const boton = document.getElementById('btn-guardar-estados');
+    boton.disabled = cantidad === 0;
+    boton.textContent = cantidad > 0 ? `Guardar cambios (${cantidad})` : 'Guardar cambios';
+}
+
+// Envía todos los cambios pendientes en UNA petición al endpoint por lotes.
+// El servidor aplica todos o ninguno.
+async function guardarEstadosHabitaciones() {
+    const cambios = obtenerCambiosPendientes();
+    if (cambios.length === 0) return;
+
+    const boton = document.getElementById('btn-guardar-estados');
+    boton.disabled = true;
+
     const token = localStorage.getItem('adminToken');
-    const url = `${API_BASE_URL}/admin/habitaciones/${habitacionId}/estado`;
+    const url = `${API_BASE_URL}/admin/habitaciones/estado`;
 
     try {
         const response = await fetch(url, {
@@ -436,36 +479,35 @@ async function manejarCambioEstadoHabitacion(e) {
                 'Content-Type': 'application/json',
                 'Authorization': `Bearer ${token}`
             },
-            body: JSON.stringify({ estado: nuevoEstado }) 
+            body: JSON.stringify({ cambios: cambios })
         });
 
         if (!response.ok) {
-            throw new Error('No se pudo actualizar el estado.');
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.detail || 'No se pudieron actualizar los estados.');
         }
 
-        const habitacionActualizada = await response.json();
-        console.log('Estado actualizado:', habitacionActualizada);
-        
+        const habitacionesActualizadas = await response.json();
+        console.log('Estados actualizados:', habitacionesActualizadas);
+
         // Actualizar la lista global
-        const index = todasLasHabitaciones.findIndex(h => h.id === habitacionActualizada.id);
-        if (index !== -1) {
-            todasLasHabitaciones[index] = habitacionActualizada;
-        }
-        
-        select.disabled = false;
-        
+        habitacionesActualizadas.forEach(actualizada => {
+            const index = todasLasHabitaciones.findIndex(h => h.id === actualizada.id);
+            if (index !== -1) {
+                todasLasHabitaciones[index] = actualizada;
+            }
+        });
+
+        document.querySelectorAll('#modal-habitaciones-lista .habitacion-item.pendiente')
+            .forEach(item => item.classList.remove('pendiente'));
+
     } catch (error) {
-        console.error('Error actualizando estado:', error);
-        alert('Error al guardar. El estado anterior será restaurado.');
-        
-        // Limpiamos la caché de habitaciones
-        todasLasHabitaciones = []; 
-        // Volvemos a cargar los datos (esto restaurará los títulos)
-        cargarYAlmacenarHabitaciones();
-        
-        // Cerramos el modal
-        document.getElementById('habitaciones-tipo-modal').classList.add('hidden');
+        console.error('Error actualizando estados:', error);
+        // No se guardó ninguno: los cambios siguen marcados para reintentar
+        alert(`Error al guardar: ${error.message}`);
     }
+
+    actualizarBotonGuardarEstados();
 }
 
 // 6. NUEVA FUNCIÓN: Arma el HTML del modal y lo muestra
@@ -502,6 +544,7 @@ function popularYAbrirModalHabitaciones(tipoId, tipoNombre) {
         });
     }
     
+    actualizarBotonGuardarEstados();
     modal.classList.remove('hidden'); // Muestra el modal
 }
 // ==================================================
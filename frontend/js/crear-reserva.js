@@ -15,6 +15,15 @@ document.addEventListener('DOMContentLoaded', () => {
     const roomTypeSelect = document.getElementById('room-type-select');
     const guestsInput = document.getElementById('guests');
 
+    // Si el perfil ya trajo el catálogo de tipos, lo usamos en lugar de las opciones fijas
+    const tiposGuardados = localStorage.getItem('tiposHabitacion');
+    if (roomTypeSelect && tiposGuardados) {
+        const tipos = JSON.parse(tiposGuardados);
+        roomTypeSelect.innerHTML = '<option value="">Seleccione un tipo...</option>' + tipos.map(tipo =>
+            `<option value="${tipo.id}" data-capacity="${tipo.capacidad_maxima}">${tipo.nombre_tipo} (Máx. ${tipo.capacidad_maxima})</option>`
+        ).join('');
+    }
+
     if (roomTypeSelect && guestsInput) {
         
         // 2. Creamos un 'listener' para el selector de habitación
@@ -38,22 +47,101 @@ document.addEventListener('DOMContentLoaded', () => {
             }
         });
     }
+
+    // Al completar los datos se aparta una habitación por unos minutos,
+    // así no se la lleva otro mientras el cliente confirma
+    ['room-type-select', 'checkin', 'checkout', 'guests'].forEach(id => {
+        const campo = document.getElementById(id);
+        // En fila: dos cambios seguidos no dejan una retención huérfana
+        if (campo) campo.addEventListener('change', () => { colaRetencion = colaRetencion.then(retenerHabitacion); });
+    });
+    window.addEventListener('pagehide', () => {
+        if (retencionActual) {
+            fetch(`${API_BASE_URL}/reservas/retenciones/${retencionActual.id}`, {
+                method: 'DELETE',
+                headers: { 'Authorization': `Bearer ${localStorage.getItem('userToken')}` },
+                keepalive: true
+            });
+        }
+    });
 });
 
 
-// (CONECTAR API) Maneja la creación de una nueva reserva
-async function manejarNuevaReserva(e) { 
-    e.preventDefault();
-    const token = localStorage.getItem('userToken');
+// Retención vigente para los datos del formulario (o null)
+let retencionActual = null;
+let colaRetencion = Promise.resolve();
 
-    const data = {
+function datosFormulario() {
+    return {
         tipo_habitacion_id: parseInt(document.getElementById('room-type-select').value),
         fecha_checkin: document.getElementById('checkin').value,
         fecha_checkout: document.getElementById('checkout').value,
         total_personas: parseInt(document.getElementById('guests').value),
     };
+}
+
+// Suelta la retención anterior y pide una nueva con los datos actuales
+async function retenerHabitacion() {
+    const token = localStorage.getItem('userToken');
+    const data = datosFormulario();
+
+    try {
+        if (retencionActual) {
+            const anterior = retencionActual;
+            retencionActual = null;
+            await fetch(`${API_BASE_URL}/reservas/retenciones/${anterior.id}`, {
+                method: 'DELETE',
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
+        }
+        if (!data.tipo_habitacion_id || !data.fecha_checkin || !data.fecha_checkout || !data.total_personas) {
+            return;
+        }
+
+        const response = await fetch(`${API_BASE_URL}/reservas/retenciones`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${token}`
+            },
+            body: JSON.stringify(data)
+        });
+        // Si no se pudo (ej: sin disponibilidad) el envío del formulario lo informa
+        if (response.ok) {
+            retencionActual = await response.json();
+        }
+    } catch (error) {
+        console.error('Error reteniendo habitación:', error);
+    }
+}
+
 
+// (CONECTAR API) Maneja la creación de una nueva reserva
+async function manejarNuevaReserva(e) { 
+    e.preventDefault();
+    const token = localStorage.getItem('userToken');
+
+    const data = datosFormulario();
+
+    await colaRetencion;
     try {
+        // Con una retención vigente se confirma esa habitación directamente
+        if (retencionActual) {
+            const retencion = retencionActual;
+            retencionActual = null;
+            const confirmada = await fetch(`${API_BASE_URL}/reservas/retenciones/${retencion.id}/confirmar`, {
+                method: 'POST',
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
+            if (confirmada.ok) {
+                const nuevaReserva = await confirmada.json();
+                alert(`¡Reserva ${nuevaReserva.id} creada con éxito!`);
+                window.location.href = 'profile.html';
+                return;
+            }
+            // Venció: se intenta una reserva normal
+        }
+
         // CONECTAR API 
         // Endpoint: /reservas/ (POST)
         const response = await fetch(`${API_BASE_URL}/reservas/`, {
@@ -49,9 +49,9 @@ document.addEventListener('DOMContentLoaded', () => {
         return; 
     }
 
-    // Cargar datos
+    // Cargar datos (usuario + reservas + tipos en una sola petición)
     cargarDatosUsuario(); 
-    cargarReservasUsuario(); 
+    cargarInicioPerfil(); 
     
     // Listeners de formularios de perfil
     const editForm = document.getElementById('edit-profile-form');
@@ -88,11 +88,35 @@ function cargarDatosUsuario() {
 }
 
 
-// (CONECTAR API) Carga las reservas del usuario logueado
+// (CONECTAR API) Carga todo lo de la página de perfil con una sola petición
+async function cargarInicioPerfil() { 
+    const token = localStorage.getItem('userToken');
+    
+    try {
+        // Endpoint: /clientes/yo/inicio
+        const response = await fetch(`${API_BASE_URL}/clientes/yo/inicio`, { 
+            method: 'GET',
+            headers: { 'Authorization': `Bearer ${token}` }
+        });
+
+        if (response.ok) {
+            const inicio = await response.json();
+            localStorage.setItem('user', JSON.stringify(inicio.cliente));
+            localStorage.setItem('tiposHabitacion', JSON.stringify(inicio.tipos_habitacion));
+            cargarDatosUsuario();
+            mostrarReservas(inicio.reservas);
+        } else {
+            alert('No se pudieron cargar tus datos.');
+        }
+    } catch (error) {
+        console.error('Error cargando el perfil:', error);
+    }
+}
+
+
+// (CONECTAR API) Vuelve a cargar solo las reservas (después de modificar/cancelar)
 async function cargarReservasUsuario() { 
     const token = localStorage.getItem('userToken');
-    const tableBody = document.querySelector('#reservations-list tbody');
-    const noReservationsMsg = document.getElementById('no-reservations-msg');
     
     try {
         // Endpoint: /reservas/mis_reservas
@@ -102,46 +126,7 @@ async function cargarReservasUsuario() {
         });
 
         if (response.ok) {
-            const reservas = await response.json();
-            tableBody.innerHTML = '';
-
-            if (reservas.length === 0) {
-                noReservationsMsg.classList.remove('hidden');
-            } else {
-                noReservationsMsg.classList.add('hidden');
-                reservas.forEach(reserva => {
-                    
-                    let actionButtonsHtml = ''; 
-
-                    // Comprobar si la reserva NO está cancelada
-                    if (reserva.estado_reserva !== 'Cancelada') {
-                        
-                        actionButtonsHtml = `
-                        <td>
-                            <button class="btn btn-small btn-modify" data-id="${reserva.id}">
-                                <img src="img/edit-icon.png" alt="Modificar Reserva">
-                            </button>
-                            <button class="btn btn-small btn-danger" data-id="${reserva.id}">
-                                <img src="img/cancel-icon.png" alt="Cancelar Reserva">
-                            </button>
-                        </td>
-                        `;
-                    } else {
-                        // (Modificación de la respuesta anterior, para que la celda quede vacía)
-                        actionButtonsHtml = '<td> </td>'; 
-                    }
-                    const row = `
-                        <tr>
-                            <td>Habitación #${reserva.habitacion.numero} (${reserva.habitacion.tipo.nombre_tipo})</td>
-                            <td>${reserva.fecha_checkin}</td>
-                            <td>${reserva.fecha_checkout}</td>
-                            <td>${reserva.estado_reserva}</td>
-                            ${actionButtonsHtml} 
-                        </tr>
-                    `;
-                    tableBody.innerHTML += row;
-                });
-            }
+            mostrarReservas(await response.json());
         } else {
             alert('No se pudieron cargar tus reservas.');
         }
@@ -151,6 +136,52 @@ async function cargarReservasUsuario() {
 }
 
 
+// Dibuja la tabla de reservas
+function mostrarReservas(reservas) { 
+    const tableBody = document.querySelector('#reservations-list tbody');
+    const noReservationsMsg = document.getElementById('no-reservations-msg');
+    tableBody.innerHTML = '';
+
+    if (reservas.length === 0) {
+        noReservationsMsg.classList.remove('hidden');
+    } else {
+        noReservationsMsg.classList.add('hidden');
+        reservas.forEach(reserva => {
+            
+            let actionButtonsHtml = ''; 
+
+            // Comprobar si la reserva NO está cancelada
+            if (reserva.estado_reserva !== 'Cancelada') {
+                
+                actionButtonsHtml = `
+                <td>
+                    <button class="btn btn-small btn-modify" data-id="${reserva.id}">
+                        <img src="img/edit-icon.png" alt="Modificar Reserva">
+                    </button>
+                    <button class="btn btn-small btn-danger" data-id="${reserva.id}">
+                        <img src="img/cancel-icon.png" alt="Cancelar Reserva">
+                    </button>
+                </td>
+                `;
+            } else {
+                // (Modificación de la respuesta anterior, para que la celda quede vacía)
+                actionButtonsHtml = '<td> </td>'; 
+            }
+            const row = `
+                <tr>
+                    <td>Habitación #${reserva.habitacion.numero} (${reserva.habitacion.tipo.nombre_tipo})</td>
+                    <td>${reserva.fecha_checkin}</td>
+                    <td>${reserva.fecha_checkout}</td>
+                    <td>${reserva.estado_reserva}</td>
+                    ${actionButtonsHtml} 
+                </tr>
+            `;
+            tableBody.innerHTML += row;
+        });
+    }
+}
+
+
 // (CONECTAR API) Maneja la actualización de datos del cliente
 async function manejarEditarPerfil(e) { 
     e.preventDefault();
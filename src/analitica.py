@@ -0,0 +1,214 @@
+import threading
+
+import numpy as np
+
+from .database import db
+from .cache import al_olvidar_base
+from .models import Reserva, ReservaHistorico, Habitacion, CambioReserva
+from .services.analitica_services import MARCA_RECARGA_COMPLETA
+
+
+# ==============================================================================
+# ALMACÉN COLUMNAR DE RESERVAS (PARA REPORTES AGREGADOS)
+# ==============================================================================
+
+# Código numérico de cada estado (int8). BORRADA marca una fila que ya no
+# existe ni en 'reservas' ni en 'reservas_historico'.
+CODIGOS_ESTADO = {'Confirmada': 0, 'En curso': 1, 'Finalizada': 2, 'Cancelada': 3}
+CANCELADA = CODIGOS_ESTADO['Cancelada']
+BORRADA = -1
+SIN_FECHA = -1
+
+CAPACIDAD_INICIAL = 1024
+
+# (nombre de columna, dtype). Unos 40 bytes por reserva en total.
+COLUMNAS = (
+    ('id', np.int64),
+    ('checkin', np.int32),      # date.toordinal()
+    ('checkout', np.int32),
+    ('creada', np.int32),       # ordinal de creada_en, o SIN_FECHA
+    ('habitacion', np.int32),
+    ('tipo', np.int32),
+    ('estado', np.int8),
+    ('personas', np.int16),
+    ('costo', np.int64),
+)
+
+
+def _consulta_filas(modelo, ids=None):
+    consulta = (modelo
+                .select(modelo.id, modelo.fecha_checkin, modelo.fecha_checkout, modelo.creada_en,
+                        modelo.habitacion, Habitacion.tipo, modelo.estado_reserva,
+                        modelo.total_personas, modelo.costo_total)
+                .join(Habitacion, on=(modelo.habitacion == Habitacion.id)))
+    if ids is not None:
+        consulta = consulta.where(modelo.id.in_(ids))
+    return consulta.tuples()
+
+
+def _fila_a_columnas(fila):
+    id_, checkin, checkout, creada, habitacion, tipo, estado, personas, costo = fila
+    return (
+        id_, checkin.toordinal(), checkout.toordinal(),
+        creada.toordinal() if creada else SIN_FECHA,
+        habitacion, tipo, CODIGOS_ESTADO.get(estado, CANCELADA),
+        personas, costo or 0,
+    )
+
+
+class AlmacenReservas:
+    """
+    Copia en memoria de todas las reservas (activas y archivadas) como
+    arrays de NumPy, una columna por campo, ordenadas por id.
+
+    Se refresca de forma incremental con 'reservas_cambios': solo se releen
+    las reservas cuyo id aparece después del último 'seq' aplicado. Si el
+    registro ya fue podado más allá de ese punto, o aparece la
+    MARCA_RECARGA_COMPLETA, se recarga todo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cantidad = 0
+        self.ultimo_seq = None
+        self.columnas = {nombre: np.empty(CAPACIDAD_INICIAL, dtype=tipo) for nombre, tipo in COLUMNAS}
+
+    def vista(self):
+        """Devuelve las columnas recortadas a las filas válidas (sin copiar)."""
+        return {nombre: columna[:self.cantidad] for nombre, columna in self.columnas.items()}
+
+    def _asegurar_capacidad(self, necesaria: int):
+        capacidad = len(self.columnas['id'])
+        if necesaria <= capacidad:
+            return
+        while capacidad < necesaria:
+            capacidad *= 2
+        for nombre, columna in self.columnas.items():
+            nueva = np.empty(capacidad, dtype=columna.dtype)
+            nueva[:self.cantidad] = columna[:self.cantidad]
+            self.columnas[nombre] = nueva
+
+    def _cargar_todo(self):
+        filas = [_fila_a_columnas(f) for modelo in (Reserva, ReservaHistorico) for f in _consulta_filas(modelo)]
+        filas.sort()
+        self.cantidad = 0
+        self._asegurar_capacidad(len(filas))
+        if filas:
+            valores = list(zip(*filas))
+            for (nombre, tipo), columna in zip(COLUMNAS, valores):
+                self.columnas[nombre][:len(filas)] = np.fromiter(columna, dtype=tipo, count=len(filas))
+        self.cantidad = len(filas)
+
+    def _aplicar(self, ids):
+        """Relee las reservas 'ids' y actualiza/agrega/marca como borradas sus filas."""
+        filas = []
+        for modelo in (Reserva, ReservaHistorico):
+            for inicio in range(0, len(ids), 500):
+                filas += [_fila_a_columnas(f) for f in _consulta_filas(modelo, ids[inicio:inicio + 500])]
+        filas.sort()
+
+        n = self.cantidad
+        ids_actuales = self.columnas['id'][:n]
+
+        # Las que ya no están en ninguna tabla quedan marcadas como borradas
+        vigentes = {fila[0] for fila in filas}
+        borradas = np.array([i for i in ids if i not in vigentes], dtype=np.int64)
+        if len(borradas) and n:
+            posiciones = np.searchsorted(ids_actuales, borradas)
+            posiciones = posiciones[posiciones < n]
+            posiciones = posiciones[np.isin(ids_actuales[posiciones], borradas)]
+            self.columnas['estado'][posiciones] = BORRADA
+        if not filas:
+            return
+
+        valores = {nombre: np.fromiter(columna, dtype=tipo, count=len(filas))
+                   for (nombre, tipo), columna in zip(COLUMNAS, zip(*filas))}
+        posiciones = np.searchsorted(ids_actuales, valores['id'])
+        existe = posiciones < n
+        existe[existe] = ids_actuales[posiciones[existe]] == valores['id'][existe]
+
+        # Reservas ya conocidas: se sobrescriben en su lugar
+        for nombre, columna in valores.items():
+            self.columnas[nombre][posiciones[existe]] = columna[existe]
+
+        # Nuevas: se agregan al final (lo normal, porque el id es el más alto)
+        nuevas = ~existe
+        cantidad_nuevas = int(nuevas.sum())
+        if not cantidad_nuevas:
+            return
+        self._asegurar_capacidad(n + cantidad_nuevas)
+        for nombre, columna in valores.items():
+            self.columnas[nombre][n:n + cantidad_nuevas] = columna[nuevas]
+        self.cantidad = n + cantidad_nuevas
+
+        # Un id menor que el último conocido obliga a reordenar (caso raro)
+        ids_todos = self.columnas['id'][:self.cantidad]
+        if n and ids_todos[n] < ids_todos[n - 1]:
+            orden = np.argsort(ids_todos)
+            for nombre, columna in self.columnas.items():
+                columna[:self.cantidad] = columna[:self.cantidad][orden]
+
+    def refrescar(self):
+        """Trae los cambios pendientes. Devuelve la cantidad de reservas releídas."""
+        # Todo se lee dentro de una transacción: una sola foto de la BD, así
+        # una reserva que se está archivando no aparece en ninguna (o en las
+        # dos) tablas. Lo que se confirme después entra en el próximo refresco.
+        with self._lock, db.atomic():
+            ultimo = db.execute_sql(
+                "SELECT seq FROM sqlite_sequence WHERE name = ?", (CambioReserva._meta.table_name,)
+            ).fetchone()
+            ultimo = ultimo[0] if ultimo else 0
+
+            if self.ultimo_seq is not None and ultimo == self.ultimo_seq:
+                return 0
+
+            primero = CambioReserva.select(CambioReserva.seq).order_by(CambioReserva.seq).limit(1).scalar()
+            podado = self.ultimo_seq is not None and (primero or ultimo + 1) > self.ultimo_seq + 1
+            if self.ultimo_seq is None or podado:
+                self._cargar_todo()
+                self.ultimo_seq = ultimo
+                return self.cantidad
+
+            ids = [fila[0] for fila in (CambioReserva
+                                        .select(CambioReserva.reserva_id)
+                                        .where((CambioReserva.seq > self.ultimo_seq) &
+                                               (CambioReserva.seq <= ultimo))
+                                        .distinct()
+                                        .tuples())]
+            if MARCA_RECARGA_COMPLETA in ids:
+                # Una carga masiva (ej: importación) que no registró cada reserva
+                self._cargar_todo()
+                self.ultimo_seq = ultimo
+                return self.cantidad
+            self._aplicar(ids)
+            self.ultimo_seq = ultimo
+            return len(ids)
+
+
+# Un almacén por archivo de BD (uno por hotel), como las caches
+_almacenes = {}
+_lock_almacenes = threading.Lock()
+
+
+def consultar_almacen(funcion):
+    """
+    Aplica los cambios pendientes al almacén de la BD actual y llama a
+    funcion(columnas). Las reservas borradas siguen en los arrays con
+    estado BORRADA (no se copia nada para excluirlas).
+    Mientras corre, ningún otro hilo modifica los arrays.
+    """
+    with _lock_almacenes:
+        almacen = _almacenes.get(db.database)
+        if almacen is None:
+            almacen = _almacenes[db.database] = AlmacenReservas()
+    almacen.refrescar()
+    with almacen._lock:
+        return funcion(almacen.vista())
+
+
+def olvidar_almacen(ruta: str):
+    with _lock_almacenes:
+        _almacenes.pop(ruta, None)
+
+
+al_olvidar_base(olvidar_almacen)
@@ -1,37 +1,95 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, FileResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pydantic import BaseModel, EmailStr
-from jose import JWTError, jwt
+from pydantic import BaseModel, EmailStr, Json, Field
 from datetime import datetime, timedelta, date
-from typing import Optional, List
-from werkzeug.security import generate_password_hash
-from .database import db
-from .models import Cliente, TipoHabitacion, Habitacion, Reserva, Admin
+from typing import Optional, List, Union
+from .database import db, hotel_actual
+from .models import Cliente, TipoHabitacion, Habitacion, Reserva, ReservaHistorico, BloqueoHabitacion, ListaEspera, Admin, LeaseTarea
 from .services.cliente_services import (
     registrar_cliente, 
     iniciar_sesion, 
     modificar_cliente_datos,
-    obtener_todos_los_clientes
+    obtener_todos_los_clientes,
+    buscar_clientes,
+    obtener_cliente_por_dni
 )
 from .services.reserva_services import (
     crear_reserva,
+    crear_reserva_dividida,
     obtener_reservas_por_cliente,
     modificar_reserva,
     cancelar_reserva,
     obtener_reservas_por_dni_admin,
     obtener_reservas_por_fechas_admin,
+    actualizar_estados_reservas,
+    archivar_reservas,
+    obtener_todos_los_tipos_habitacion,
 )
 from .services.admin_services import (
     iniciar_sesion_admin,
     admin_obtener_todas_las_habitaciones,
-    admin_actualizar_estado_habitacion  
+    admin_actualizar_estado_habitacion,
+    admin_actualizar_estados_habitaciones,
+    admin_crear_bloqueo_habitacion,
+    admin_obtener_bloqueos_habitacion,
+    admin_eliminar_bloqueo_habitacion,
+    admin_obtener_linea_de_tiempo,
+    admin_actualizar_tarifa_tipo,
+    admin_obtener_auditoria
 )
+from .services.analitica_services import (
+    obtener_ocupacion_mensual,
+    obtener_estadisticas_mensuales,
+    podar_registro_cambios
+)
+from .services.token_services import (
+    emitir_token_refresco,
+    rotar_token_refresco,
+    revocar_token_refresco,
+    familias_revocadas,
+    podar_tokens_vencidos
+)
+from .services.ari_services import (
+    obtener_cambios_inventario,
+    podar_registro_ari,
+    LIMITE_CAMBIOS_ARI
+)
+from .services.lista_espera_services import (
+    agregar_a_lista_espera,
+    obtener_lista_espera_por_cliente,
+    trabajador_lista_espera
+)
+from .services.retencion_services import (
+    crear_retencion,
+    liberar_retencion,
+    confirmar_retencion,
+    podar_retenciones,
+    vencimiento_retenciones,
+    MINUTOS_RETENCION,
+    MAXIMO_MINUTOS_RETENCION
+)
+from .esquema import verificar_esquema, VERSION_ESQUEMA
+from .limitador import ip_cliente, verificar_intento_login
+from .cache import cache_clientes, cache_admins, version_reservas_cliente, version_cambios
+from .reportes import obtener_base_reportes, refrescar_snapshot_reportes, snapshot_reportes, MODO_REPORTES_ACTIVO, SEGUNDOS_MAXIMOS_SNAPSHOT
+from .planificador import planificador, Tarea, PLANIFICADOR_ACTIVO
+from .propiedades import MiddlewarePropiedad
+from .auditoria import escritor_auditoria
+from .concurrencia import MiddlewareConcurrencia, metricas_concurrencia
+from .outbox import trabajador_outbox, podar_outbox, obtener_mensajes_fallidos, reintentar_mensaje
+from .captura import MiddlewareCaptura, EscritorCaptura, ARCHIVO_CAPTURA, CAPTURA_ACTIVA
+from .perfilado import MiddlewarePerfilado, RutaPerfilable, listar_perfiles, obtener_perfil, ruta_archivo_perfil
 # ==============================================================================
 # CONFIGURACIÓN DE APP Y CORS
 # ==============================================================================
 app = FastAPI()
 
+#  Todas las rutas se pueden perfilar a pedido de un admin (ver perfilado.py)
+app.router.route_class = RutaPerfilable
+
 #  Lista de orígenes permitidos (para que el frontend se conecte) 
 origins = [
     "http://localhost:5500",
@@ -39,6 +97,15 @@ origins = [
     
 ]
 
+#  Perfilado a pedido ('X-Perfilar: <token de admin>'). Va por dentro del
+#  límite de concurrencia: el perfil no cuenta la espera en la cola.
+#  admin_desde_token se define más abajo, con los helpers de autenticación.
+app.add_middleware(MiddlewarePerfilado, es_admin=lambda token: admin_desde_token(token) is not None)
+
+#  Límite de peticiones simultáneas por clase de ruta (503 si la cola se llena).
+#  Va por dentro de CORS para que el 503 también lleve sus headers.
+app.add_middleware(MiddlewareConcurrencia)
+
 #  Aplicar el middleware de CORS 
 app.add_middleware(
     CORSMiddleware,
@@ -48,6 +115,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+#  Captura de tráfico para repetirlo en pruebas de rendimiento (solo si se
+#  define HOTEL_CAPTURA_ARCHIVO). Va por dentro de MiddlewarePropiedad para
+#  ver el hotel de cada petición, y por fuera del límite de concurrencia
+#  para registrar también las rechazadas.
+escritor_captura = None
+if CAPTURA_ACTIVA:
+    escritor_captura = EscritorCaptura(ARCHIVO_CAPTURA, principal=lambda token: principal_desde_token(token))
+    app.add_middleware(MiddlewareCaptura, escritor=escritor_captura)
+
+#  Rutas /api/v1/hoteles/{hotel_id}/... contra la BD de cada hotel 
+app.add_middleware(MiddlewarePropiedad)
+
 # ==============================================================================
 # ESQUEMAS (PYDANTIC MODELS) 
 # ==============================================================================
@@ -101,6 +180,18 @@ class TipoHabitacionPublico(BaseModel):
     class Config:
          from_attributes = True
 
+class TipoHabitacionTarifa(BaseModel):
+    id: int
+    nombre_tipo: str
+    capacidad_maxima: int
+    tarifa_base: int
+    
+    class Config:
+         from_attributes = True
+
+class TarifaUpdate(BaseModel):
+    tarifa_base: int
+
 #  Esquemas de Reserva 
 
 class ReservaCrear(BaseModel):
@@ -108,6 +199,8 @@ class ReservaCrear(BaseModel):
     fecha_checkin: date
     fecha_checkout: date
     total_personas: int
+    lista_espera: bool = False # Si no hay disponibilidad, anotarse en la lista de espera
+    dividir_estadia: bool = False # Si ninguna habitación está libre todas las noches, aceptar cambiar de habitación
 
 class ReservaPublica(BaseModel):
     id: int
@@ -116,6 +209,32 @@ class ReservaPublica(BaseModel):
     estado_reserva: str
     costo_total: Optional[int] = None
     habitacion: InfoHabitacion
+    grupo_estadia: Optional[int] = None
+
+    class Config:
+         from_attributes = True
+
+class EstadiaDividida(BaseModel):
+    # Tramos de una estadía en la que el huésped cambia de habitación
+    grupo_estadia: int
+    costo_total: int
+    tramos: List[ReservaPublica]
+
+class RetencionCrear(BaseModel):
+    tipo_habitacion_id: int
+    fecha_checkin: date
+    fecha_checkout: date
+    total_personas: int
+    minutos: int = Field(MINUTOS_RETENCION, ge=1, le=MAXIMO_MINUTOS_RETENCION)
+
+class RetencionPublica(BaseModel):
+    # Habitación apartada hasta 'vence_en' (UTC); se confirma con POST .../confirmar
+    id: int
+    fecha_checkin: date
+    fecha_checkout: date
+    total_personas: int
+    habitacion: InfoHabitacion
+    vence_en: datetime
 
     class Config:
          from_attributes = True
@@ -125,6 +244,18 @@ class ReservaActualizar(BaseModel):
     fecha_checkout: date
     total_personas: int
 
+class SolicitudEsperaPublica(BaseModel):
+    id: int
+    fecha_checkin: date
+    fecha_checkout: date
+    total_personas: int
+    estado: str
+    tipo: InfoTipoHabitacion
+    reserva_id: Optional[int] = None
+
+    class Config:
+         from_attributes = True
+
 #  Esquemas de Administración 
     
 class InfoClienteAdmin(BaseModel):
@@ -141,10 +272,17 @@ class ReservaPublicaAdmin(BaseModel):
     estado_reserva: str
     habitacion: InfoHabitacion
     cliente: InfoClienteAdmin
+    grupo_estadia: Optional[int] = None
 
     class Config:
         from_attributes = True
         
+class InicioPerfil(BaseModel):
+    # Todo lo que necesita la página de perfil, en una sola respuesta
+    cliente: ClientePublico
+    reservas: List[ReservaPublica]
+    tipos_habitacion: List[TipoHabitacionPublico]
+
 class ClienteDetalleAdmin(BaseModel):
     cliente: ClientePublico
     reservas: List[ReservaPublicaAdmin]
@@ -161,6 +299,144 @@ class HabitacionAdminPublica(BaseModel):
 class HabitacionEstadoUpdate(BaseModel):
     estado: str # Esperamos 'Activa' o 'Mantenimiento'
 
+class CambioEstadoHabitacion(BaseModel):
+    habitacion_id: int
+    estado: str
+
+class HabitacionesEstadoUpdate(BaseModel):
+    cambios: List[CambioEstadoHabitacion]
+
+class BloqueoCrear(BaseModel):
+    fecha_inicio: date
+    fecha_fin: date
+    motivo: Optional[str] = None
+    reasignar: bool = False # Mover las reservas en conflicto a otra habitación del mismo tipo
+
+class BloqueoPublico(BaseModel):
+    id: int
+    habitacion_id: int
+    fecha_inicio: date
+    fecha_fin: date
+    motivo: Optional[str] = None
+
+    class Config:
+         from_attributes = True
+
+class ResultadoBloqueo(BaseModel):
+    bloqueo: Optional[BloqueoPublico] = None
+    conflictos: List[ReservaPublicaAdmin]
+    # Conflictos que 'reasignar' no mueve (huésped alojado o estadía terminada)
+    no_reasignables: List[ReservaPublicaAdmin] = []
+    reasignadas: List[ReservaPublicaAdmin]
+
+class HabitacionLineaDeTiempo(BaseModel):
+    id: int
+    numero: str
+    tipo_id: int
+    estado: str
+    # [desplazamiento, dias, clase ('R' reserva / 'B' bloqueo), id, dni o motivo]
+    segmentos: List[List[Union[int, str, None]]]
+
+class LineaDeTiempoOcupacion(BaseModel):
+    desde: date
+    hasta: date
+    columnas: List[str]
+    habitaciones: List[HabitacionLineaDeTiempo]
+
+class MetricaTarea(BaseModel):
+    nombre: str
+    programacion: str
+    ejecuciones: int
+    fallos: int
+    omitidas: int
+    ultima_ejecucion: Optional[datetime] = None
+    ultima_duracion: Optional[float] = None
+    ultimo_error: Optional[str] = None
+    proxima_ejecucion: Optional[datetime] = None
+
+class MetricaConcurrencia(BaseModel):
+    clase: str
+    limite: int
+    cola_maxima: int
+    en_curso: int
+    en_cola: int
+    maximo_en_cola: int
+    atendidas: int
+    rechazadas: int
+    vencidas: int
+    espera_promedio_ms: float
+
+class OcupacionMes(BaseModel):
+    mes: str
+    noches_ocupadas: int
+    noches_disponibles: int
+    ocupacion: float
+
+class EstadisticaMes(BaseModel):
+    mes: str
+    reservas: int
+    canceladas: int
+    estadia_promedio: Optional[float] = None
+    anticipacion_promedio: Optional[float] = None
+    ingresos: int
+
+class RegistroAuditoriaPublico(BaseModel):
+    registrado_en: datetime
+    actor: str
+    entidad: str
+    entidad_id: str
+    accion: str
+    cambios: Json
+
+    class Config:
+         from_attributes = True
+
+class MensajeSalidaPublico(BaseModel):
+    id: int
+    evento: str
+    destino: str
+    carga: Json
+    estado: str
+    intentos: int
+    ultimo_error: Optional[str] = None
+    creado_en: datetime
+
+    class Config:
+         from_attributes = True
+
+class FuncionPerfil(BaseModel):
+    funcion: str
+    llamadas: int
+    propio_ms: float
+    acumulado_ms: float
+
+class PerfilPeticionResumen(BaseModel):
+    id: str
+    fecha: datetime
+    hotel: Optional[str] = None
+    metodo: str
+    ruta: str
+    estado: Optional[int] = None
+    total_ms: float
+    endpoint_ms: float
+    serializacion_ms: float
+    otros_ms: float
+    consultas_sql: int
+    sql_ms: float
+    archivo: bool
+    funciones: List[FuncionPerfil]
+
+class CeldaARI(BaseModel):
+    tipo_id: int
+    fecha: date
+    disponibles: int
+    tarifa: int
+
+class CambiosARI(BaseModel):
+    cursor: int
+    hay_mas: bool
+    celdas: List[CeldaARI]
+
 #  Esquemas de Token (Autenticación) 
 
 class DatosToken(BaseModel):
@@ -169,6 +445,10 @@ class DatosToken(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class SolicitudRefresco(BaseModel):
+    refresh_token: str
 
 # ==============================================================================
 # CONFIGURACIÓN DE AUTENTICACIÓN (JWT)
@@ -187,8 +467,11 @@ MINUTOS_EXPIRACION_TOKEN = 60 # El token durará 1 hora
 # FUNCIONES HELPERS DE AUTENTICACIÓN 
 # ==============================================================================
 
+# jose/cryptography se importan recién en el primer uso (no en el arranque)
+
 def crear_token_acceso(data: dict, expires_delta: Optional[timedelta] = None):
     """Crea un nuevo token JWT."""
+    from jose import jwt
     a_codificar = data.copy()
     if expires_delta:
         expira = datetime.utcnow() + expires_delta
@@ -200,10 +483,28 @@ def crear_token_acceso(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt_codificado
 
 
+def emitir_tokens(sujeto: str, es_admin: bool, familia: Optional[str] = None, refresh_token: Optional[str] = None) -> dict:
+    """
+    Arma la respuesta de login/refresh: access token (JWT corto) + refresh token.
+    El access token lleva la familia ('fam') para poder revocarlo junto con la sesión.
+    """
+    if refresh_token is None:
+        refresh_token, familia = emitir_token_refresco(sujeto, es_admin, CLAVE_SECRETA)
+    datos = {"sub": sujeto, "hotel": hotel_actual(), "fam": familia}
+    if es_admin:
+        datos["is_admin"] = True # Guardamos flag de admin
+    token_acceso = crear_token_acceso(
+        data=datos,
+        expires_delta=timedelta(minutes=MINUTOS_EXPIRACION_TOKEN)
+    )
+    return {"access_token": token_acceso, "token_type": "bearer", "refresh_token": refresh_token}
+
+
 async def obtener_usuario_actual(token: str = Depends(esquema_oauth2)):
     """
     Obtiene el usuario cliente actual a partir del token JWT.
     """
+    from jose import JWTError, jwt
     excepcion_credenciales = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
@@ -212,141 +513,213 @@ async def obtener_usuario_actual(token: str = Depends(esquema_oauth2)):
     try:
         payload = jwt.decode(token, CLAVE_SECRETA, algorithms=[ALGORITMO])
         dni: str = payload.get("sub") 
-        if dni is None:
+        # Un token solo vale para el hotel en el que se emitió
+        if dni is None or payload.get("hotel") != hotel_actual():
+            raise excepcion_credenciales
+        if payload.get("fam") in familias_revocadas():
             raise excepcion_credenciales
         datos_token = DatosToken(dni=int(dni))
         
     except JWTError:
         raise excepcion_credenciales
     
-    usuario = Cliente.get_or_none(Cliente.dni == datos_token.dni)
+    usuario = cache_clientes.obtener(
+        datos_token.dni,
+        lambda: Cliente.get_or_none(Cliente.dni == datos_token.dni)
+    )
     
     if usuario is None:
         raise excepcion_credenciales
         
     return usuario
 
-async def obtener_usuario_admin_actual(token: str = Depends(esquema_oauth2)):
+def admin_desde_token(token: str):
     """
-    Obtiene el usuario admin actual a partir del token JWT.
-    Verifica el flag 'is_admin'.
+    Admin dueño de un token JWT (con el flag 'is_admin', emitido en este
+    hotel y de una sesión no revocada), o None si el token no sirve.
     """
-    excepcion_credenciales = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="No tienes permisos de administrador",
-        headers={"WWW-Authenticate": "Bearer"},
+    from jose import JWTError, jwt
+    try:
+        payload = jwt.decode(token, CLAVE_SECRETA, algorithms=[ALGORITMO])
+    except JWTError:
+        return None
+    username: str = payload.get("sub") 
+    es_admin: bool = payload.get("is_admin", False)
+
+    if username is None or es_admin is not True or payload.get("hotel") != hotel_actual():
+        return None
+    if payload.get("fam") in familias_revocadas():
+        return None
+
+    return cache_admins.obtener(
+        username,
+        lambda: Admin.get_or_none(Admin.username == username)
     )
+
+def principal_desde_token(token: str):
+    """'admin:<usuario>' o 'cliente:<dni>' de un token válido (para la captura de tráfico), o None."""
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, CLAVE_SECRETA, algorithms=[ALGORITMO])
-        username: str = payload.get("sub") 
-        es_admin: bool = payload.get("is_admin", False)
-        
-        if username is None or es_admin is not True:
-            raise excepcion_credenciales
-        
     except JWTError:
-        raise excepcion_credenciales
-    
-    usuario_admin = Admin.get_or_none(Admin.username == username)
+        return None
+    sujeto = payload.get("sub")
+    if sujeto is None:
+        return None
+    return f"admin:{sujeto}" if payload.get("is_admin") else f"cliente:{sujeto}"
+
+async def obtener_usuario_admin_actual(token: str = Depends(esquema_oauth2)):
+    """
+    Obtiene el usuario admin actual a partir del token JWT.
+    Verifica el flag 'is_admin'.
+    """
+    usuario_admin = admin_desde_token(token)
     
     if usuario_admin is None:
-        raise excepcion_credenciales
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="No tienes permisos de administrador",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
         
     return usuario_admin
+
+def verificar_limite_login(request: Request, cuenta: str):
+    """
+    Aplica el rate limit de login (por IP y por cuenta) ANTES de llamar
+    al servicio, para no gastar CPU en check_password_hash durante un ataque.
+    """
+    ip = ip_cliente(request.client.host if request.client else "desconocida",
+                    request.headers.get("x-forwarded-for"))
+    espera = verificar_intento_login(ip, cuenta)
+    if espera > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos de inicio de sesión. Intente más tarde.",
+            headers={"Retry-After": str(int(espera) + 1)},
+        )
         
+def etag_reservas_cliente(dni: int) -> str:
+    """
+    ETag de 'mis_reservas': versión del cliente + versión global (cambios en
+    lote, ej: la tarea de estados). Lleva el DNI para que nunca coincida
+    con el de otro usuario en el mismo navegador.
+    """
+    return f'W/"{dni}-{version_reservas_cliente(dni)}-{version_cambios("reservas_clientes")}"'
+
+
+def etag_coincide(request: Request, etag: str) -> bool:
+    enviados = request.headers.get("if-none-match")
+    if not enviados:
+        return False
+    return any(valor.strip() in (etag, "*") for valor in enviados.split(","))
+
+
+def cabeceras_etag(etag: str) -> dict:
+    # 'no-cache' = el navegador puede guardarla, pero siempre revalida con el ETag
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def obtener_base_datos_reportes(response: Response):
+    """
+    Dependencia para los endpoints de solo lectura del admin.
+    Devuelve el handle del snapshot de reportes (o None si el modo está apagado)
+    e informa su antigüedad en el header 'X-Snapshot-Age' (segundos).
+    """
+    base_reportes, edad = obtener_base_reportes()
+    if base_reportes is not None:
+        response.headers["X-Snapshot-Age"] = str(int(edad))
+    return base_reportes
+
 # ==============================================================================
 # EVENTOS DE INICIO Y CIERRE (STARTUP/SHUTDOWN)
 # ==============================================================================
 
 def inicializar_db():
-    
-    
-    lista_de_modelos = [Cliente, TipoHabitacion, Habitacion, Reserva, Admin]
-    
+    """
+    Verifica la versión del esquema (PRAGMA user_version). Solo crea tablas
+    si la BD es nueva o quedó en una versión anterior.
+    """
     try:
-        db.create_tables(lista_de_modelos, safe=True)
-        print("Tablas verificadas/creadas.")
-
-        with db.atomic():
-            #  Crear Admin por defecto 
-            if Admin.select().count() == 0:
-                print("Creando usuario admin por defecto (hotelp / admin1234)...")
-                Admin.create(
-                    username='hotelp',
-                    password=generate_password_hash('admin1234')
-                )
-                print("Usuario admin creado.")
-            
-            if Habitacion.select().count() == 0:
-                print("Base de datos vacía. Creando tipos y habitaciones...")
-                
-                # Crear Tipos de Habitación 
-                tipo_normal = TipoHabitacion.create(
-                    nombre_tipo='Normal (King Size)',
-                    descripcion='Habitación estándar con cama King Size.',
-                    capacidad_maxima=2,
-                    tarifa_base=9000,
-                    cantidad_total=10
-                )
-                tipo_individual = TipoHabitacion.create(
-                    nombre_tipo='Individual',
-                    descripcion='Habitación para una persona.',
-                    capacidad_maxima=1,
-                    tarifa_base=6000,
-                    cantidad_total=9
-                )
-                tipo_familiar = TipoHabitacion.create(
-                    nombre_tipo='Grande (Familiar)',
-                    descripcion='Habitación amplia para familias.',
-                    capacidad_maxima=4,
-                    tarifa_base=12000,
-                    cantidad_total=9
-                )
-                tipo_suite = TipoHabitacion.create(
-                    nombre_tipo='Suite',
-                    descripcion='Suite de lujo con sala de estar.',
-                    capacidad_maxima=3,
-                    tarifa_base=18000,
-                    cantidad_total=2
-                )
-
-                # Crear Habitaciones 
-                print("Creando 10 habitaciones 'Normal (King Size)' (Piso 1)...")
-                for i in range(1, 11):
-                    Habitacion.create(numero=f'1{i:02d}', tipo=tipo_normal, estado='Activa')
-
-                print("Creando 9 habitaciones 'Individual' (Piso 2)...")
-                for i in range(1, 10):
-                    Habitacion.create(numero=f'2{i:02d}', tipo=tipo_individual, estado='Activa')
-                
-                print("Creando 9 habitaciones 'Grande (Familiar)' (Piso 3)...")
-                for i in range(1, 10):
-                    Habitacion.create(numero=f'3{i:02d}', tipo=tipo_familiar, estado='Activa')
-                
-                print("Creando 2 habitaciones 'Suite' (Piso 4)...")
-                for i in range(1, 3):
-                    Habitacion.create(numero=f'4{i:02d}', tipo=tipo_suite, estado='Activa')
-                
-                print("¡Éxito! 4 Tipos y 30 Habitaciones creadas.")
-
-            else:
-                print("La base de datos ya contiene habitaciones. No se crearon datos nuevos.")
+        if verificar_esquema():
+            print(f"Esquema creado/actualizado a la versión {VERSION_ESQUEMA}.")
+            print("Si la BD es nueva, cargar los datos iniciales con: python -m src.comandos sembrar")
+        else:
+            print(f"Esquema al día (versión {VERSION_ESQUEMA}).")
 
     except Exception as e:
         print(f"Error al inicializar la base de datos: {e}")
         
+def registrar_tareas_programadas():
+    """
+    Tareas de mantenimiento que corren en segundo plano. Todas trabajan sobre
+    la BD actual, así que corren en la principal y en cada hotel abierto.
+    """
+    planificador.agregar(Tarea(
+        "estados_reservas", actualizar_estados_reservas,
+        intervalo=600, jitter=30, timeout=120, por_hotel=True
+    ))
+    planificador.agregar(Tarea(
+        "archivar_reservas", archivar_reservas,
+        cron="30 3 * * *", jitter=60, timeout=1800, por_hotel=True
+    ))
+    planificador.agregar(Tarea(
+        "podar_tokens_vencidos", podar_tokens_vencidos,
+        cron="45 3 * * *", jitter=60, timeout=300, por_hotel=True
+    ))
+    planificador.agregar(Tarea(
+        "podar_registro_cambios", podar_registro_cambios,
+        intervalo=3600, jitter=120, timeout=300, por_hotel=True
+    ))
+    planificador.agregar(Tarea(
+        "podar_outbox", podar_outbox,
+        cron="55 3 * * *", jitter=60, timeout=300, por_hotel=True
+    ))
+    planificador.agregar(Tarea(
+        "podar_retenciones", podar_retenciones,
+        intervalo=600, jitter=30, timeout=60, por_hotel=True
+    ))
+    planificador.agregar(Tarea(
+        "podar_registro_ari", podar_registro_ari,
+        cron="50 3 * * *", jitter=60, timeout=300, por_hotel=True
+    ))
+    if MODO_REPORTES_ACTIVO:
+        planificador.agregar(Tarea(
+            "snapshot_reportes", refrescar_snapshot_reportes,
+            intervalo=SEGUNDOS_MAXIMOS_SNAPSHOT, timeout=300, exclusiva=False, por_hotel=True
+        ))
+
 # Evento de Inicio
 @app.on_event("startup")
-def evento_inicio():
+async def evento_inicio():
     """Se ejecuta al iniciar la app: Conecta a la BD e inicializa."""
     if db.is_closed():
         db.connect()
     inicializar_db() 
+    if MODO_REPORTES_ACTIVO:
+        snapshot_reportes.limpiar_anteriores()
+    if PLANIFICADOR_ACTIVO:
+        registrar_tareas_programadas()
+        planificador.iniciar()
+    trabajador_lista_espera.iniciar()
+    vencimiento_retenciones.iniciar()
+    escritor_auditoria.iniciar()
+    trabajador_outbox.iniciar()
+    if escritor_captura is not None:
+        escritor_captura.iniciar()
 
 # Evento de Cierre
 @app.on_event("shutdown")
-def evento_cierre():
+async def evento_cierre():
     """Se ejecuta al apagar la app: Cierra la conexión a la BD."""
+    await planificador.detener()
+    await trabajador_outbox.detener()
+    vencimiento_retenciones.detener()
+    trabajador_lista_espera.detener()
+    # Los registros de auditoría pendientes se escriben antes de cerrar la BD
+    escritor_auditoria.detener()
+    if escritor_captura is not None:
+        escritor_captura.detener()
     if not db.is_closed():
         db.close()
         print("Conexión a la BD cerrada.")
@@ -356,7 +729,7 @@ def evento_cierre():
 # ENDPOINTS DE LA API (RUTAS Y FUNCIONES)
 # ==============================================================================
 
-app.get("/api/v1/tipos-habitacion", response_model=List[TipoHabitacionPublico])
+@app.get("/api/v1/tipos-habitacion", response_model=List[TipoHabitacionPublico])
 def endpoint_obtener_tipos_habitacion():
     """
     Devuelve una lista de todos los tipos de habitación (público).
@@ -401,6 +774,21 @@ def endpoint_obtener_datos_usuario(
     """Endpoint protegido para obtener los datos del usuario logueado."""
     return usuario_actual
 
+@app.get("/api/v1/clientes/yo/inicio", response_model=InicioPerfil)
+def endpoint_inicio_perfil(
+    usuario_actual: Cliente = Depends(obtener_usuario_actual)
+):
+    """
+    Endpoint protegido: datos del usuario, sus reservas y el catálogo de tipos
+    en una sola respuesta (un solo chequeo de token). Son siempre dos consultas
+    (reservas e historial); el cliente y los tipos salen de la cache.
+    """
+    return {
+        "cliente": usuario_actual,
+        "reservas": obtener_reservas_por_cliente(dni_cliente=usuario_actual.dni),
+        "tipos_habitacion": obtener_todos_los_tipos_habitacion(),
+    }
+
 @app.put("/api/v1/clientes/{dni_cliente}", response_model=ClientePublico)
 def endpoint_modificar_cliente(
     dni_cliente: int,
@@ -441,10 +829,13 @@ def endpoint_modificar_cliente(
         
 @app.post("/api/v1/clientes/iniciar_sesion", response_model=Token)
 def endpoint_login_para_token_cliente(
+    request: Request,
     datos_formulario: OAuth2PasswordRequestForm = Depends()
 ):
     """Endpoint de Login para Clientes."""
     
+    verificar_limite_login(request, datos_formulario.username)
+    
     cliente = iniciar_sesion(
         email=datos_formulario.username, 
         password=datos_formulario.password
@@ -456,20 +847,18 @@ def endpoint_login_para_token_cliente(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    #  Crear Token de Cliente 
-    expiracion_token = timedelta(minutes=MINUTOS_EXPIRACION_TOKEN)
-    token_acceso = crear_token_acceso(
-        data={"sub": str(cliente.dni)}, # Guardamos el DNI en el token
-        expires_delta=expiracion_token
-    )
-    return {"access_token": token_acceso, "token_type": "bearer"}
+    #  Crear Tokens de Cliente (el DNI va en el token) 
+    return emitir_tokens(str(cliente.dni), es_admin=False)
 
 @app.post("/api/v1/admin/iniciar_sesion", response_model=Token)
 def endpoint_login_para_token_admin(
+    request: Request,
     datos_formulario: OAuth2PasswordRequestForm = Depends()
 ):
     """Endpoint de Login SÓLO para Administradores."""
     
+    verificar_limite_login(request, f"admin:{datos_formulario.username}")
+    
     admin = iniciar_sesion_admin(
         username=datos_formulario.username, 
         password=datos_formulario.password
@@ -481,13 +870,33 @@ def endpoint_login_para_token_admin(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Crear Token de Admin 
-    expiracion_token = timedelta(minutes=MINUTOS_EXPIRACION_TOKEN)
-    token_acceso = crear_token_acceso(
-        data={"sub": admin.username, "is_admin": True}, # Guardamos flag de admin
-        expires_delta=expiracion_token
-    )
-    return {"access_token": token_acceso, "token_type": "bearer"}
+    # Crear Tokens de Admin 
+    return emitir_tokens(admin.username, es_admin=True)
+
+
+@app.post("/api/v1/token/refresh", response_model=Token)
+def endpoint_refrescar_token(datos: SolicitudRefresco):
+    """
+    Canjea un refresh token por un access token nuevo (y un refresh token
+    nuevo: el anterior deja de valer). No vuelve a verificar la contraseña.
+    """
+    resultado, mensaje_error = rotar_token_refresco(datos.refresh_token, CLAVE_SECRETA)
+    if mensaje_error:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=mensaje_error,
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    sujeto, es_admin, familia, nuevo_refresh = resultado
+    return emitir_tokens(sujeto, es_admin, familia=familia, refresh_token=nuevo_refresh)
+
+
+@app.post("/api/v1/token/revocar", status_code=status.HTTP_204_NO_CONTENT)
+def endpoint_revocar_token(datos: SolicitudRefresco):
+    """Cierra la sesión: revoca el refresh token y los access tokens emitidos con él."""
+    if not revocar_token_refresco(datos.refresh_token, CLAVE_SECRETA):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token inválido")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 #  Endpoints de Reservas (Cliente) 
@@ -497,7 +906,12 @@ def endpoint_crear_reserva(
     datos_reserva: ReservaCrear, 
     usuario_actual: Cliente = Depends(obtener_usuario_actual)
 ):
-    """Endpoint protegido para crear una nueva reserva"""
+    """
+    Endpoint protegido para crear una nueva reserva.
+    Con 'dividir_estadia', si ninguna habitación del tipo está libre todas
+    las noches, devuelve una EstadiaDividida (varios tramos en habitaciones
+    distintas) en lugar de una sola reserva.
+    """
     
     print(f"Recibida petición de reserva de DNI: {usuario_actual.dni}")
     try:
@@ -508,6 +922,36 @@ def endpoint_crear_reserva(
             fecha_checkout=datos_reserva.fecha_checkout,
             total_personas=datos_reserva.total_personas
         )
+        if not nueva_reserva and datos_reserva.dividir_estadia:
+            # Ninguna habitación libre todas las noches: probar cambiando de habitación
+            tramos, _ = crear_reserva_dividida(
+                dni_cliente=usuario_actual.dni,
+                tipo_habitacion_id=datos_reserva.tipo_habitacion_id,
+                fecha_checkin=datos_reserva.fecha_checkin,
+                fecha_checkout=datos_reserva.fecha_checkout,
+                total_personas=datos_reserva.total_personas
+            )
+            if tramos:
+                estadia = EstadiaDividida(
+                    grupo_estadia=tramos[0].grupo_estadia or tramos[0].id,
+                    costo_total=sum(t.costo_total for t in tramos),
+                    tramos=[ReservaPublica.model_validate(t) for t in tramos]
+                )
+                return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(estadia))
+        if not nueva_reserva and datos_reserva.lista_espera:
+            # Sin disponibilidad: guardamos el pedido para asignarlo si se libera una habitación
+            solicitud = agregar_a_lista_espera(
+                dni_cliente=usuario_actual.dni,
+                tipo_habitacion_id=datos_reserva.tipo_habitacion_id,
+                fecha_checkin=datos_reserva.fecha_checkin,
+                fecha_checkout=datos_reserva.fecha_checkout,
+                total_personas=datos_reserva.total_personas
+            )
+            if solicitud:
+                return JSONResponse(
+                    status_code=status.HTTP_202_ACCEPTED,
+                    content=jsonable_encoder(SolicitudEsperaPublica.model_validate(solicitud))
+                )
         if not nueva_reserva:
             raise HTTPException(
                 status_code=400,
@@ -521,16 +965,77 @@ def endpoint_crear_reserva(
             detail=f"Error interno del servidor: {e}"
         )
         
+@app.post("/api/v1/reservas/retenciones", response_model=RetencionPublica, status_code=status.HTTP_201_CREATED)
+def endpoint_crear_retencion(
+    datos_retencion: RetencionCrear,
+    usuario_actual: Cliente = Depends(obtener_usuario_actual)
+):
+    """
+    Endpoint protegido: aparta una habitación del tipo por unos minutos
+    mientras el cliente completa la reserva. Ninguna otra reserva puede
+    tomarla hasta que venza, se libere o se confirme.
+    """
+    retencion, error = crear_retencion(
+        dni_cliente=usuario_actual.dni,
+        tipo_habitacion_id=datos_retencion.tipo_habitacion_id,
+        fecha_checkin=datos_retencion.fecha_checkin,
+        fecha_checkout=datos_retencion.fecha_checkout,
+        total_personas=datos_retencion.total_personas,
+        minutos=datos_retencion.minutos
+    )
+    if retencion is None:
+        raise HTTPException(status_code=400, detail=error)
+    return retencion
+
+@app.post("/api/v1/reservas/retenciones/{retencion_id}/confirmar", response_model=ReservaPublica)
+def endpoint_confirmar_retencion(
+    retencion_id: int,
+    usuario_actual: Cliente = Depends(obtener_usuario_actual)
+):
+    """Endpoint protegido: convierte una retención vigente en reserva (sin volver a buscar disponibilidad)."""
+    reserva, error = confirmar_retencion(retencion_id=retencion_id, dni_cliente=usuario_actual.dni)
+    if reserva is None:
+        raise HTTPException(status_code=404, detail=error)
+    return reserva
+
+@app.delete("/api/v1/reservas/retenciones/{retencion_id}", status_code=status.HTTP_204_NO_CONTENT)
+def endpoint_liberar_retencion(
+    retencion_id: int,
+    usuario_actual: Cliente = Depends(obtener_usuario_actual)
+):
+    """Endpoint protegido: suelta una retención antes de que venza."""
+    if not liberar_retencion(retencion_id=retencion_id, dni_cliente=usuario_actual.dni):
+        raise HTTPException(status_code=404, detail="No se encontró la retención o no pertenece al usuario.")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
 @app.get("/api/v1/reservas/mis_reservas", response_model=List[ReservaPublica])
 def endpoint_obtener_reservas_del_usuario(
+    request: Request,
+    response: Response,
     usuario_actual: Cliente = Depends(obtener_usuario_actual)
 ):
-    """Endpoint protegido para obtener la LISTA de reservas del usuario logueado."""
-    
+    """
+    Endpoint protegido para obtener la LISTA de reservas del usuario logueado.
+    Responde 304 si el ETag que manda el navegador sigue vigente.
+    """
+    # La versión se lee ANTES que las reservas: si algo cambia en el medio,
+    # el próximo pedido trae una versión nueva (nunca datos viejos con ETag nuevo)
+    etag = etag_reservas_cliente(usuario_actual.dni)
+    if etag_coincide(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabeceras_etag(etag))
+
     print(f"Buscando reservas para el DNI: {usuario_actual.dni}")
     reservas = obtener_reservas_por_cliente(dni_cliente=usuario_actual.dni)
+    response.headers.update(cabeceras_etag(etag))
     return reservas
 
+@app.get("/api/v1/lista_espera/mis_solicitudes", response_model=List[SolicitudEsperaPublica])
+def endpoint_obtener_lista_espera_del_usuario(
+    usuario_actual: Cliente = Depends(obtener_usuario_actual)
+):
+    """Endpoint protegido: solicitudes en lista de espera del usuario logueado."""
+    return obtener_lista_espera_por_cliente(dni_cliente=usuario_actual.dni)
+
 @app.put("/api/v1/reservas/{reserva_id}", response_model=ReservaPublica)
 def endpoint_modificar_reserva(
     reserva_id: int,
@@ -592,43 +1097,60 @@ def endpoint_cancelar_reserva(
 @app.get("/api/v1/admin/reservas/cliente/{dni}", response_model=List[ReservaPublicaAdmin])
 def endpoint_admin_buscar_por_dni(
     dni: int,
-    usuario_admin: Admin = Depends(obtener_usuario_admin_actual) 
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual),
+    base_reportes = Depends(obtener_base_datos_reportes)
 ):
     """ Admin busca todas las reservas de un DNI de cliente específico"""
     
     print(f"Búsqueda [Admin] por DNI: {dni}")
-    reservas = obtener_reservas_por_dni_admin(dni_cliente=dni)
+    reservas = obtener_reservas_por_dni_admin(dni_cliente=dni, base_datos=base_reportes)
     return reservas
 
 
+@app.get("/api/v1/admin/clientes/buscar", response_model=List[ClientePublico])
+def endpoint_admin_buscar_clientes(
+    q: str = Query(..., min_length=1),
+    pagina: int = Query(1, ge=1),
+    por_pagina: int = Query(20, ge=1, le=100),
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual),
+    base_reportes = Depends(obtener_base_datos_reportes)
+):
+    """ [Admin] Busca clientes por nombre, apellido, email (prefijo) o DNI parcial. """
+    
+    print(f"Búsqueda [Admin] de clientes: '{q}' (página {pagina})")
+    return buscar_clientes(texto=q, pagina=pagina, por_pagina=por_pagina, base_datos=base_reportes)
+
+
 @app.get("/api/v1/admin/clientes/{dni}", response_model=ClienteDetalleAdmin)
 def endpoint_admin_buscar_cliente_por_dni(
     dni: int,
-    usuario_admin: Admin = Depends(obtener_usuario_admin_actual) 
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual),
+    base_reportes = Depends(obtener_base_datos_reportes)
 ):
     """ [Admin] Busca un cliente por DNI y devuelve sus datos + reservas activas. """
     
     print(f"Búsqueda [Admin] de CLIENTE por DNI: {dni}")
-    cliente = Cliente.get_or_none(Cliente.dni == dni)
+    cliente = obtener_cliente_por_dni(dni_cliente=dni, base_datos=base_reportes)
     
     if not cliente:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Cliente no encontrado"
         )
-    reservas = obtener_reservas_por_dni_admin(dni_cliente=dni)
+    reservas = obtener_reservas_por_dni_admin(dni_cliente=dni, base_datos=base_reportes)
     
     return {"cliente": cliente, "reservas": reservas}
 
 
 @app.get("/api/v1/admin/clientes", response_model=List[ClientePublico])
 def endpoint_admin_obtener_todos_los_clientes(
-    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual),
+    base_reportes = Depends(obtener_base_datos_reportes)
 ):
     """ [Admin] Obtiene una lista de todos los clientes. """
     
     print("Listado [Admin] de todos los clientes")
-    clientes = obtener_todos_los_clientes()
+    clientes = obtener_todos_los_clientes(base_datos=base_reportes)
     return clientes
 
 
@@ -637,17 +1159,170 @@ def endpoint_admin_obtener_todos_los_clientes(
 def endpoint_admin_buscar_por_fechas(
     fecha_inicio: date,
     fecha_fin: date,
-    usuario_admin: Admin = Depends(obtener_usuario_admin_actual) 
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual),
+    base_reportes = Depends(obtener_base_datos_reportes)
 ):
     """[Admin] Busca todas las reservas entre un rango de fechas."""
     
     print(f"Búsqueda [Admin] por Fechas: {fecha_inicio} a {fecha_fin}")
     reservas = obtener_reservas_por_fechas_admin(
         fecha_inicio=fecha_inicio, 
-        fecha_fin=fecha_fin
+        fecha_fin=fecha_fin,
+        base_datos=base_reportes
     )
     return reservas
 
+@app.get("/api/v1/admin/tareas", response_model=List[MetricaTarea])
+def endpoint_admin_metricas_tareas(
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """[Admin] Métricas de las tareas programadas de este worker."""
+    return planificador.metricas()
+
+@app.get("/api/v1/admin/concurrencia", response_model=List[MetricaConcurrencia])
+def endpoint_admin_metricas_concurrencia(
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """[Admin] Límites de concurrencia por clase de ruta de este worker (no pasa por ningún límite)."""
+    return metricas_concurrencia()
+
+@app.get("/api/v1/admin/outbox/fallidos", response_model=List[MensajeSalidaPublico])
+def endpoint_admin_outbox_fallidos(
+    limite: int = Query(100, ge=1, le=1000),
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """[Admin] Confirmaciones/avisos que agotaron sus reintentos (dead letter)."""
+    return obtener_mensajes_fallidos(limite)
+
+@app.post("/api/v1/admin/outbox/{mensaje_id}/reintentar", response_model=MensajeSalidaPublico)
+def endpoint_admin_outbox_reintentar(
+    mensaje_id: int,
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """[Admin] Vuelve a encolar un mensaje fallido (por ej. después de arreglar el destino)."""
+    mensaje = reintentar_mensaje(mensaje_id)
+    if mensaje is None:
+        raise HTTPException(status_code=404, detail="Mensaje fallido no encontrado")
+    return mensaje
+
+@app.get("/api/v1/admin/perfiles", response_model=List[PerfilPeticionResumen])
+def endpoint_admin_perfiles(
+    limite: int = Query(50, ge=1, le=50),
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """
+    [Admin] Perfiles guardados de este hotel, del más nuevo al más viejo.
+    Una petición se perfila con el header 'X-Perfilar: <token de admin>'
+    (cualquier ruta, incluso con el token de un cliente en Authorization) o
+    con '?perfilar=1' si ya va autenticada como admin. La respuesta trae el
+    id en 'X-Perfil' y el resumen en 'Server-Timing'.
+    """
+    return listar_perfiles(limite)
+
+@app.get("/api/v1/admin/perfiles/{perfil_id}", response_model=PerfilPeticionResumen)
+def endpoint_admin_perfil(
+    perfil_id: str,
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """[Admin] Resumen de un perfil: funciones más costosas, SQL y serialización."""
+    perfil = obtener_perfil(perfil_id)
+    if perfil is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return perfil
+
+@app.get("/api/v1/admin/perfiles/{perfil_id}/archivo")
+def endpoint_admin_descargar_perfil(
+    perfil_id: str,
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """[Admin] Perfil completo en formato pstats (python -m pstats, snakeviz)."""
+    ruta = ruta_archivo_perfil(perfil_id)
+    if ruta is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(ruta, media_type="application/octet-stream", filename=f"{perfil_id}.prof")
+
+@app.get("/api/v1/admin/auditoria/{entidad}", response_model=List[RegistroAuditoriaPublico])
+def endpoint_admin_auditoria(
+    entidad: str,
+    entidad_id: Optional[str] = None,
+    limite: int = Query(100, ge=1, le=1000),
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """
+    [Admin] Quién cambió qué: 'reserva', 'cliente' o 'habitacion', opcionalmente
+    de un registro puntual. Los cambios se guardan en segundo plano, así que
+    uno recién hecho puede tardar una fracción de segundo en aparecer.
+    """
+    return admin_obtener_auditoria(entidad, entidad_id, limite)
+
+# Rango máximo de los reportes agregados (en meses)
+MESES_MAXIMOS_ANALITICA = 240
+
+def _validar_rango_analitica(desde: date, hasta: date):
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="'hasta' debe ser posterior a 'desde'")
+    if (hasta.year - desde.year) * 12 + hasta.month - desde.month >= MESES_MAXIMOS_ANALITICA:
+        raise HTTPException(status_code=400, detail=f"El rango no puede superar {MESES_MAXIMOS_ANALITICA} meses")
+
+@app.get("/api/v1/admin/analitica/ocupacion", response_model=List[OcupacionMes])
+def endpoint_admin_ocupacion_mensual(
+    desde: date,
+    hasta: date,
+    tipo_id: Optional[int] = None,
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """[Admin] Ocupación por mes (noches ocupadas / disponibles), opcionalmente por tipo."""
+    _validar_rango_analitica(desde, hasta)
+    resultado = obtener_ocupacion_mensual(desde, hasta, tipo_id)
+    if resultado is None:
+        raise HTTPException(status_code=500, detail="No se pudo calcular la ocupación")
+    return resultado
+
+@app.get("/api/v1/admin/analitica/estadias", response_model=List[EstadisticaMes])
+def endpoint_admin_estadisticas_mensuales(
+    desde: date,
+    hasta: date,
+    tipo_id: Optional[int] = None,
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """[Admin] Por mes de check-in: reservas, cancelaciones, estadía y anticipación promedio, ingresos."""
+    _validar_rango_analitica(desde, hasta)
+    resultado = obtener_estadisticas_mensuales(desde, hasta, tipo_id)
+    if resultado is None:
+        raise HTTPException(status_code=500, detail="No se pudieron calcular las estadísticas")
+    return resultado
+
+@app.get("/api/v1/ari/changes", response_model=CambiosARI)
+def endpoint_cambios_ari(
+    since: Optional[int] = Query(None, ge=0),
+    limite: int = Query(LIMITE_CAMBIOS_ARI, ge=1, le=5000),
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """
+    Feed de disponibilidad y tarifas para channel managers.
+    Sin 'since' devuelve la foto completa y el cursor actual; con 'since'
+    solo las celdas (tipo, fecha) que cambiaron después de ese cursor.
+    Si el cursor ya no está en el registro responde 410 (pedir la foto completa).
+    """
+    resultado, mensaje = obtener_cambios_inventario(since, limite)
+    if resultado is None:
+        codigo = status.HTTP_500_INTERNAL_SERVER_ERROR if mensaje.startswith("Error interno") else status.HTTP_410_GONE
+        raise HTTPException(status_code=codigo, detail=mensaje)
+    return resultado
+
+@app.put("/api/v1/admin/tipos-habitacion/{tipo_id}/tarifa", response_model=TipoHabitacionTarifa)
+def endpoint_admin_actualizar_tarifa_tipo(
+    tipo_id: int,
+    datos: TarifaUpdate,
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """[Admin] Cambia la tarifa por noche de un tipo de habitación (se publica en el feed ARI)."""
+    tipo, mensaje = admin_actualizar_tarifa_tipo(tipo_id, datos.tarifa_base)
+    if tipo is None:
+        codigo = status.HTTP_404_NOT_FOUND if mensaje == "Tipo de habitación no encontrado" else status.HTTP_400_BAD_REQUEST
+        raise HTTPException(status_code=codigo, detail=mensaje)
+    return tipo
+
 @app.get("/api/v1/admin/habitaciones", response_model=List[HabitacionAdminPublica])
 def endpoint_admin_obtener_todas_las_habitaciones(
     usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
@@ -663,6 +1338,54 @@ def endpoint_admin_obtener_todas_las_habitaciones(
         raise HTTPException(status_code=500, detail=f"Error interno: {e}")
 
 
+# Días máximos de la vista de ocupación
+DIAS_MAXIMOS_LINEA_DE_TIEMPO = 366
+
+@app.get("/api/v1/admin/habitaciones/ocupacion", response_model=LineaDeTiempoOcupacion)
+def endpoint_admin_linea_de_tiempo(
+    desde: Optional[date] = None,
+    dias: int = Query(14, ge=1, le=DIAS_MAXIMOS_LINEA_DE_TIEMPO),
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """
+    [Admin] Vista tipo Gantt: cada habitación con sus segmentos ocupados
+    (reservas y bloqueos) en la ventana [desde, desde + dias). Por defecto desde hoy.
+    """
+    desde = desde or date.today()
+    hasta = desde + timedelta(days=dias)
+    habitaciones = admin_obtener_linea_de_tiempo(desde, hasta)
+    if habitaciones is None:
+        raise HTTPException(status_code=500, detail="No se pudo armar la línea de tiempo")
+    return {
+        "desde": desde,
+        "hasta": hasta,
+        "columnas": ["desplazamiento", "dias", "clase", "id", "detalle"],
+        "habitaciones": habitaciones,
+    }
+
+@app.put("/api/v1/admin/habitaciones/estado", response_model=List[HabitacionAdminPublica])
+def endpoint_admin_actualizar_estados_habitaciones(
+    datos: HabitacionesEstadoUpdate,
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """
+    [Admin] Actualiza el estado de varias habitaciones en una sola petición
+    (ej: housekeeping al inicio del turno). Se aplican todos o ninguno.
+    """
+    habitaciones, mensaje_error = admin_actualizar_estados_habitaciones(
+        cambios=[(c.habitacion_id, c.estado) for c in datos.cambios],
+        actor=f"admin:{usuario_admin.username}"
+    )
+
+    if habitaciones is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=mensaje_error
+        )
+
+    return habitaciones
+
+
 @app.put("/api/v1/admin/habitaciones/{habitacion_id}/estado", response_model=HabitacionAdminPublica)
 def endpoint_admin_actualizar_estado_habitacion(
     habitacion_id: int,
@@ -672,11 +1395,13 @@ def endpoint_admin_actualizar_estado_habitacion(
     """
     [Admin] Actualiza el estado de una habitación (ej: 'Activa', 'Mantenimiento')
     NO valida conflictos, simplemente ejecuta el cambio.
+    Para mantenimientos con fechas usar /habitaciones/{id}/bloqueos.
     """
     
     habitacion_actualizada, mensaje_error = admin_actualizar_estado_habitacion(
         habitacion_id=habitacion_id,
-        nuevo_estado=datos.estado
+        nuevo_estado=datos.estado,
+        actor=f"admin:{usuario_admin.username}"
     )
     
     if not habitacion_actualizada:
@@ -686,4 +1411,64 @@ def endpoint_admin_actualizar_estado_habitacion(
             detail=mensaje_error
         )
         
-    return habitacion_actualizada
\ No newline at end of file
+    return habitacion_actualizada
+
+
+@app.post("/api/v1/admin/habitaciones/{habitacion_id}/bloqueos", response_model=ResultadoBloqueo)
+def endpoint_admin_crear_bloqueo_habitacion(
+    habitacion_id: int,
+    datos: BloqueoCrear,
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """
+    [Admin] Bloquea una habitación por un rango de fechas (ej: mantenimiento).
+    Si hay reservas en ese rango responde 409 con los conflictos, salvo que
+    se pida 'reasignar' y todas entren en otras habitaciones del mismo tipo.
+    """
+    resultado, mensaje = admin_crear_bloqueo_habitacion(
+        habitacion_id=habitacion_id,
+        fecha_inicio=datos.fecha_inicio,
+        fecha_fin=datos.fecha_fin,
+        motivo=datos.motivo,
+        reasignar=datos.reasignar
+    )
+
+    if resultado is None:
+        codigo = status.HTTP_404_NOT_FOUND if mensaje == "Habitación no encontrada" else status.HTTP_400_BAD_REQUEST
+        raise HTTPException(status_code=codigo, detail=mensaje)
+
+    if resultado["bloqueo"] is None:
+        # Conflictos sin resolver: devolvemos la lista para que el admin decida
+        return JSONResponse(
+            status_code=status.HTTP_409_CONFLICT,
+            content=jsonable_encoder({
+                "detail": mensaje,
+                **ResultadoBloqueo.model_validate(resultado).model_dump()
+            })
+        )
+
+    return resultado
+
+
+@app.get("/api/v1/admin/habitaciones/{habitacion_id}/bloqueos", response_model=List[BloqueoPublico])
+def endpoint_admin_obtener_bloqueos_habitacion(
+    habitacion_id: int,
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """[Admin] Lista los bloqueos por fechas de una habitación."""
+    return admin_obtener_bloqueos_habitacion(habitacion_id=habitacion_id)
+
+
+@app.delete("/api/v1/admin/bloqueos/{bloqueo_id}", response_model=BloqueoPublico)
+def endpoint_admin_eliminar_bloqueo_habitacion(
+    bloqueo_id: int,
+    usuario_admin: Admin = Depends(obtener_usuario_admin_actual)
+):
+    """[Admin] Elimina un bloqueo; la habitación vuelve a estar disponible."""
+    bloqueo = admin_eliminar_bloqueo_habitacion(bloqueo_id=bloqueo_id)
+    if not bloqueo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bloqueo no encontrado"
+        )
+    return bloqueo
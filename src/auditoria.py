@@ -0,0 +1,151 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from .database import db, propiedad_actual, usar_propiedad
+from .models import RegistroAuditoria
+
+
+# ==============================================================================
+# AUDITORÍA DE CAMBIOS (ESCRITURA EN LOTES EN SEGUNDO PLANO)
+# ==============================================================================
+
+# Registros que pueden esperar en memoria. Con la cola llena quien audita
+# espera (backpressure) y, si aun así no hay lugar, escribe él mismo.
+CAPACIDAD_COLA_AUDITORIA = int(os.getenv("HOTEL_AUDITORIA_COLA", "10000"))
+SEGUNDOS_ESPERA_COLA = 2.0
+
+# Un lote se confirma al juntar TAMANO_LOTE_AUDITORIA registros o cuando
+# pasan SEGUNDOS_LOTE_AUDITORIA desde el primero (group commit)
+TAMANO_LOTE_AUDITORIA = 500
+SEGUNDOS_LOTE_AUDITORIA = 0.2
+
+# Nunca se guarda el valor de estos campos, solo que cambiaron
+CAMPOS_SENSIBLES = {'password'}
+OCULTO = '***'
+
+
+def diferencias(antes: dict, despues: dict) -> dict:
+    """{campo: [antes, despues]} de los campos que cambiaron."""
+    cambios = {}
+    for campo, valor in despues.items():
+        anterior = antes.get(campo)
+        if anterior != valor:
+            cambios[campo] = [OCULTO, OCULTO] if campo in CAMPOS_SENSIBLES else [anterior, valor]
+    return cambios
+
+
+def _escribir(registros):
+    """Inserta una lista de dicts de RegistroAuditoria en una sola transacción."""
+    with db.atomic():
+        for inicio in range(0, len(registros), TAMANO_LOTE_AUDITORIA):
+            RegistroAuditoria.insert_many(registros[inicio:inicio + TAMANO_LOTE_AUDITORIA]).execute()
+
+
+class EscritorAuditoria:
+    """
+    Hilo que guarda los registros de auditoría. Los servicios solo arman el
+    diff en memoria y lo encolan después de confirmar su transacción, así
+    la auditoría no alarga las transacciones que serializan las reservas.
+    Al detenerse vacía la cola completa antes de terminar.
+    """
+
+    def __init__(self, capacidad: int = CAPACIDAD_COLA_AUDITORIA):
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._hilo = None
+        self.escritos = 0
+        self.escritos_directo = 0
+
+    def activo(self) -> bool:
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def encolar(self, registro: dict):
+        # Guardamos el hotel de la petición: el hilo escribe en esa misma BD
+        item = (propiedad_actual(), registro)
+        if self.activo():
+            try:
+                self._cola.put(item, timeout=SEGUNDOS_ESPERA_COLA)
+                return
+            except queue.Full:
+                print("Auditoría: cola llena, se escribe el registro en la petición.")
+        # Sin hilo (ej: comandos) o con la cola saturada: escritura directa
+        _escribir([registro])
+        self.escritos_directo += 1
+
+    def iniciar(self):
+        if self.activo():
+            return
+        self._hilo = threading.Thread(target=self._bucle, name="auditoria", daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout: float = 30):
+        if self.activo():
+            self._cola.put(None)  # espera lugar: lo anterior se escribe primero
+            self._hilo.join(timeout=timeout)
+
+    def _juntar_lote(self):
+        """Bloquea hasta el primer registro y junta los que lleguen hasta el límite del lote."""
+        lote = []
+        item = self._cola.get()
+        limite = time.monotonic() + SEGUNDOS_LOTE_AUDITORIA
+        while item is not None:
+            lote.append(item)
+            if len(lote) >= TAMANO_LOTE_AUDITORIA:
+                return lote, False
+            restante = limite - time.monotonic()
+            try:
+                item = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+            except queue.Empty:
+                return lote, False
+        return lote, True
+
+    def _bucle(self):
+        fin = False
+        while not fin:
+            lote, fin = self._juntar_lote()
+            if fin:
+                # Lo que quedó detrás del aviso de cierre también se escribe
+                while True:
+                    try:
+                        item = self._cola.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        lote.append(item)
+
+            por_propiedad = {}
+            for propiedad, registro in lote:
+                por_propiedad.setdefault(propiedad, []).append(registro)
+            for propiedad, registros in por_propiedad.items():
+                try:
+                    with usar_propiedad(*propiedad):
+                        _escribir(registros)
+                    self.escritos += len(registros)
+                except Exception as e:
+                    print(f"Error escribiendo {len(registros)} registros de auditoría: {e}")
+        if not db.is_closed():
+            db.close()
+
+
+escritor_auditoria = EscritorAuditoria()
+
+
+def auditar(actor: str, entidad: str, entidad_id, accion: str, antes: dict, despues: dict):
+    """
+    Registra un cambio (solo si algo cambió). Llamar DESPUÉS de confirmar la
+    transacción del cambio: lo revertido no se audita.
+    """
+    cambios = diferencias(antes, despues)
+    if not cambios:
+        return
+    escritor_auditoria.encolar({
+        "registrado_en": datetime.now(),
+        "actor": actor,
+        "entidad": entidad,
+        "entidad_id": str(entidad_id),
+        "accion": accion,
+        "cambios": json.dumps(cambios, default=str),
+    })
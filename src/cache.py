@@ -0,0 +1,194 @@
+import os
+import sqlite3
+import threading
+import time
+
+from .database import db
+from .models import ContadorCambios, VersionReservasCliente
+
+
+# ==============================================================================
+# CONFIGURACIÓN
+# ==============================================================================
+
+# Cada cuánto (segundos) como máximo se consulta 'PRAGMA data_version'.
+# Es la máxima antigüedad que puede tener un dato en cache tras un cambio.
+SEGUNDOS_ENTRE_CHEQUEOS = float(os.getenv("HOTEL_CACHE_CHEQUEO", "0.1"))
+
+
+def registrar_cambio(nombre: str):
+    """
+    Incrementa el contador de cambios de un área de datos.
+    Llamar dentro de la misma transacción (db.atomic) que el cambio.
+    """
+    (ContadorCambios
+     .insert(nombre=nombre, version=1)
+     .on_conflict(
+         conflict_target=[ContadorCambios.nombre],
+         update={ContadorCambios.version: ContadorCambios.version + 1}
+     )
+     .execute())
+
+
+def registrar_cambio_reservas_cliente(dni: int):
+    """
+    Incrementa la versión de las reservas de un cliente (ETag de 'mis_reservas').
+    Llamar dentro de la misma transacción que el cambio.
+    """
+    (VersionReservasCliente
+     .insert(dni=dni, version=1)
+     .on_conflict(
+         conflict_target=[VersionReservasCliente.dni],
+         update={VersionReservasCliente.version: VersionReservasCliente.version + 1}
+     )
+     .execute())
+
+
+def version_reservas_cliente(dni: int) -> int:
+    """Versión actual de las reservas de un cliente (una búsqueda por clave primaria)."""
+    return (VersionReservasCliente
+            .select(VersionReservasCliente.version)
+            .where(VersionReservasCliente.dni == dni)
+            .scalar()) or 0
+
+
+class _EstadoBase:
+    """Conexión de monitoreo y contadores conocidos de un archivo SQLite."""
+
+    def __init__(self, ruta: str):
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self.pid = os.getpid()
+        self.data_version = None
+        self.ultimo_chequeo = 0.0
+        self.versiones = {}
+
+
+class MonitorVersiones:
+    """
+    Detecta cambios hechos por CUALQUIER conexión (de este u otro worker).
+
+    'PRAGMA data_version' sobre una conexión propia cambia cuando otra
+    conexión confirma una escritura en el archivo. Es una lectura casi
+    gratis: solo si cambió se releen los contadores de 'contadores_cambios'.
+    Se lleva un estado por archivo de BD (uno por hotel); la conexión se abre
+    en el primer uso dentro de cada proceso (nunca se hereda de un fork).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._estados = {}
+
+    def _actualizar(self, ruta: str) -> _EstadoBase:
+        estado = self._estados.get(ruta)
+        if estado is None or estado.pid != os.getpid():
+            estado = self._estados[ruta] = _EstadoBase(ruta)
+
+        ahora = time.monotonic()
+        if ahora - estado.ultimo_chequeo < SEGUNDOS_ENTRE_CHEQUEOS:
+            return estado
+        estado.ultimo_chequeo = ahora
+
+        data_version = estado.conexion.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == estado.data_version:
+            return estado
+        estado.data_version = data_version
+        try:
+            filas = estado.conexion.execute("SELECT nombre, version FROM contadores_cambios")
+            estado.versiones = dict(filas.fetchall())
+        except sqlite3.OperationalError:
+            # La tabla todavía no existe (BD recién creada)
+            estado.versiones = {}
+        return estado
+
+    def version(self, ruta: str, nombre: str) -> int:
+        with self._lock:
+            return self._actualizar(ruta).versiones.get(nombre, 0)
+
+    def olvidar(self, ruta: str):
+        with self._lock:
+            estado = self._estados.pop(ruta, None)
+        if estado is not None and estado.pid == os.getpid():
+            estado.conexion.close()
+
+
+monitor_versiones = MonitorVersiones()
+
+
+def version_cambios(nombre: str) -> int:
+    """Versión de un área de datos en la BD actual (sin consultar, salvo cambios)."""
+    return monitor_versiones.version(db.database, nombre)
+
+
+class CacheCompartida:
+    """
+    Cache en memoria de un área de datos. Se vacía sola cuando el contador
+    de esa área cambia (en este proceso o en otro worker).
+    Los datos se separan por archivo de BD, así cada hotel tiene los suyos.
+    """
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self._por_base = {}  # ruta -> (version, datos)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        _caches.append(self)
+
+    def obtener(self, clave, cargar):
+        """
+        Devuelve el valor en cache para 'clave', o llama a cargar() y lo guarda.
+        Los None no se guardan (ej: un cliente que todavía no existe).
+        """
+        ruta = db.database
+        version = monitor_versiones.version(ruta, self.nombre)
+        with self._lock:
+            version_guardada, datos = self._por_base.get(ruta, (None, None))
+            if version != version_guardada:
+                datos = {}
+                self._por_base[ruta] = (version, datos)
+            if clave in datos:
+                self.aciertos += 1
+                return datos[clave]
+
+        self.fallos += 1
+        valor = cargar()
+        if valor is not None:
+            with self._lock:
+                if self._por_base.get(ruta, (None,))[0] == version:
+                    self._por_base[ruta][1][clave] = valor
+        return valor
+
+    def invalidar(self):
+        """Vacía la cache de la BD actual (después de un cambio en este proceso)."""
+        with self._lock:
+            self._por_base.pop(db.database, None)
+
+    def olvidar(self, ruta: str):
+        with self._lock:
+            self._por_base.pop(ruta, None)
+
+
+_caches = []
+
+# Otras estructuras en memoria por BD (ej: el almacén de analítica)
+_al_olvidar_base = []
+
+
+def al_olvidar_base(funcion):
+    """Registra funcion(ruta) para liberar datos propios cuando se olvida una BD."""
+    _al_olvidar_base.append(funcion)
+
+
+def olvidar_base(ruta: str):
+    """Libera todo lo cacheado de una BD (ej: un hotel que salió del LRU)."""
+    for cache in _caches:
+        cache.olvidar(ruta)
+    for funcion in _al_olvidar_base:
+        funcion(ruta)
+    monitor_versiones.olvidar(ruta)
+
+
+cache_tipos_habitacion = CacheCompartida("tipos_habitacion")
+cache_clientes = CacheCompartida("clientes")
+cache_admins = CacheCompartida("admins")
+cache_tokens_revocados = CacheCompartida("tokens_revocados")
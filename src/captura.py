@@ -0,0 +1,203 @@
+import gzip
+import json
+import os
+import queue
+import random
+import threading
+import time
+from urllib.parse import parse_qs
+
+from .database import hotel_actual
+
+
+# ==============================================================================
+# CAPTURA DE TRÁFICO (PARA REPETIRLO EN PRUEBAS DE RENDIMIENTO)
+# ==============================================================================
+
+# Archivo NDJSON (comprimido si termina en .gz) donde se agregan las
+# peticiones. Vacío = captura apagada (el middleware ni se instala).
+# Con varios workers usar '{pid}' en el nombre: un archivo por proceso.
+ARCHIVO_CAPTURA = os.getenv("HOTEL_CAPTURA_ARCHIVO", "")
+CAPTURA_ACTIVA = bool(ARCHIVO_CAPTURA)
+
+# Fracción de las peticiones que se capturan (1 = todas)
+MUESTREO_CAPTURA = float(os.getenv("HOTEL_CAPTURA_MUESTREO", "1"))
+
+# Cuerpos más grandes se capturan sin contenido (solo se marca 'truncado')
+BYTES_MAXIMOS_CUERPO = 64 * 1024
+
+# Peticiones que pueden esperar en memoria; con la cola llena se descartan
+# (la captura nunca frena al tráfico real)
+CAPACIDAD_COLA_CAPTURA = 10000
+
+# Nunca se guardan: se reemplazan por OCULTO. Los tokens del header
+# Authorization se reemplazan por el principal ('cliente:<dni>', 'admin:<usuario>').
+CAMPOS_SENSIBLES = {'password', 'refresh_token'}
+OCULTO = '***'
+PRINCIPAL_INVALIDO = 'invalido'
+
+
+def sanear(valor):
+    """Copia de 'valor' (dicts/listas anidados) con los campos sensibles ocultos."""
+    if isinstance(valor, dict):
+        return {k: OCULTO if k in CAMPOS_SENSIBLES else sanear(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [sanear(v) for v in valor]
+    return valor
+
+
+def _leer_cuerpo(tipo_contenido: str, cuerpo: bytes):
+    """(formato, contenido saneado) de un cuerpo JSON o de formulario; (None, None) si es otra cosa."""
+    if not cuerpo:
+        return None, None
+    try:
+        if tipo_contenido.startswith("application/json"):
+            return "json", sanear(json.loads(cuerpo))
+        if tipo_contenido.startswith("application/x-www-form-urlencoded"):
+            campos = {k: v[-1] for k, v in parse_qs(cuerpo.decode("utf-8"), keep_blank_values=True).items()}
+            return "form", sanear(campos)
+    except ValueError:
+        pass
+    return None, None
+
+
+class EscritorCaptura:
+    """
+    Hilo que convierte las peticiones capturadas en líneas NDJSON. El
+    middleware solo encola los datos crudos; el saneado (decodificar el JWT,
+    parsear el cuerpo) y la escritura corren acá, fuera del event loop.
+
+    'principal(token)' devuelve 'cliente:<dni>' / 'admin:<usuario>' o None
+    si el token no es válido (lo provee la app).
+    """
+
+    def __init__(self, ruta: str, principal, capacidad: int = CAPACIDAD_COLA_CAPTURA):
+        self.ruta = ruta.replace("{pid}", str(os.getpid()))
+        self.principal = principal
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._hilo = None
+        self.escritas = 0
+        self.descartadas = 0
+
+    def encolar(self, crudo: dict):
+        try:
+            self._cola.put_nowait(crudo)
+        except queue.Full:
+            self.descartadas += 1
+
+    def iniciar(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._hilo = threading.Thread(target=self._bucle, name="captura", daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout: float = 10):
+        if self._hilo is not None and self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join(timeout=timeout)
+        if self.descartadas:
+            print(f"Captura: {self.descartadas} peticiones descartadas (cola llena).")
+
+    def _registro(self, crudo: dict) -> dict:
+        token = crudo.pop("token")
+        principal = None
+        if token is not None:
+            principal = self.principal(token) or PRINCIPAL_INVALIDO
+        formato, contenido = _leer_cuerpo(crudo.pop("tipo_contenido"), crudo.pop("cuerpo"))
+        return dict(crudo, principal=principal, formato=formato, cuerpo=contenido)
+
+    def _bucle(self):
+        abrir = gzip.open if self.ruta.endswith(".gz") else open
+        with abrir(self.ruta, "at", encoding="utf-8") as archivo:
+            fin = False
+            while not fin:
+                item = self._cola.get()
+                # Escribe todo lo acumulado y recién ahí hace flush
+                while item is not None:
+                    try:
+                        archivo.write(json.dumps(self._registro(item), ensure_ascii=False, default=str) + "\n")
+                        self.escritas += 1
+                    except Exception as e:
+                        print(f"Error al capturar una petición: {e}")
+                    try:
+                        item = self._cola.get_nowait()
+                    except queue.Empty:
+                        break
+                fin = item is None
+                archivo.flush()
+
+
+class MiddlewareCaptura:
+    """
+    Middleware ASGI: registra método, ruta (y su plantilla), consulta, cuerpo
+    saneado, principal, estado y duración de cada petición en el archivo de
+    captura. Va por dentro de MiddlewarePropiedad: la ruta queda sin el
+    prefijo /hoteles/{id} y el hotel se guarda aparte.
+    """
+
+    def __init__(self, app, escritor: EscritorCaptura, muestreo: float = MUESTREO_CAPTURA):
+        self.app = app
+        self.escritor = escritor
+        self.muestreo = muestreo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (self.muestreo < 1 and random.random() >= self.muestreo):
+            await self.app(scope, receive, send)
+            return
+
+        ts = time.time()
+        inicio = time.perf_counter()
+        partes, tamano = [], 0
+        estado = None
+
+        async def recibir():
+            nonlocal tamano
+            mensaje = await receive()
+            if mensaje["type"] == "http.request" and tamano <= BYTES_MAXIMOS_CUERPO:
+                cuerpo = mensaje.get("body", b"")
+                tamano += len(cuerpo)
+                partes.append(cuerpo)
+            return mensaje
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, recibir, enviar)
+        finally:
+            token, tipo_contenido = None, ""
+            for nombre, valor in scope["headers"]:
+                if nombre == b"authorization":
+                    esquema, _, token = valor.decode("latin-1").partition(" ")
+                    token = token.strip() if esquema.lower() == "bearer" else None
+                elif nombre == b"content-type":
+                    tipo_contenido = valor.decode("latin-1").lower()
+            ruta = scope.get("route")
+            self.escritor.encolar({
+                "ts": round(ts, 4),
+                "hotel": hotel_actual(),
+                "metodo": scope["method"],
+                "ruta": scope["path"],
+                "plantilla": getattr(ruta, "path", None),
+                "consulta": scope.get("query_string", b"").decode("latin-1"),
+                "token": token,
+                "tipo_contenido": tipo_contenido,
+                "cuerpo": b"".join(partes) if tamano <= BYTES_MAXIMOS_CUERPO else None,
+                "truncado": tamano > BYTES_MAXIMOS_CUERPO,
+                "estado": estado,
+                "ms": round((time.perf_counter() - inicio) * 1000, 3),
+            })
+
+
+def leer_capturas(rutas: list) -> list:
+    """Registros de uno o más archivos de captura (ej: uno por worker), ordenados por 'ts'."""
+    registros = []
+    for ruta in rutas:
+        abrir = gzip.open if ruta.endswith(".gz") else open
+        with abrir(ruta, "rt", encoding="utf-8") as archivo:
+            registros.extend(json.loads(linea) for linea in archivo if linea.strip())
+    registros.sort(key=lambda r: r["ts"])
+    return registros
@@ -0,0 +1,343 @@
+"""
+Comandos de mantenimiento que se ejecutan fuera del servidor web.
+
+Uso:
+    python -m src.comandos sembrar [--hotel ID]
+    python -m src.comandos archivar [--dias 30] [--lote 5000] [--hotel ID]
+    python -m src.comandos importar ARCHIVO [--formato csv|ndjson] [--rechazos RUTA] [--simular] [--hotel ID]
+    python -m src.comandos benchmark-inicio [--repeticiones 5]
+    python -m src.comandos benchmark-workers [--workers 1 2 4 8] [--segundos 10]
+    python -m src.comandos repetir CAPTURA [CAPTURA ...] --bd SNAPSHOT.db [--hoteles DIR] [--velocidad 1] [--salida RUTA]
+    python -m src.comandos comparar-repeticion RESULTADOS_A RESULTADOS_B
+"""
+import argparse
+import json
+import os
+import http.client
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from .database import db, usar_propiedad
+from .esquema import verificar_esquema, sembrar_datos_iniciales
+from .services.reserva_services import (
+    archivar_reservas,
+    DIAS_ANTES_DE_ARCHIVAR,
+    TAMANO_LOTE_ARCHIVADO,
+)
+from .services.importacion_services import importar_reservas, TAMANO_LOTE_IMPORTACION
+
+
+def comando_sembrar(args):
+    verificar_esquema()
+    sembrar_datos_iniciales()
+
+
+def comando_archivar(args):
+    verificar_esquema()
+    archivar_reservas(dias_antiguedad=args.dias, tamano_lote=args.lote)
+
+
+def comando_importar(args):
+    verificar_esquema()
+    formato = args.formato or ('csv' if args.archivo.lower().endswith('.csv') else 'ndjson')
+    rechazos = args.rechazos or f"{args.archivo}.rechazos.ndjson"
+    with open(args.archivo, newline='', encoding='utf-8') as archivo, \
+         open(rechazos, 'w', encoding='utf-8') as archivo_rechazos:
+        resumen = importar_reservas(archivo, formato, archivo_rechazos,
+                                    tamano_lote=args.lote, simular=args.simular)
+    print(json.dumps(resumen))
+    if resumen["rechazadas"]:
+        print(f"Filas rechazadas en: {rechazos}")
+
+
+# Se ejecuta en un intérprete nuevo para medir un arranque en frío real
+_CODIGO_BENCHMARK_INICIO = """
+import asyncio, json, time
+inicio = time.perf_counter()
+from src.app import app
+importado = time.perf_counter()
+listo = None
+
+async def arrancar():
+    global listo
+    async with app.router.lifespan_context(app):
+        listo = time.perf_counter()
+
+asyncio.run(arrancar())
+print(json.dumps({"import": importado - inicio, "listo": listo - inicio}))
+"""
+
+
+def comando_benchmark_inicio(args):
+    """Mide el tiempo de import y el tiempo hasta estar listo para atender."""
+    tiempos_import, tiempos_listo = [], []
+    for _ in range(args.repeticiones):
+        salida = subprocess.run(
+            [sys.executable, "-c", _CODIGO_BENCHMARK_INICIO],
+            capture_output=True, text=True, check=True,
+            env={**os.environ, "HOTEL_PLANIFICADOR": "0"},
+        ).stdout
+        medicion = json.loads(salida.strip().splitlines()[-1])
+        tiempos_import.append(medicion["import"])
+        tiempos_listo.append(medicion["listo"])
+
+    print(f"Import de la app:   min {min(tiempos_import) * 1000:.1f} ms / "
+          f"prom {sum(tiempos_import) / len(tiempos_import) * 1000:.1f} ms")
+    print(f"Listo para atender: min {min(tiempos_listo) * 1000:.1f} ms / "
+          f"prom {sum(tiempos_listo) / len(tiempos_listo) * 1000:.1f} ms")
+
+
+def _esperar_servidor(puerto: int, limite: float = 30.0):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=1)
+            conexion.request("GET", "/api/v1/tipos-habitacion")
+            conexion.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("El servidor no respondió a tiempo")
+
+
+def _medir_throughput(puerto: int, ruta: str, hilos: int, segundos: float) -> float:
+    """Lanza 'hilos' clientes keep-alive contra 'ruta' y devuelve peticiones/segundo."""
+    contadores = [0] * hilos
+    fin = time.monotonic() + segundos
+
+    def cliente(i):
+        conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=10)
+        while time.monotonic() < fin:
+            conexion.request("GET", ruta)
+            conexion.getresponse().read()
+            contadores[i] += 1
+        conexion.close()
+
+    trabajadores = [threading.Thread(target=cliente, args=(i,)) for i in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    return sum(contadores) / segundos
+
+
+def comando_benchmark_workers(args):
+    """
+    Levanta 'uvicorn src.app:app --workers N' para cada N y mide peticiones
+    por segundo contra un endpoint de lectura cacheado.
+    """
+    ruta = "/api/v1/tipos-habitacion"
+    for cantidad in args.workers:
+        servidor = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "src.app:app",
+             "--port", str(args.puerto), "--workers", str(cantidad), "--log-level", "warning"],
+            stdout=subprocess.DEVNULL,
+            env={**os.environ, "HOTEL_PLANIFICADOR": "0"},
+        )
+        try:
+            _esperar_servidor(args.puerto)
+            rps = _medir_throughput(args.puerto, ruta, hilos=args.hilos, segundos=args.segundos)
+            print(f"{cantidad} worker(s): {rps:,.0f} peticiones/s")
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+
+def comando_repetir(args):
+    """
+    Repite una captura de tráfico contra una app nueva (la de 'args.codigo',
+    por defecto esta) que usa una copia del snapshot, y guarda estado,
+    latencia y huella de cada respuesta para compararlas con otra corrida.
+    """
+    from .captura import leer_capturas
+    from .repeticion import preparar_copia, repetir_registros
+
+    registros = leer_capturas(args.capturas)
+    if not registros:
+        print("La captura no tiene peticiones.")
+        return
+    codigo = os.path.abspath(args.codigo or os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    version = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=codigo,
+                             capture_output=True, text=True).stdout.strip() or None
+
+    with tempfile.TemporaryDirectory(prefix="repeticion-") as directorio:
+        preparar_copia(args.bd, args.hoteles, directorio)
+        # La app repetida no captura, no corre tareas programadas y sus
+        # avisos quedan en el directorio temporal. Tampoco limita los logins:
+        # todos llegan desde 127.0.0.1 y el balde por IP devolvería 429 que en
+        # producción no existieron (las capacidades son para un 'codigo' más
+        # viejo, sin HOTEL_LOGIN_LIMITE)
+        servidor = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "src.app:app",
+             "--port", str(args.puerto), "--log-level", "warning"],
+            cwd=directorio, stdout=subprocess.DEVNULL,
+            env={**os.environ, "PYTHONPATH": codigo, "HOTEL_PLANIFICADOR": "0",
+                 "HOTEL_CAPTURA_ARCHIVO": "", "HOTEL_DIRECTORIO_HOTELES": "hoteles",
+                 "HOTEL_OUTBOX_ARCHIVO": "outbox.ndjson", "HOTEL_OUTBOX_SMTP_DIR": "correos",
+                 "HOTEL_LOGIN_LIMITE": "0", "HOTEL_LOGIN_CAPACIDAD_IP": "1000000000",
+                 "HOTEL_LOGIN_CAPACIDAD_CUENTA": "1000000000"},
+        )
+        try:
+            _esperar_servidor(args.puerto)
+            inicio = time.monotonic()
+            peticiones = repetir_registros(registros, directorio, args.puerto,
+                                           velocidad=args.velocidad, concurrencia=args.concurrencia)
+            segundos = time.monotonic() - inicio
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+    salida = args.salida or f"repeticion-{version or 'local'}.json"
+    with open(salida, "w", encoding="utf-8") as archivo:
+        json.dump({
+            "codigo": codigo,
+            "version": version,
+            "capturas": args.capturas,
+            "velocidad": args.velocidad,
+            "concurrencia": args.concurrencia,
+            "segundos": round(segundos, 3),
+            "peticiones": peticiones,
+        }, archivo)
+    fallidas = sum(1 for p in peticiones if p["estado"] is None)
+    print(f"{len(peticiones)} peticiones repetidas en {segundos:.1f} s"
+          f"{f' ({fallidas} sin respuesta)' if fallidas else ''}. Resultados en: {salida}")
+
+
+def comando_comparar_repeticion(args):
+    """Compara latencias y respuestas de dos corridas de 'repetir'."""
+    from .repeticion import comparar_resultados
+
+    with open(args.a, encoding="utf-8") as archivo_a, open(args.b, encoding="utf-8") as archivo_b:
+        a, b = json.load(archivo_a), json.load(archivo_b)
+    comparacion = comparar_resultados(a, b)
+
+    print(f"A: {a.get('version') or args.a}   B: {b.get('version') or args.b}")
+    print(f"{'ruta':<60} {'n':>6} {'p50 A':>9} {'p50 B':>9} {'p95 A':>9} {'p95 B':>9} {'p99 A':>9} {'p99 B':>9} {'Δp95':>8}")
+    filas = comparacion["rutas"] + [{"ruta": "TOTAL", **comparacion["total"], "cambio_p95": None}]
+    for fila in filas:
+        da, dbb = fila["a"], fila["b"]
+        cambio = fila["cambio_p95"]
+        if fila["ruta"] == "TOTAL" and da["p95"]:
+            cambio = round((dbb["p95"] / da["p95"] - 1) * 100, 1)
+        print(f"{fila['ruta'][:60]:<60} {max(da['cantidad'], dbb['cantidad']):>6} "
+              f"{da['p50']:>9.2f} {dbb['p50']:>9.2f} {da['p95']:>9.2f} {dbb['p95']:>9.2f} "
+              f"{da['p99']:>9.2f} {dbb['p99']:>9.2f} {'' if cambio is None else f'{cambio:+.1f}%':>8}")
+
+    print(f"\nRespuestas distintas: {comparacion['cantidad_distintas']} de {comparacion['comparadas']}")
+    for distinta in comparacion["distintas"]:
+        print(f"  #{distinta['indice']} {distinta['ruta']}: {distinta['estado_a']} -> {distinta['estado_b']}")
+    if len(a["peticiones"]) != len(b["peticiones"]):
+        print(f"Atención: las corridas tienen distinta cantidad de peticiones "
+              f"({len(a['peticiones'])} y {len(b['peticiones'])}).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comandos de mantenimiento del Hotel.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p_sembrar = subparsers.add_parser(
+        "sembrar",
+        help="Crea el admin por defecto y los tipos/habitaciones iniciales."
+    )
+    p_sembrar.add_argument("--hotel", help="Hotel (propiedad) a sembrar; se crea si no existe.")
+    p_sembrar.set_defaults(funcion=comando_sembrar, usa_bd=True)
+
+    p_archivar = subparsers.add_parser(
+        "archivar",
+        help="Mueve reservas canceladas y finalizadas a reservas_historico."
+    )
+    p_archivar.add_argument("--dias", type=int, default=DIAS_ANTES_DE_ARCHIVAR,
+                            help="Días desde el check-out para archivar una reserva.")
+    p_archivar.add_argument("--lote", type=int, default=TAMANO_LOTE_ARCHIVADO,
+                            help="Cantidad de reservas movidas por transacción.")
+    p_archivar.add_argument("--hotel", help="Hotel (propiedad) a archivar; por defecto la BD principal.")
+    p_archivar.set_defaults(funcion=comando_archivar, usa_bd=True)
+
+    p_importar = subparsers.add_parser(
+        "importar",
+        help="Importa reservas de otro sistema desde un CSV o NDJSON."
+    )
+    p_importar.add_argument("archivo")
+    p_importar.add_argument("--formato", choices=["csv", "ndjson"],
+                            help="Por defecto según la extensión del archivo.")
+    p_importar.add_argument("--rechazos", help="Archivo NDJSON con las filas rechazadas y el motivo.")
+    p_importar.add_argument("--lote", type=int, default=TAMANO_LOTE_IMPORTACION,
+                            help="Filas por INSERT.")
+    p_importar.add_argument("--simular", action="store_true",
+                            help="Valida y detecta conflictos sin guardar nada.")
+    p_importar.add_argument("--hotel", help="Hotel (propiedad) destino; por defecto la BD principal.")
+    p_importar.set_defaults(funcion=comando_importar, usa_bd=True)
+
+    p_benchmark = subparsers.add_parser(
+        "benchmark-inicio",
+        help="Mide el tiempo de arranque en frío de la app."
+    )
+    p_benchmark.add_argument("--repeticiones", type=int, default=5)
+    p_benchmark.set_defaults(funcion=comando_benchmark_inicio, usa_bd=False)
+
+    p_workers = subparsers.add_parser(
+        "benchmark-workers",
+        help="Mide el throughput de uvicorn con distinta cantidad de workers."
+    )
+    p_workers.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    p_workers.add_argument("--segundos", type=float, default=10)
+    p_workers.add_argument("--hilos", type=int, default=32, help="Clientes concurrentes.")
+    p_workers.add_argument("--puerto", type=int, default=8765)
+    p_workers.set_defaults(funcion=comando_benchmark_workers, usa_bd=False)
+
+    p_repetir = subparsers.add_parser(
+        "repetir",
+        help="Repite una captura de tráfico (HOTEL_CAPTURA_ARCHIVO) contra una copia de la BD."
+    )
+    p_repetir.add_argument("capturas", nargs="+", help="Archivos de captura (uno por worker).")
+    p_repetir.add_argument("--bd", required=True, help="Snapshot de hotel.db tomado al empezar la captura.")
+    p_repetir.add_argument("--hoteles", help="Directorio con los <hotel>.db del mismo momento.")
+    p_repetir.add_argument("--velocidad", type=float, default=1.0,
+                           help="1 = tiempos originales, 10 = diez veces más rápido, 0 = sin esperas.")
+    p_repetir.add_argument("--concurrencia", type=int, default=1,
+                           help="Peticiones en curso a la vez (1 = respuestas comparables una a una).")
+    p_repetir.add_argument("--codigo", help="Raíz de la versión a probar (la que contiene src/); por defecto esta.")
+    p_repetir.add_argument("--salida", help="Archivo JSON de resultados.")
+    p_repetir.add_argument("--puerto", type=int, default=8766)
+    p_repetir.set_defaults(funcion=comando_repetir, usa_bd=False)
+
+    p_comparar = subparsers.add_parser(
+        "comparar-repeticion",
+        help="Compara latencias y respuestas de dos corridas de 'repetir'."
+    )
+    p_comparar.add_argument("a")
+    p_comparar.add_argument("b")
+    p_comparar.set_defaults(funcion=comando_comparar_repeticion, usa_bd=False)
+
+    args = parser.parse_args()
+
+    if not args.usa_bd:
+        args.funcion(args)
+        return
+
+    base = None
+    if args.hotel:
+        from .propiedades import shards_hoteles, ID_HOTEL_VALIDO
+        if not ID_HOTEL_VALIDO.fullmatch(args.hotel):
+            parser.error(f"Id de hotel inválido: {args.hotel}")
+        # Solo 'sembrar' da de alta un hotel nuevo
+        if args.funcion is comando_sembrar:
+            base = shards_hoteles.crear(args.hotel)
+        else:
+            base = shards_hoteles.obtener(args.hotel)
+            if base is None:
+                parser.error(f"El hotel {args.hotel} no existe.")
+
+    with usar_propiedad(args.hotel, base):
+        db.connect(reuse_if_open=True)
+        try:
+            args.funcion(args)
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+
+# ==============================================================================
+# LÍMITES DE CONCURRENCIA POR CLASE DE RUTA
+# ==============================================================================
+
+# Cada clase tiene "limite" peticiones en curso y hasta "cola" esperando.
+# Se configuran con HOTEL_CONCURRENCIA_<CLASE>="limite/cola".
+# La suma de los límites por defecto (38) queda por debajo de los 40 hilos
+# del threadpool de FastAPI: una clase saturada (ej: un export del admin o
+# una ola de logins) nunca deja sin hilos a las demás.
+LIMITES_POR_DEFECTO = {
+    'autenticacion': (8, 32),     # login, registro, refresh: hash de contraseñas
+    'reservas': (12, 64),         # crear / modificar / cancelar reservas
+    'lecturas': (14, 128),        # resto de las rutas de clientes
+    'admin': (4, 16),             # reportes, búsquedas y feed ARI
+}
+
+# Segundos máximos en cola antes de responder 503 (menos que el timeout del balanceador)
+SEGUNDOS_ESPERA_COLA = float(os.getenv("HOTEL_CONCURRENCIA_ESPERA", "10"))
+
+SEGUNDOS_REINTENTO = int(os.getenv("HOTEL_CONCURRENCIA_REINTENTO", "2"))
+
+# Rutas que no pasan por ningún límite (ej: las métricas, para poder verlas con todo saturado)
+RUTAS_SIN_LIMITE = {"/api/v1/admin/concurrencia"}
+
+
+def _leer_limite(clase: str, por_defecto):
+    valor = os.getenv(f"HOTEL_CONCURRENCIA_{clase.upper()}")
+    if not valor:
+        return por_defecto
+    limite, _, cola = valor.partition("/")
+    return int(limite), int(cola or por_defecto[1])
+
+
+def clase_de_ruta(metodo: str, ruta: str):
+    """Clase de la ruta (ya sin el prefijo /hoteles/{id}), o None si no se limita."""
+    if ruta in RUTAS_SIN_LIMITE:
+        return None
+    if (ruta.endswith("/iniciar_sesion") or ruta.startswith("/api/v1/token/")
+            or ruta == "/api/v1/clientes/registrar"):
+        return 'autenticacion'
+    if ruta.startswith("/api/v1/admin/") or ruta.startswith("/api/v1/ari/"):
+        return 'admin'
+    if ruta.startswith("/api/v1/reservas") and metodo != "GET":
+        return 'reservas'
+    if ruta.startswith("/api/v1/clientes/") and metodo == "PUT":
+        return 'autenticacion'  # puede cambiar la contraseña (hash)
+    return 'lecturas'
+
+
+class LimiteConcurrencia:
+    """
+    Semáforo con cola acotada para una clase de rutas.
+
+    Todo corre en el event loop (un solo hilo), así que los contadores no
+    necesitan lock. Cada petición que espera tiene su propio Future; al
+    terminar una petición, el lugar pasa directo al primero de la cola (FIFO).
+    """
+
+    def __init__(self, nombre: str, limite: int, cola: int, espera_maxima: float = SEGUNDOS_ESPERA_COLA):
+        self.nombre = nombre
+        self.limite = limite
+        self.cola = cola
+        self.espera_maxima = espera_maxima
+        self.en_curso = 0
+        self._esperando = deque()
+        # Métricas
+        self.atendidas = 0
+        self.rechazadas = 0      # cola llena: 503 inmediato
+        self.vencidas = 0        # esperaron espera_maxima sin lugar: 503
+        self.segundos_espera = 0.0
+        self.maximo_en_cola = 0
+
+    async def entrar(self) -> bool:
+        """Toma un lugar (esperando si hace falta). Devuelve False si hay que rechazar."""
+        if self.en_curso < self.limite and not self._esperando:
+            self.en_curso += 1
+            self.atendidas += 1
+            return True
+        if len(self._esperando) >= self.cola:
+            self.rechazadas += 1
+            return False
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._esperando.append(futuro)
+        self.maximo_en_cola = max(self.maximo_en_cola, len(self._esperando))
+        inicio = time.monotonic()
+        try:
+            await asyncio.wait_for(futuro, self.espera_maxima)
+        except asyncio.TimeoutError:
+            self._quitar(futuro)
+            self.vencidas += 1
+            return False
+        except asyncio.CancelledError:
+            # El cliente se fue; si justo le habían pasado el lugar, se devuelve
+            self._quitar(futuro)
+            if futuro.done() and not futuro.cancelled():
+                self.salir()
+            raise
+        finally:
+            self.segundos_espera += time.monotonic() - inicio
+        self.atendidas += 1
+        return True
+
+    def salir(self):
+        """Libera el lugar: pasa al siguiente en la cola o descuenta uno en curso."""
+        while self._esperando:
+            futuro = self._esperando.popleft()
+            if not futuro.done():
+                futuro.set_result(None)
+                return
+        self.en_curso -= 1
+
+    def _quitar(self, futuro):
+        try:
+            self._esperando.remove(futuro)
+        except ValueError:
+            pass
+
+    def metricas(self) -> dict:
+        return {
+            "clase": self.nombre,
+            "limite": self.limite,
+            "cola_maxima": self.cola,
+            "en_curso": self.en_curso,
+            "en_cola": len(self._esperando),
+            "maximo_en_cola": self.maximo_en_cola,
+            "atendidas": self.atendidas,
+            "rechazadas": self.rechazadas,
+            "vencidas": self.vencidas,
+            "espera_promedio_ms": round(self.segundos_espera / self.atendidas * 1000, 2) if self.atendidas else 0.0,
+        }
+
+
+limites_concurrencia = {
+    clase: LimiteConcurrencia(clase, *_leer_limite(clase, por_defecto))
+    for clase, por_defecto in LIMITES_POR_DEFECTO.items()
+}
+
+
+def metricas_concurrencia() -> list:
+    return [limite.metricas() for limite in limites_concurrencia.values()]
+
+
+class MiddlewareConcurrencia:
+    """
+    Middleware ASGI: antes de pasar la petición al endpoint toma un lugar en
+    el límite de su clase. Si la cola de esa clase está llena (o la espera
+    vence) responde 503 con Retry-After sin ocupar ningún hilo.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        clase = clase_de_ruta(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if clase is None:
+            await self.app(scope, receive, send)
+            return
+
+        limite = limites_concurrencia[clase]
+        if not await limite.entrar():
+            await self._responder_503(send, clase)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limite.salir()
+
+    async def _responder_503(self, send, clase: str):
+        cuerpo = json.dumps({"detail": f"Servidor saturado ({clase}). Intente más tarde."}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [(b"content-type", b"application/json"),
+                        (b"content-length", str(len(cuerpo)).encode()),
+                        (b"retry-after", str(SEGUNDOS_REINTENTO).encode())],
+        })
+        await send({"type": "http.response.body", "body": cuerpo})
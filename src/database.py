@@ -1,8 +1,80 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from peewee import *
 
 
-db = SqliteDatabase('hotel.db')
+PRAGMAS_SQLITE = {
+    # WAL permite que varios procesos (workers de uvicorn) lean mientras otro escribe,
+    # y busy_timeout hace que un escritor espere al otro en vez de fallar con "database is locked".
+    'journal_mode': 'wal',
+    'busy_timeout': 5000,
+    'synchronous': 'normal',
+}
+
+# BD del hotel por defecto (rutas sin /hoteles/{id})
+db_principal = SqliteDatabase('hotel.db', pragmas=PRAGMAS_SQLITE)
+
+# (hotel_id, base_de_datos) de la petición en curso; None = BD principal
+_propiedad_actual = ContextVar('propiedad_actual', default=None)
+
+
+class BaseDatosPorPropiedad(DatabaseProxy):
+    """
+    Proxy que los modelos usan como 'database'. Cada operación se delega a la
+    BD de la propiedad (hotel) activa en el contexto actual, o a la principal.
+
+    A diferencia de Model.bind_ctx(), no cambia nada global: dos peticiones
+    de hoteles distintos pueden correr a la vez en hilos distintos.
+    """
+
+    def actual(self):
+        propiedad = _propiedad_actual.get()
+        return propiedad[1] if propiedad else db_principal
+
+    def __getattr__(self, attr):
+        return getattr(self.actual(), attr)
+
+    def __enter__(self):
+        return self.actual().__enter__()
+
+    def __exit__(self, *args):
+        return self.actual().__exit__(*args)
+
+
+db = BaseDatosPorPropiedad()
 
 class BaseModel(Model):
     class Meta:
         database = db
+
+
+def hotel_actual():
+    """Id del hotel de la petición en curso (None para la BD principal)."""
+    propiedad = _propiedad_actual.get()
+    return propiedad[0] if propiedad else None
+
+
+def propiedad_actual():
+    """(hotel_id, base) de la petición en curso, para pasarlo a otro hilo."""
+    return _propiedad_actual.get() or (None, None)
+
+
+@contextmanager
+def usar_propiedad(hotel_id, base):
+    """Ejecuta el bloque con los modelos apuntando a la BD de 'hotel_id'."""
+    token = _propiedad_actual.set((hotel_id, base) if base is not None else None)
+    try:
+        yield
+    finally:
+        _propiedad_actual.reset(token)
+
+
+def _descartar_conexion_heredada():
+    # Una conexión SQLite no se puede usar en un proceso hijo después de un fork:
+    # el hijo olvida la del padre (sin cerrarla) y abre la suya en el primer uso.
+    db_principal._state.reset()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_descartar_conexion_heredada)
@@ -0,0 +1,139 @@
+"""
+Esquema de la base de datos y datos iniciales.
+
+El arranque de la app solo compara 'PRAGMA user_version' con VERSION_ESQUEMA
+(una lectura) y crea tablas/índices únicamente si no coinciden. La carga de
+datos iniciales (admin por defecto, tipos y habitaciones) es un comando aparte:
+
+    python -m src.comandos sembrar
+"""
+from .database import db
+from .models import (
+    Cliente, TipoHabitacion, Habitacion, Reserva, ReservaHistorico,
+    BloqueoHabitacion, ListaEspera, RetencionHabitacion, Admin, LeaseTarea, ContadorCambios, CambioReserva,
+    TokenRefresco, VersionReservasCliente, CambioInventario, RegistroAuditoria, MensajeSalida
+)
+from .services.cliente_services import crear_indice_busqueda_clientes
+from .services.analitica_services import crear_registro_cambios_reservas
+from .cache import registrar_cambio
+
+# Subir este número cada vez que se agregue un modelo o índice nuevo
+VERSION_ESQUEMA = 11
+
+MODELOS = [
+    Cliente, TipoHabitacion, Habitacion, Reserva, ReservaHistorico,
+    BloqueoHabitacion, ListaEspera, RetencionHabitacion, Admin, LeaseTarea, ContadorCambios, CambioReserva,
+    TokenRefresco, VersionReservasCliente, CambioInventario, RegistroAuditoria, MensajeSalida
+]
+
+
+def version_esquema_actual() -> int:
+    return db.execute_sql("PRAGMA user_version").fetchone()[0]
+
+
+def _agregar_columnas_faltantes():
+    """
+    Agrega a las tablas existentes las columnas nuevas de los modelos.
+    Solo sirve para columnas que aceptan NULL: las filas viejas quedan en NULL.
+    """
+    from playhouse.migrate import SqliteMigrator, migrate
+
+    migrador = SqliteMigrator(db)
+    operaciones = []
+    for modelo in MODELOS:
+        tabla = modelo._meta.table_name
+        existentes = {columna.name for columna in db.get_columns(tabla)}
+        for campo in modelo._meta.sorted_fields:
+            if campo.column_name not in existentes:
+                print(f"Agregando columna {tabla}.{campo.column_name}...")
+                operaciones.append(migrador.add_column(tabla, campo.column_name, campo))
+    if operaciones:
+        migrate(*operaciones)
+
+
+def verificar_esquema() -> bool:
+    """
+    Crea las tablas e índices si la BD no está en VERSION_ESQUEMA.
+    Devuelve True si tuvo que crear/actualizar algo.
+    """
+    if version_esquema_actual() == VERSION_ESQUEMA:
+        return False
+
+    with db.atomic():
+        db.create_tables(MODELOS, safe=True)
+        _agregar_columnas_faltantes()
+        crear_indice_busqueda_clientes()
+        crear_registro_cambios_reservas()
+    db.execute_sql(f"PRAGMA user_version = {VERSION_ESQUEMA}")
+    return True
+
+
+def sembrar_datos_iniciales():
+    """Crea el admin por defecto y los tipos/habitaciones si no existen."""
+    from werkzeug.security import generate_password_hash
+
+    with db.atomic():
+        #  Crear Admin por defecto 
+        if Admin.select().count() == 0:
+            print("Creando usuario admin por defecto (hotelp / admin1234)...")
+            Admin.create(
+                username='hotelp',
+                password=generate_password_hash('admin1234')
+            )
+            print("Usuario admin creado.")
+        
+        if Habitacion.select().count() == 0:
+            print("Base de datos vacía. Creando tipos y habitaciones...")
+            
+            # Crear Tipos de Habitación 
+            tipo_normal = TipoHabitacion.create(
+                nombre_tipo='Normal (King Size)',
+                descripcion='Habitación estándar con cama King Size.',
+                capacidad_maxima=2,
+                tarifa_base=9000,
+                cantidad_total=10
+            )
+            tipo_individual = TipoHabitacion.create(
+                nombre_tipo='Individual',
+                descripcion='Habitación para una persona.',
+                capacidad_maxima=1,
+                tarifa_base=6000,
+                cantidad_total=9
+            )
+            tipo_familiar = TipoHabitacion.create(
+                nombre_tipo='Grande (Familiar)',
+                descripcion='Habitación amplia para familias.',
+                capacidad_maxima=4,
+                tarifa_base=12000,
+                cantidad_total=9
+            )
+            tipo_suite = TipoHabitacion.create(
+                nombre_tipo='Suite',
+                descripcion='Suite de lujo con sala de estar.',
+                capacidad_maxima=3,
+                tarifa_base=18000,
+                cantidad_total=2
+            )
+
+            # Crear Habitaciones 
+            print("Creando 10 habitaciones 'Normal (King Size)' (Piso 1)...")
+            for i in range(1, 11):
+                Habitacion.create(numero=f'1{i:02d}', tipo=tipo_normal, estado='Activa')
+
+            print("Creando 9 habitaciones 'Individual' (Piso 2)...")
+            for i in range(1, 10):
+                Habitacion.create(numero=f'2{i:02d}', tipo=tipo_individual, estado='Activa')
+            
+            print("Creando 9 habitaciones 'Grande (Familiar)' (Piso 3)...")
+            for i in range(1, 10):
+                Habitacion.create(numero=f'3{i:02d}', tipo=tipo_familiar, estado='Activa')
+            
+            print("Creando 2 habitaciones 'Suite' (Piso 4)...")
+            for i in range(1, 3):
+                Habitacion.create(numero=f'4{i:02d}', tipo=tipo_suite, estado='Activa')
+            
+            registrar_cambio('tipos_habitacion')
+            print("¡Éxito! 4 Tipos y 30 Habitaciones creadas.")
+
+        else:
+            print("La base de datos ya contiene habitaciones. No se crearon datos nuevos.")
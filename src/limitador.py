@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+import zlib
+
+
+# ==============================================================================
+# CONFIGURACIÓN DEL LIMITADOR DE LOGIN
+# ==============================================================================
+
+# "0" apaga el limitador (ej: la app de 'comandos repetir', donde todos los
+# logins llegan desde 127.0.0.1)
+LIMITE_LOGIN_ACTIVO = os.getenv("HOTEL_LOGIN_LIMITE", "1") == "1"
+
+# Cada clave (IP o cuenta) tiene un "balde" con CAPACIDAD fichas que se
+# recarga a razón de RECARGA fichas por segundo.
+LOGIN_CAPACIDAD_POR_IP = int(os.getenv("HOTEL_LOGIN_CAPACIDAD_IP", "20"))
+LOGIN_RECARGA_POR_IP = float(os.getenv("HOTEL_LOGIN_RECARGA_IP", "0.5"))  # 30 por minuto
+LOGIN_CAPACIDAD_POR_CUENTA = int(os.getenv("HOTEL_LOGIN_CAPACIDAD_CUENTA", "5"))
+LOGIN_RECARGA_POR_CUENTA = float(os.getenv("HOTEL_LOGIN_RECARGA_CUENTA", "0.1"))  # 6 por minuto
+
+# Cantidad de proxies reversos propios delante de la app (nginx, balanceador).
+# Con 0 la IP del balde es la de la conexión; detrás de un proxy esa es la del
+# proxy y todos los clientes compartirían un balde. Con N > 0 se toma la IP
+# que el N-ésimo proxy (contando desde la app) agregó a X-Forwarded-For.
+# No subirlo por encima de los proxies reales: el cliente escribe lo que
+# quiera a la izquierda de la cabecera y elegiría su propio balde.
+PROXIES_CONFIABLES = int(os.getenv("HOTEL_PROXIES_CONFIABLES", "0"))
+
+CANTIDAD_SHARDS = 16
+OPERACIONES_ENTRE_DESALOJOS = 1024
+
+
+class LimitadorTokenBucket:
+    """
+    Limitador en memoria basado en 'token bucket'.
+
+    Las claves se reparten en varios shards (dict + lock) para que los
+    hilos del threadpool no compitan todos por el mismo lock. Cada clave
+    activa ocupa una sola lista [fichas, ultimo_instante].
+    Cada cierto número de operaciones se desalojan las claves que ya se
+    recargaron por completo (equivalen a una clave nueva).
+    """
+
+    def __init__(self, capacidad: int, recarga_por_segundo: float, shards: int = CANTIDAD_SHARDS):
+        self.capacidad = float(capacidad)
+        self.recarga = float(recarga_por_segundo)
+        # Tiempo que tarda un balde vacío en llenarse de nuevo
+        self.tiempo_llenado = self.capacidad / self.recarga
+        self._shards = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._contadores = [0] * shards
+
+    def _indice(self, clave: str) -> int:
+        return zlib.crc32(clave.encode()) % len(self._shards)
+
+    def consumir(self, clave: str) -> float:
+        """
+        Intenta consumir una ficha para la clave.
+        Devuelve 0 si se permite, o los segundos a esperar si no.
+        """
+        i = self._indice(clave)
+        ahora = time.monotonic()
+        with self._locks[i]:
+            shard = self._shards[i]
+            self._contadores[i] += 1
+            if self._contadores[i] >= OPERACIONES_ENTRE_DESALOJOS:
+                self._contadores[i] = 0
+                self._desalojar(shard, ahora)
+
+            balde = shard.get(clave)
+            if balde is None:
+                shard[clave] = [self.capacidad - 1, ahora]
+                return 0.0
+
+            fichas = min(self.capacidad, balde[0] + (ahora - balde[1]) * self.recarga)
+            balde[1] = ahora
+            if fichas >= 1:
+                balde[0] = fichas - 1
+                return 0.0
+
+            balde[0] = fichas
+            return (1 - fichas) / self.recarga
+
+    def _desalojar(self, shard: dict, ahora: float):
+        """Elimina las claves cuyo balde ya estaría lleno (inactivas)."""
+        inactivas = [clave for clave, (_, ultimo) in shard.items()
+                     if ahora - ultimo >= self.tiempo_llenado]
+        for clave in inactivas:
+            del shard[clave]
+
+    def claves_activas(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+
+limitador_login_ip = LimitadorTokenBucket(LOGIN_CAPACIDAD_POR_IP, LOGIN_RECARGA_POR_IP)
+limitador_login_cuenta = LimitadorTokenBucket(LOGIN_CAPACIDAD_POR_CUENTA, LOGIN_RECARGA_POR_CUENTA)
+
+
+def ip_cliente(ip_conexion: str, x_forwarded_for: str = None, proxies: int = None) -> str:
+    """
+    IP del cliente para el limitador. Cada proxy agrega a la derecha de
+    X-Forwarded-For la dirección desde la que recibió la petición, así que
+    con N proxies confiables el cliente es la N-ésima entrada desde la derecha.
+    """
+    proxies = PROXIES_CONFIABLES if proxies is None else proxies
+    if proxies <= 0 or not x_forwarded_for:
+        return ip_conexion
+    saltos = [ip.strip() for ip in x_forwarded_for.split(",") if ip.strip()]
+    if not saltos:
+        return ip_conexion
+    return saltos[-min(proxies, len(saltos))]
+
+
+def verificar_intento_login(ip: str, cuenta: str) -> float:
+    """
+    Verifica los límites por IP y por cuenta ANTES de tocar la BD
+    o calcular el hash. Devuelve 0 si se permite el intento, o los
+    segundos que el cliente debe esperar (para el header Retry-After).
+    """
+    if not LIMITE_LOGIN_ACTIVO:
+        return 0.0
+    espera_ip = limitador_login_ip.consumir(f"ip:{ip}")
+    if espera_ip > 0:
+        return espera_ip
+    return limitador_login_cuenta.consumir(f"cuenta:{cuenta.lower()}")
+
+
+# ==============================================================================
+# BENCHMARK: python -m src.limitador
+# ==============================================================================
+
+def benchmark_ataque(cantidad_claves: int = 10_000, intentos_por_clave: int = 10):
+    """Simula un credential-stuffing con muchas IPs y cuentas distintas."""
+    limitador = LimitadorTokenBucket(LOGIN_CAPACIDAD_POR_CUENTA, LOGIN_RECARGA_POR_CUENTA)
+    rechazados = 0
+    inicio = time.perf_counter()
+    for _ in range(intentos_por_clave):
+        for n in range(cantidad_claves):
+            if limitador.consumir(f"cuenta:victima{n}@email.com") > 0:
+                rechazados += 1
+    duracion = time.perf_counter() - inicio
+    total = cantidad_claves * intentos_por_clave
+
+    print(f"Intentos: {total} sobre {cantidad_claves} claves")
+    print(f"Rechazados: {rechazados}")
+    print(f"Claves activas: {limitador.claves_activas()}")
+    print(f"Tiempo total: {duracion:.3f}s ({duracion / total * 1e6:.2f} µs por intento)")
+
+
+if __name__ == "__main__":
+    benchmark_ataque()
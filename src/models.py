@@ -1,5 +1,7 @@
+import datetime
 import peewee
 from peewee import Model
+from playhouse.sqlite_ext import AutoIncrementField
 from .database import BaseModel
 
 
@@ -43,10 +45,88 @@ class Reserva(BaseModel):
     total_personas = peewee.IntegerField()
     costo_total = peewee.IntegerField(null=True) # Se calcula en el servicio
     estado_reserva = peewee.CharField(max_length=20, default='Confirmada') # Ej: Confirmada, Cancelada
+    creada_en = peewee.DateTimeField(null=True, default=datetime.datetime.now) # NULL en reservas anteriores a la columna
+    # Estadía dividida (el huésped cambia de habitación): id del primer tramo,
+    # el mismo en todos los tramos. NULL en las reservas comunes.
+    grupo_estadia = peewee.IntegerField(null=True)
 
     class Meta:
         table_name = 'reservas'
+        indexes = (
+            # Reservas que se solapan con una ventana: fecha_checkout > desde
+            (('fecha_checkout', 'fecha_checkin'), False),
+        )
         
+class ReservaHistorico(BaseModel):
+    # Misma estructura que Reserva. Guarda reservas ya finalizadas o canceladas
+    # para que la tabla 'reservas' se mantenga chica. Conserva el id original.
+    id = peewee.IntegerField(primary_key=True)
+    cliente = peewee.ForeignKeyField(Cliente, backref='reservas_historicas', field=Cliente.dni, on_delete='CASCADE')
+    habitacion = peewee.ForeignKeyField(Habitacion, backref='reservas_historicas_habitacion', on_delete='CASCADE')
+    fecha_checkin = peewee.DateField()
+    fecha_checkout = peewee.DateField(index=True)
+    total_personas = peewee.IntegerField()
+    costo_total = peewee.IntegerField(null=True)
+    estado_reserva = peewee.CharField(max_length=20)
+    creada_en = peewee.DateTimeField(null=True)
+    grupo_estadia = peewee.IntegerField(null=True)
+
+    class Meta:
+        table_name = 'reservas_historico'
+
+class BloqueoHabitacion(BaseModel):
+    # Período en que una habitación no se puede reservar (ej: pintura, arreglos).
+    # La disponibilidad lo trata igual que una reserva: [fecha_inicio, fecha_fin)
+    id = peewee.AutoField()
+    habitacion = peewee.ForeignKeyField(Habitacion, backref='bloqueos', on_delete='CASCADE')
+    fecha_inicio = peewee.DateField()
+    fecha_fin = peewee.DateField()
+    motivo = peewee.CharField(max_length=255, null=True)
+
+    class Meta:
+        table_name = 'bloqueos_habitacion'
+        indexes = (
+            (('habitacion', 'fecha_inicio'), False),
+        )
+
+class ListaEspera(BaseModel):
+    # Pedidos de reserva que no se pudieron cumplir por falta de disponibilidad.
+    # Se asignan automáticamente cuando una cancelación libera una habitación.
+    id = peewee.AutoField()
+    cliente = peewee.ForeignKeyField(Cliente, backref='solicitudes_espera', field=Cliente.dni, on_delete='CASCADE')
+    tipo = peewee.ForeignKeyField(TipoHabitacion, backref='solicitudes_espera', on_delete='CASCADE')
+    fecha_checkin = peewee.DateField()
+    fecha_checkout = peewee.DateField()
+    total_personas = peewee.IntegerField()
+    estado = peewee.CharField(max_length=20, default='Pendiente') # Ej: Pendiente, Asignada
+    reserva = peewee.ForeignKeyField(Reserva, null=True, backref='solicitud_espera', on_delete='SET NULL')
+    creada_en = peewee.DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        table_name = 'lista_espera'
+        indexes = (
+            # Búsqueda de pedidos pendientes de un tipo que se solapan con un rango
+            (('tipo', 'estado', 'fecha_checkin'), False),
+        )
+
+class RetencionHabitacion(BaseModel):
+    # Habitación apartada por unos minutos mientras el cliente termina de
+    # reservar. Mientras 'vence_en' no pasó, la disponibilidad la trata igual
+    # que una reserva; después deja de contar aunque la fila siga ahí.
+    id = peewee.AutoField()
+    cliente = peewee.ForeignKeyField(Cliente, backref='retenciones', field=Cliente.dni, on_delete='CASCADE')
+    habitacion = peewee.ForeignKeyField(Habitacion, backref='retenciones', on_delete='CASCADE')
+    fecha_checkin = peewee.DateField()
+    fecha_checkout = peewee.DateField()
+    total_personas = peewee.IntegerField()
+    vence_en = peewee.FloatField(index=True) # timestamp (time.time())
+
+    class Meta:
+        table_name = 'retenciones'
+        indexes = (
+            (('habitacion', 'fecha_checkin'), False),
+        )
+
 class Admin(BaseModel):
     
     id = peewee.AutoField()
@@ -54,4 +134,117 @@ class Admin(BaseModel):
     password = peewee.CharField(max_length=255) # Guarda el hash
 
     class Meta:
-        table_name = 'admins'
\ No newline at end of file
+        table_name = 'admins'
+
+class LeaseTarea(BaseModel):
+    # Una fila por tarea programada. El worker que logra actualizar la fila
+    # (porque el lease venció) es el único que ejecuta ese disparo.
+    nombre = peewee.CharField(max_length=100, primary_key=True)
+    dueno = peewee.CharField(max_length=100)
+    vence_en = peewee.FloatField() # timestamp (time.time())
+
+    class Meta:
+        table_name = 'leases_tareas'
+
+class ContadorCambios(BaseModel):
+    # Versión por "área" de datos (ej: 'clientes', 'tipos_habitacion').
+    # Se incrementa en la misma transacción que el cambio; los workers la
+    # usan para saber cuándo descartar sus caches en memoria.
+    nombre = peewee.CharField(max_length=50, primary_key=True)
+    version = peewee.IntegerField(default=0)
+
+    class Meta:
+        table_name = 'contadores_cambios'
+
+class CambioReserva(BaseModel):
+    # Registro de cambios de reservas (y del historial), lo llenan triggers.
+    # AUTOINCREMENT garantiza que 'seq' nunca se reutiliza: quien recuerda el
+    # último 'seq' leído puede pedir solo lo que cambió después.
+    seq = AutoIncrementField()
+    reserva_id = peewee.IntegerField()
+    registrado_en = peewee.DateTimeField(constraints=[peewee.SQL('DEFAULT CURRENT_TIMESTAMP')])
+
+    class Meta:
+        table_name = 'reservas_cambios'
+
+class TokenRefresco(BaseModel):
+    # Refresh tokens emitidos. Nunca se guarda el token: solo el hash de su id.
+    # Todos los tokens que salen de un mismo login comparten 'familia'; al
+    # rotar, el anterior queda 'usado'. Reusar uno usado revoca la familia.
+    id_hash = peewee.CharField(max_length=64, primary_key=True)
+    familia = peewee.CharField(max_length=32, index=True)
+    sujeto = peewee.CharField(max_length=100) # DNI del cliente o username del admin
+    es_admin = peewee.BooleanField(default=False)
+    vence_en = peewee.DateTimeField(index=True)
+    usado = peewee.BooleanField(default=False)
+    revocado = peewee.BooleanField(default=False)
+
+    class Meta:
+        table_name = 'tokens_refresco'
+        indexes = (
+            (('sujeto', 'es_admin'), False),
+        )
+
+class VersionReservasCliente(BaseModel):
+    # Contador por cliente que sube con cada cambio en sus reservas.
+    # Es el ETag de 'mis_reservas': si no cambió, se responde 304 sin consultar reservas.
+    dni = peewee.IntegerField(primary_key=True)
+    version = peewee.IntegerField(default=0)
+
+    class Meta:
+        table_name = 'versiones_reservas_clientes'
+
+class CambioInventario(BaseModel):
+    # Registro de cambios de disponibilidad y tarifas (ARI) por tipo de
+    # habitación y rango de fechas [fecha_desde, fecha_hasta). Lo escriben los
+    # servicios en la misma transacción del cambio; los channel managers lo
+    # leen por 'seq' para pedir solo las celdas (tipo, fecha) que cambiaron.
+    seq = AutoIncrementField()
+    tipo = peewee.IntegerField()
+    fecha_desde = peewee.DateField()
+    fecha_hasta = peewee.DateField()
+    registrado_en = peewee.DateTimeField(constraints=[peewee.SQL('DEFAULT CURRENT_TIMESTAMP')])
+
+    class Meta:
+        table_name = 'ari_cambios'
+
+class RegistroAuditoria(BaseModel):
+    # Quién cambió qué: un registro por modificación con las diferencias
+    # {campo: [antes, despues]} en JSON. Lo escribe en lotes el hilo de
+    # auditoria.py, fuera de la transacción del cambio.
+    id = peewee.AutoField()
+    registrado_en = peewee.DateTimeField(default=datetime.datetime.now)
+    actor = peewee.CharField(max_length=120) # Ej: 'cliente:12345678', 'admin:hotelp'
+    entidad = peewee.CharField(max_length=30) # Ej: 'reserva', 'cliente', 'habitacion'
+    entidad_id = peewee.CharField(max_length=50)
+    accion = peewee.CharField(max_length=30)
+    cambios = peewee.TextField()
+
+    class Meta:
+        table_name = 'auditoria'
+        indexes = (
+            (('entidad', 'entidad_id', 'registrado_en'), False),
+        )
+
+class MensajeSalida(BaseModel):
+    # Outbox transaccional: se escribe en la misma transacción que la reserva
+    # y lo entrega después el trabajador de outbox.py. Una fila por evento y
+    # destino, así cada destino se reintenta por separado.
+    # 'proximo_intento' también sirve de reclamo: al tomar un lote se corre
+    # hacia adelante, y si el worker muere la fila vuelve a quedar visible.
+    id = peewee.AutoField()
+    evento = peewee.CharField(max_length=50) # Ej: 'reserva_creada'
+    destino = peewee.CharField(max_length=30) # Ej: 'archivo', 'smtp'
+    carga = peewee.TextField() # JSON
+    estado = peewee.CharField(max_length=20, default='Pendiente') # Pendiente, Enviado, Fallido
+    intentos = peewee.IntegerField(default=0)
+    proximo_intento = peewee.FloatField() # timestamp (time.time())
+    ultimo_error = peewee.TextField(null=True)
+    creado_en = peewee.DateTimeField(default=datetime.datetime.now)
+    enviado_en = peewee.DateTimeField(null=True)
+
+    class Meta:
+        table_name = 'outbox'
+        indexes = (
+            (('estado', 'proximo_intento'), False),
+        )
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from .database import db, hotel_actual, usar_propiedad
+from .models import MensajeSalida, Cliente
+
+
+# ==============================================================================
+# OUTBOX TRANSACCIONAL (CONFIRMACIONES Y AVISOS DE RESERVAS)
+# ==============================================================================
+
+# Destinos que reciben cada evento (separados por comas)
+DESTINOS_ACTIVOS = [d.strip() for d in os.getenv("HOTEL_OUTBOX_DESTINOS", "archivo").split(",") if d.strip()]
+
+TAMANO_LOTE_OUTBOX = 100
+SEGUNDOS_SONDEO_OUTBOX = 1.0
+# Mientras se entrega un lote sus filas quedan invisibles para otros workers
+SEGUNDOS_RECLAMO_OUTBOX = 60
+
+# Reintentos: 5s, 10s, 20s, ... hasta 1 hora, con ±20% de azar.
+# Después de MAXIMO_INTENTOS_OUTBOX la fila queda 'Fallido' (dead letter).
+MAXIMO_INTENTOS_OUTBOX = int(os.getenv("HOTEL_OUTBOX_INTENTOS", "8"))
+SEGUNDOS_BASE_REINTENTO = 5
+SEGUNDOS_MAXIMOS_REINTENTO = 3600
+
+DIAS_CONSERVAR_ENVIADOS = 7
+
+
+# ==============================================================================
+# DESTINOS (SINKS)
+# ==============================================================================
+
+class DestinoArchivo:
+    """Agrega cada evento como una línea NDJSON a un archivo local."""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+
+    def enviar(self, evento: str, carga: dict):
+        linea = json.dumps({"evento": evento, **carga}, ensure_ascii=False)
+        with self._lock, open(self.ruta, "a", encoding="utf-8") as archivo:
+            archivo.write(linea + "\n")
+
+
+class DestinoSmtpSimulado:
+    """
+    Simula un servidor SMTP: arma el correo de confirmación y lo guarda como
+    un archivo .eml en 'directorio' (uno por evento).
+    """
+
+    ASUNTOS = {
+        'reserva_creada': "Confirmación de su reserva #{reserva_id}",
+        'reserva_modificada': "Su reserva #{reserva_id} fue modificada",
+        'reserva_cancelada': "Su reserva #{reserva_id} fue cancelada",
+    }
+
+    def __init__(self, directorio: str, remitente: str = "reservas@hotel.local"):
+        self.directorio = directorio
+        self.remitente = remitente
+
+    def enviar(self, evento: str, carga: dict):
+        if not carga.get("email"):
+            raise ValueError("El evento no tiene email de destino")
+        from email.message import EmailMessage
+
+        correo = EmailMessage()
+        correo["From"] = self.remitente
+        correo["To"] = carga["email"]
+        correo["Subject"] = self.ASUNTOS.get(evento, evento).format(**carga)
+        correo.set_content(
+            f"Reserva #{carga['reserva_id']} - habitación {carga['habitacion']}\n"
+            f"Check-in: {carga['fecha_checkin']}  Check-out: {carga['fecha_checkout']}\n"
+            f"Personas: {carga['total_personas']}  Total: {carga['costo_total']}\n"
+            f"Estado: {carga['estado_reserva']}\n"
+        )
+        os.makedirs(self.directorio, exist_ok=True)
+        nombre = f"{time.time_ns()}-{evento}-{carga['reserva_id']}.eml"
+        with open(os.path.join(self.directorio, nombre), "wb") as archivo:
+            archivo.write(bytes(correo))
+
+
+destinos_outbox = {
+    'archivo': DestinoArchivo(os.getenv("HOTEL_OUTBOX_ARCHIVO", "outbox.ndjson")),
+    'smtp': DestinoSmtpSimulado(os.getenv("HOTEL_OUTBOX_SMTP_DIR", "correos")),
+}
+
+
+def registrar_destino(nombre: str, destino):
+    """Agrega (o reemplaza) un destino. Solo necesita un método enviar(evento, carga)."""
+    destinos_outbox[nombre] = destino
+
+
+# ==============================================================================
+# ESCRITURA (DENTRO DE LA TRANSACCIÓN DEL CAMBIO)
+# ==============================================================================
+
+def encolar_mensaje(evento: str, carga: dict):
+    """
+    Guarda el evento en el outbox, una fila por destino activo.
+    Llamar dentro del db.atomic() del cambio: si la transacción se revierte,
+    el mensaje tampoco existe. Después del commit conviene llamar a
+    trabajador_outbox.despertar() para que salga sin esperar el sondeo.
+    """
+    carga = dict(carga, hotel=hotel_actual())
+    texto = json.dumps(carga, default=str)
+    ahora = time.time()
+    MensajeSalida.insert_many([
+        {"evento": evento, "destino": destino, "carga": texto, "proximo_intento": ahora}
+        for destino in DESTINOS_ACTIVOS
+    ]).execute()
+
+
+def encolar_evento_reserva(evento: str, reserva, numero_habitacion: str):
+    """Encola un evento de reserva con los datos que necesitan los destinos (incluye el email del cliente)."""
+    email = Cliente.select(Cliente.email).where(Cliente.dni == reserva.cliente_id).scalar()
+    encolar_mensaje(evento, {
+        "reserva_id": reserva.id,
+        "dni": reserva.cliente_id,
+        "email": email,
+        "habitacion": numero_habitacion,
+        "fecha_checkin": reserva.fecha_checkin,
+        "fecha_checkout": reserva.fecha_checkout,
+        "total_personas": reserva.total_personas,
+        "costo_total": reserva.costo_total,
+        "estado_reserva": reserva.estado_reserva,
+    })
+
+
+# ==============================================================================
+# ENTREGA
+# ==============================================================================
+
+def _espera_reintento(intentos: int) -> float:
+    espera = min(SEGUNDOS_MAXIMOS_REINTENTO, SEGUNDOS_BASE_REINTENTO * 2 ** (intentos - 1))
+    return espera * random.uniform(0.8, 1.2)
+
+
+def procesar_outbox(tamano_lote: int = TAMANO_LOTE_OUTBOX) -> int:
+    """
+    Reclama un lote de mensajes vencidos de la BD actual, los entrega y
+    guarda el resultado. Devuelve la cantidad de mensajes procesados.
+
+    El reclamo es una transacción IMMEDIATE corta: con varios workers, cada
+    fila la toma uno solo. La entrega corre fuera de toda transacción.
+    Antes se mira con una lectura común si hay algo vencido: con el outbox
+    vacío (lo normal) el sondeo no toma el lock de escritura.
+    """
+    ahora = time.time()
+    vencidos = (MensajeSalida
+                .select(MensajeSalida.id)
+                .where((MensajeSalida.estado == 'Pendiente') &
+                       (MensajeSalida.proximo_intento <= ahora))
+                .exists())
+    if not vencidos:
+        return 0
+
+    with db.atomic('IMMEDIATE'):
+        mensajes = list(MensajeSalida
+                        .select()
+                        .where((MensajeSalida.estado == 'Pendiente') &
+                               (MensajeSalida.proximo_intento <= ahora))
+                        .order_by(MensajeSalida.proximo_intento, MensajeSalida.id)
+                        .limit(tamano_lote))
+        if not mensajes:
+            return 0
+        (MensajeSalida
+         .update(proximo_intento=ahora + SEGUNDOS_RECLAMO_OUTBOX)
+         .where(MensajeSalida.id.in_([m.id for m in mensajes]))
+         .execute())
+
+    enviados, fallidos = [], []
+    for mensaje in mensajes:
+        try:
+            destino = destinos_outbox.get(mensaje.destino)
+            if destino is None:
+                raise LookupError(f"Destino '{mensaje.destino}' no configurado")
+            destino.enviar(mensaje.evento, json.loads(mensaje.carga))
+            enviados.append(mensaje.id)
+        except Exception as e:
+            fallidos.append((mensaje, f"{type(e).__name__}: {e}"))
+
+    ahora = time.time()
+    with db.atomic():
+        if enviados:
+            (MensajeSalida
+             .update(estado='Enviado', enviado_en=datetime.now(), intentos=MensajeSalida.intentos + 1)
+             .where(MensajeSalida.id.in_(enviados))
+             .execute())
+        for mensaje, error in fallidos:
+            intentos = mensaje.intentos + 1
+            agotado = intentos >= MAXIMO_INTENTOS_OUTBOX
+            (MensajeSalida
+             .update(intentos=intentos, ultimo_error=error,
+                     estado='Fallido' if agotado else 'Pendiente',
+                     proximo_intento=ahora + _espera_reintento(intentos))
+             .where(MensajeSalida.id == mensaje.id)
+             .execute())
+            if agotado:
+                print(f"Outbox: mensaje {mensaje.id} ({mensaje.evento} -> {mensaje.destino}) "
+                      f"pasó a 'Fallido' tras {intentos} intentos: {error}")
+    return len(mensajes)
+
+
+def podar_outbox(dias: int = DIAS_CONSERVAR_ENVIADOS) -> int:
+    """Borra los mensajes ya enviados hace más de 'dias' días."""
+    with db.atomic():
+        borrados = (MensajeSalida
+                    .delete()
+                    .where((MensajeSalida.estado == 'Enviado') &
+                           (MensajeSalida.enviado_en < datetime.now() - timedelta(days=dias)))
+                    .execute())
+    if borrados:
+        print(f"Outbox: {borrados} mensajes enviados borrados.")
+    return borrados
+
+
+def obtener_mensajes_fallidos(limite: int = 100) -> list:
+    """Mensajes en dead letter ('Fallido'), del más nuevo al más viejo."""
+    return list(MensajeSalida
+                .select()
+                .where(MensajeSalida.estado == 'Fallido')
+                .order_by(MensajeSalida.id.desc())
+                .limit(limite))
+
+
+def reintentar_mensaje(mensaje_id: int):
+    """Vuelve a poner en cola un mensaje 'Fallido' (con los intentos en cero). Devuelve el mensaje o None."""
+    with db.atomic():
+        actualizados = (MensajeSalida
+                        .update(estado='Pendiente', intentos=0, proximo_intento=time.time())
+                        .where((MensajeSalida.id == mensaje_id) & (MensajeSalida.estado == 'Fallido'))
+                        .execute())
+        if not actualizados:
+            return None
+        mensaje = MensajeSalida.get_by_id(mensaje_id)
+    trabajador_outbox.despertar()
+    return mensaje
+
+
+def _procesar_todas_las_bases() -> bool:
+    """Un lote en la BD principal y en cada hotel abierto. True si algún lote vino lleno."""
+    from .propiedades import shards_hoteles
+
+    hay_mas = False
+    for hotel_id, base in [(None, None)] + shards_hoteles.abiertas():
+        try:
+            with usar_propiedad(hotel_id, base):
+                hay_mas |= procesar_outbox() >= TAMANO_LOTE_OUTBOX
+        except Exception as e:
+            print(f"Error procesando el outbox{f' del hotel {hotel_id}' if hotel_id else ''}: {e}")
+    return hay_mas
+
+
+class TrabajadorOutbox:
+    """
+    Tarea asyncio que vacía el outbox: sondea cada SEGUNDOS_SONDEO_OUTBOX o
+    antes si un servicio la despierta después de confirmar una reserva.
+    El trabajo de BD y la entrega corren en el executor (son bloqueantes).
+    """
+
+    def __init__(self):
+        self._tarea = None
+        self._loop = None
+        self._evento = None
+
+    def iniciar(self):
+        if self._tarea is not None and not self._tarea.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._evento = asyncio.Event()
+        self._tarea = self._loop.create_task(self._bucle())
+
+    def despertar(self):
+        """Se puede llamar desde cualquier hilo (ej: el threadpool de FastAPI)."""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._evento.set)
+
+    async def detener(self):
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        await asyncio.gather(self._tarea, return_exceptions=True)
+        self._tarea = self._loop = None
+
+    async def _bucle(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._evento.clear()
+            hay_mas = await loop.run_in_executor(None, _procesar_todas_las_bases)
+            if hay_mas:
+                continue
+            try:
+                await asyncio.wait_for(self._evento.wait(), SEGUNDOS_SONDEO_OUTBOX)
+            except asyncio.TimeoutError:
+                pass
+
+
+trabajador_outbox = TrabajadorOutbox()
@@ -0,0 +1,351 @@
+import cProfile
+import functools
+import inspect
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+from .database import hotel_actual
+
+
+# ==============================================================================
+# PERFILADO DE PETICIONES A PEDIDO (SOLO ADMINS)
+# ==============================================================================
+
+# Una petición se perfila si trae el header 'X-Perfilar: <token de admin>'
+# (sirve para reproducir una petición de un cliente con su propio token) o
+# '?perfilar=1' con un token de admin en Authorization (rutas de admin).
+HEADER_PERFILAR = b"x-perfilar"
+PARAMETRO_PERFILAR = "perfilar"
+
+DIRECTORIO_PERFILES = os.getenv("HOTEL_PERFILES_DIR", "perfiles")
+# Perfiles que se conservan por hotel (se borran los más viejos)
+MAXIMO_PERFILES = 50
+FUNCIONES_RESUMEN = 20
+
+ID_PERFIL_VALIDO = re.compile(r"[0-9]{8}-[0-9]{6}-[0-9a-f]{8}")
+
+# Funciones C de sqlite3 que cuentan como consultas / tiempo de SQL
+METODOS_CONSULTA_SQL = {
+    "<method 'execute' of 'sqlite3.Cursor' objects>",
+    "<method 'executemany' of 'sqlite3.Cursor' objects>",
+}
+METODOS_TIEMPO_SQL = METODOS_CONSULTA_SQL | {
+    "<method 'fetchone' of 'sqlite3.Cursor' objects>",
+    "<method 'fetchall' of 'sqlite3.Cursor' objects>",
+    "<method 'fetchmany' of 'sqlite3.Cursor' objects>",
+    "<method 'commit' of 'sqlite3.Connection' objects>",
+    "<method 'rollback' of 'sqlite3.Connection' objects>",
+}
+
+# Perfil de la petición en curso (None = no se perfila). FastAPI copia el
+# contexto al threadpool, así que el endpoint lo ve desde su hilo.
+perfil_actual = ContextVar("perfil_actual", default=None)
+
+
+def _directorio_hotel(hotel) -> str:
+    return os.path.join(DIRECTORIO_PERFILES, hotel or "_principal")
+
+
+def _nombre_funcion(funcion) -> str:
+    texto = pstats.func_std_string(funcion)
+    _, separador, resto = texto.rpartition("site-packages" + os.sep)
+    return resto if separador else texto.replace(os.getcwd() + os.sep, "")
+
+
+class PerfilPeticion:
+    """
+    Perfil (cProfile) de una petición. Cada tramo medido (el endpoint y la
+    validación/serialización de la respuesta) corre en algún hilo del
+    threadpool con su propio Profile; al terminar se juntan en uno solo.
+    """
+
+    def __init__(self, metodo: str, ruta: str):
+        self.id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.fecha = datetime.now()
+        self.hotel = hotel_actual()
+        self.metodo = metodo
+        self.ruta = ruta
+        self.estado = None
+        self.inicio = time.perf_counter()
+        self.segundos_total = 0.0
+        self.segundos = {'endpoint': 0.0, 'serializacion': 0.0}
+        self.perfiles = []
+        self.resumen = None
+
+    @contextmanager
+    def medir(self, tramo: str):
+        perfil = cProfile.Profile()
+        inicio = time.perf_counter()
+        perfil.enable()
+        try:
+            yield
+        finally:
+            perfil.disable()
+            self.segundos[tramo] += time.perf_counter() - inicio
+            self.perfiles.append(perfil)
+
+    def _estadisticas(self):
+        if not self.perfiles:
+            return None
+        estadisticas = pstats.Stats(self.perfiles[0])
+        for perfil in self.perfiles[1:]:
+            estadisticas.add(perfil)
+        return estadisticas
+
+    def guardar(self):
+        """Arma el resumen y guarda '<id>.json' y '<id>.prof' (formato pstats)."""
+        estadisticas = self._estadisticas()
+        consultas, segundos_sql, funciones = 0, 0.0, []
+        if estadisticas is not None:
+            filas = estadisticas.stats
+            for funcion, (_, llamadas, propio, _, _) in filas.items():
+                if funcion[2] in METODOS_CONSULTA_SQL:
+                    consultas += llamadas
+                if funcion[2] in METODOS_TIEMPO_SQL:
+                    segundos_sql += propio
+            mayores = sorted(
+                (f for f in filas if "_lsprof" not in f[2]),
+                key=lambda f: filas[f][2], reverse=True
+            )[:FUNCIONES_RESUMEN]
+            funciones = [{
+                "funcion": _nombre_funcion(f),
+                "llamadas": filas[f][1],
+                "propio_ms": round(filas[f][2] * 1000, 3),
+                "acumulado_ms": round(filas[f][3] * 1000, 3),
+            } for f in mayores]
+
+        medido = self.segundos['endpoint'] + self.segundos['serializacion']
+        self.resumen = {
+            "id": self.id,
+            "fecha": self.fecha.isoformat(timespec="seconds"),
+            "hotel": self.hotel,
+            "metodo": self.metodo,
+            "ruta": self.ruta,
+            "estado": self.estado,
+            "total_ms": round(self.segundos_total * 1000, 3),
+            "endpoint_ms": round(self.segundos['endpoint'] * 1000, 3),
+            "serializacion_ms": round(self.segundos['serializacion'] * 1000, 3),
+            "otros_ms": round(max(0.0, self.segundos_total - medido) * 1000, 3),
+            "consultas_sql": consultas,
+            "sql_ms": round(segundos_sql * 1000, 3),
+            "archivo": estadisticas is not None,
+            "funciones": funciones,
+        }
+
+        try:
+            directorio = _directorio_hotel(self.hotel)
+            os.makedirs(directorio, exist_ok=True)
+            if estadisticas is not None:
+                estadisticas.dump_stats(os.path.join(directorio, f"{self.id}.prof"))
+            with open(os.path.join(directorio, f"{self.id}.json"), "w", encoding="utf-8") as archivo:
+                json.dump(self.resumen, archivo, ensure_ascii=False)
+            _podar_perfiles(directorio)
+        except OSError as e:
+            print(f"Error al guardar el perfil {self.id}: {e}")
+
+    def cabeceras(self) -> list:
+        r = self.resumen
+        server_timing = (
+            f'total;dur={r["total_ms"]}, endpoint;dur={r["endpoint_ms"]}, '
+            f'serializacion;dur={r["serializacion_ms"]}, '
+            f'sql;dur={r["sql_ms"]};desc="{r["consultas_sql"]} consultas"'
+        )
+        return [(b"x-perfil", self.id.encode()), (b"server-timing", server_timing.encode())]
+
+
+def _podar_perfiles(directorio: str):
+    resumenes = sorted(n for n in os.listdir(directorio) if n.endswith(".json"))
+    for nombre in resumenes[:-MAXIMO_PERFILES]:
+        base = os.path.join(directorio, nombre[:-len(".json")])
+        for extension in (".json", ".prof"):
+            try:
+                os.remove(base + extension)
+            except FileNotFoundError:
+                pass
+
+
+# ==============================================================================
+# CONSULTA DE PERFILES GUARDADOS (DEL HOTEL ACTUAL)
+# ==============================================================================
+
+def listar_perfiles(limite: int = MAXIMO_PERFILES) -> list:
+    """Resúmenes de los perfiles guardados, del más nuevo al más viejo."""
+    directorio = _directorio_hotel(hotel_actual())
+    if not os.path.isdir(directorio):
+        return []
+    nombres = sorted((n for n in os.listdir(directorio) if n.endswith(".json")), reverse=True)[:limite]
+    resumenes = []
+    for nombre in nombres:
+        try:
+            with open(os.path.join(directorio, nombre), encoding="utf-8") as archivo:
+                resumenes.append(json.load(archivo))
+        except (OSError, ValueError):
+            continue  # se podó mientras tanto
+    return resumenes
+
+
+def obtener_perfil(perfil_id: str):
+    """Resumen de un perfil, o None si no existe."""
+    if not ID_PERFIL_VALIDO.fullmatch(perfil_id):
+        return None
+    try:
+        with open(os.path.join(_directorio_hotel(hotel_actual()), f"{perfil_id}.json"), encoding="utf-8") as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+
+def ruta_archivo_perfil(perfil_id: str):
+    """Ruta del .prof de un perfil, o None si no existe."""
+    if not ID_PERFIL_VALIDO.fullmatch(perfil_id):
+        return None
+    ruta = os.path.join(_directorio_hotel(hotel_actual()), f"{perfil_id}.prof")
+    return ruta if os.path.isfile(ruta) else None
+
+
+# ==============================================================================
+# INTEGRACIÓN CON FASTAPI
+# ==============================================================================
+
+def _perfilable(endpoint):
+    """Envuelve un endpoint para perfilarlo si la petición lo pidió."""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def envuelto(*args, **kwargs):
+            perfil = perfil_actual.get()
+            if perfil is None:
+                return await endpoint(*args, **kwargs)
+            with perfil.medir('endpoint'):
+                return await endpoint(*args, **kwargs)
+        return envuelto
+
+    @functools.wraps(endpoint)
+    def envuelto(*args, **kwargs):
+        perfil = perfil_actual.get()
+        if perfil is None:
+            return endpoint(*args, **kwargs)
+        with perfil.medir('endpoint'):
+            return endpoint(*args, **kwargs)
+    return envuelto
+
+
+class _CampoRespuestaMedido:
+    """
+    Envuelve el response_field de una ruta: FastAPI valida la respuesta
+    (from_attributes, que puede disparar consultas) y la serializa con él.
+    """
+
+    def __init__(self, campo):
+        self._campo = campo
+
+    def __getattr__(self, nombre):
+        return getattr(self._campo, nombre)
+
+    def _medir(self, metodo, *args, **kwargs):
+        perfil = perfil_actual.get()
+        if perfil is None:
+            return metodo(*args, **kwargs)
+        with perfil.medir('serializacion'):
+            return metodo(*args, **kwargs)
+
+    def validate(self, *args, **kwargs):
+        return self._medir(self._campo.validate, *args, **kwargs)
+
+    def serialize(self, *args, **kwargs):
+        return self._medir(self._campo.serialize, *args, **kwargs)
+
+    def serialize_json(self, *args, **kwargs):
+        return self._medir(self._campo.serialize_json, *args, **kwargs)
+
+
+class RutaPerfilable(APIRoute):
+    """
+    Ruta de FastAPI que se puede perfilar. Sin perfil activo solo agrega una
+    lectura de la ContextVar por tramo. El campo medido se usa solo en el
+    handler: la ruta conserva el original para generar el OpenAPI.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _perfilable(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        campo = self.response_field
+        if campo is not None:
+            self.response_field = _CampoRespuestaMedido(campo)
+        try:
+            return super().get_route_handler()
+        finally:
+            self.response_field = campo
+
+
+class MiddlewarePerfilado:
+    """
+    Middleware ASGI: si la petición pide perfilado y el token es de un admin
+    del hotel, la atiende con un PerfilPeticion activo. Al empezar la
+    respuesta guarda el perfil y agrega los headers 'X-Perfil' (id para
+    descargarlo) y 'Server-Timing' (resumen). Sin pedido no hace nada.
+
+    'es_admin(token)' decide si el token es de un admin (lo provee la app).
+    """
+
+    def __init__(self, app, es_admin):
+        self.app = app
+        self.es_admin = es_admin
+
+    def _token_pedido(self, scope):
+        autorizacion = None
+        for nombre, valor in scope["headers"]:
+            if nombre == HEADER_PERFILAR:
+                return valor.decode("latin-1").strip()
+            if nombre == b"authorization":
+                autorizacion = valor
+        consulta = scope.get("query_string", b"")
+        if autorizacion is None or PARAMETRO_PERFILAR.encode() not in consulta:
+            return None
+        valores = parse_qs(consulta.decode("latin-1")).get(PARAMETRO_PERFILAR, [])
+        if not valores or valores[-1].lower() not in ("1", "true", "si"):
+            return None
+        esquema, _, token = autorizacion.decode("latin-1").partition(" ")
+        return token.strip() if esquema.lower() == "bearer" else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = self._token_pedido(scope)
+        # Un pedido sin token de admin se atiende normal (sin avisar nada)
+        if not token or not self.es_admin(token):
+            await self.app(scope, receive, send)
+            return
+
+        perfil = PerfilPeticion(scope["method"], scope["path"])
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start" and perfil.resumen is None:
+                perfil.estado = mensaje["status"]
+                perfil.segundos_total = time.perf_counter() - perfil.inicio
+                await run_in_threadpool(perfil.guardar)
+                mensaje = dict(mensaje, headers=list(mensaje.get("headers", [])) + perfil.cabeceras())
+            await send(mensaje)
+
+        marca = perfil_actual.set(perfil)
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            perfil_actual.reset(marca)
+            if perfil.resumen is None:
+                # Terminó con una excepción antes de responder: igual se guarda
+                perfil.estado = 500
+                perfil.segundos_total = time.perf_counter() - perfil.inicio
+                await run_in_threadpool(perfil.guardar)
@@ -0,0 +1,282 @@
+import asyncio
+import os
+import random
+import socket
+import time
+from datetime import datetime, timedelta
+
+from .database import db, usar_propiedad
+from .models import LeaseTarea
+
+
+# ==============================================================================
+# CONFIGURACIÓN DEL PLANIFICADOR
+# ==============================================================================
+
+PLANIFICADOR_ACTIVO = os.getenv("HOTEL_PLANIFICADOR", "1") == "1"
+
+# Identifica a este proceso (worker de uvicorn) en la tabla de leases
+ID_PROCESO = f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ==============================================================================
+# EXPRESIONES CRON ("minuto hora dia mes dia_semana")
+# ==============================================================================
+
+class ExpresionCron:
+    """
+    Versión reducida de cron. Cada campo admite: '*', '*/n', 'a', 'a-b',
+    'a-b/n' y listas separadas por comas. El día de la semana va de 0 a 6
+    con 0 = domingo, como en cron.
+
+    También como en cron: si el día del mes y el día de la semana están
+    restringidos los dos (ninguno empieza con '*'), alcanza con que se
+    cumpla uno. '0 3 1 * 1' corre el día 1 y todos los lunes.
+    """
+
+    RANGOS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expresion: str):
+        campos = expresion.split()
+        if len(campos) != 5:
+            raise ValueError(f"Expresión cron inválida: '{expresion}'")
+        self.expresion = expresion
+        (self.minutos, self.horas, self.dias,
+         self.meses, self.dias_semana) = [
+            self._parsear_campo(campo, minimo, maximo)
+            for campo, (minimo, maximo) in zip(campos, self.RANGOS)
+        ]
+        self.dia_o_semana = not campos[2].startswith("*") and not campos[4].startswith("*")
+
+    @staticmethod
+    def _parsear_campo(campo: str, minimo: int, maximo: int) -> set:
+        valores = set()
+        for parte in campo.split(","):
+            paso = 1
+            if "/" in parte:
+                parte, paso_texto = parte.split("/")
+                paso = int(paso_texto)
+            if parte == "*":
+                inicio, fin = minimo, maximo
+            elif "-" in parte:
+                inicio, fin = (int(x) for x in parte.split("-"))
+            else:
+                inicio = fin = int(parte)
+            if inicio < minimo or fin > maximo:
+                raise ValueError(f"Valor fuera de rango en '{campo}'")
+            valores.update(range(inicio, fin + 1, paso))
+        return valores
+
+    def _coincide_dia(self, t: datetime) -> bool:
+        en_dias = t.day in self.dias
+        en_semana = (t.isoweekday() % 7) in self.dias_semana
+        return en_dias or en_semana if self.dia_o_semana else en_dias and en_semana
+
+    def siguiente(self, desde: datetime) -> datetime:
+        """Devuelve el próximo instante (al minuto) estrictamente posterior a 'desde'."""
+        t = desde.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limite = desde + timedelta(days=366 * 5)
+        while t < limite:
+            if t.month not in self.meses:
+                # Saltamos al primer día del mes siguiente
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._coincide_dia(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if t.hour not in self.horas:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            if t.minute not in self.minutos:
+                t += timedelta(minutes=1)
+                continue
+            return t
+        raise ValueError(f"La expresión '{self.expresion}' nunca se cumple")
+
+
+# ==============================================================================
+# TAREAS Y PLANIFICADOR
+# ==============================================================================
+
+class Tarea:
+    """
+    Una tarea periódica: por intervalo (segundos) o por expresión cron.
+    Si 'exclusiva' es False, cada worker la ejecuta por su cuenta (sin lease),
+    útil para tareas que refrescan estado propio del proceso.
+    Si 'por_hotel' es True, cada disparo la ejecuta en la BD principal y en
+    la de cada hotel abierto, con un lease por hotel.
+    """
+
+    def __init__(self, nombre, funcion, intervalo=None, cron=None, jitter=0.0, timeout=300.0, exclusiva=True,
+                 por_hotel=False):
+        if (intervalo is None) == (cron is None):
+            raise ValueError("Una tarea necesita 'intervalo' o 'cron' (solo uno).")
+        self.nombre = nombre
+        self.funcion = funcion
+        self.intervalo = intervalo
+        self.cron = ExpresionCron(cron) if cron else None
+        self.jitter = jitter
+        self.timeout = timeout
+        self.exclusiva = exclusiva
+        self.por_hotel = por_hotel
+
+        # Métricas de ejecución
+        self.ejecuciones = 0
+        self.fallos = 0
+        self.omitidas = 0  # Otro worker tenía el lease
+        self.ultima_ejecucion = None
+        self.ultima_duracion = None
+        self.ultimo_error = None
+        self.proxima_ejecucion = None
+
+    def calcular_proxima(self, ahora: datetime) -> datetime:
+        if self.cron:
+            return self.cron.siguiente(ahora)
+        return ahora + timedelta(seconds=self.intervalo)
+
+    def metricas(self) -> dict:
+        return {
+            "nombre": self.nombre,
+            "programacion": self.cron.expresion if self.cron else f"cada {self.intervalo}s",
+            "ejecuciones": self.ejecuciones,
+            "fallos": self.fallos,
+            "omitidas": self.omitidas,
+            "ultima_ejecucion": self.ultima_ejecucion,
+            "ultima_duracion": self.ultima_duracion,
+            "ultimo_error": self.ultimo_error,
+            "proxima_ejecucion": self.proxima_ejecucion,
+        }
+
+
+def tomar_lease(nombre: str, vence_en: float) -> bool:
+    """
+    Intenta tomar el lease de una tarea hasta 'vence_en' (timestamp).
+    Un solo UPDATE condicional: entre varios workers solo uno puede ganar.
+    """
+    ahora = time.time()
+    with db.atomic():
+        LeaseTarea.insert(nombre=nombre, dueno="", vence_en=0).on_conflict_ignore().execute()
+        filas = (LeaseTarea
+                 .update(dueno=ID_PROCESO, vence_en=vence_en)
+                 .where(
+                     (LeaseTarea.nombre == nombre) &
+                     ((LeaseTarea.vence_en < ahora) | (LeaseTarea.dueno == ID_PROCESO))
+                 )
+                 .execute())
+    return filas == 1
+
+
+class Planificador:
+    """
+    Planificador asyncio que corre dentro de cada worker de uvicorn.
+
+    Las funciones de las tareas son síncronas (usan peewee), así que se
+    ejecutan en el executor por defecto para no bloquear el event loop.
+    Antes de cada ejecución se toma un lease en SQLite: si hay varios
+    workers, solo uno ejecuta cada disparo de la tarea.
+    """
+
+    def __init__(self):
+        self.tareas = {}
+        self._tasks = []
+
+    def agregar(self, tarea: Tarea):
+        self.tareas[tarea.nombre] = tarea
+        return tarea
+
+    def iniciar(self):
+        loop = asyncio.get_running_loop()
+        for tarea in self.tareas.values():
+            self._tasks.append(loop.create_task(self._bucle(tarea)))
+        print(f"Planificador iniciado con {len(self.tareas)} tareas.")
+
+    async def detener(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _bucle(self, tarea: Tarea):
+        loop = asyncio.get_running_loop()
+        while True:
+            ahora = datetime.now()
+            tarea.proxima_ejecucion = tarea.calcular_proxima(ahora)
+            espera = (tarea.proxima_ejecucion - ahora).total_seconds()
+            espera += random.uniform(0, tarea.jitter)
+            await asyncio.sleep(max(espera, 0))
+
+            # El lease dura hasta el próximo disparo (o el timeout si es mayor),
+            # así los demás workers omiten este disparo aunque lleguen con jitter.
+            proxima = tarea.calcular_proxima(tarea.proxima_ejecucion).timestamp()
+            vence_en = max(proxima - 1, time.time() + tarea.timeout)
+
+            if tarea.por_hotel:
+                await self._ejecutar(tarea, lambda: self._en_cada_hotel(tarea, vence_en))
+                continue
+
+            if not tarea.exclusiva:
+                await self._ejecutar(tarea)
+                continue
+
+            try:
+                ganado = await loop.run_in_executor(None, tomar_lease, tarea.nombre, vence_en)
+            except Exception as e:
+                print(f"Error tomando el lease de '{tarea.nombre}': {e}")
+                continue
+            if not ganado:
+                tarea.omitidas += 1
+                continue
+
+            await self._ejecutar(tarea)
+
+    @staticmethod
+    def _en_cada_hotel(tarea: Tarea, vence_en: float):
+        """
+        Ejecuta la tarea en la BD principal y en cada hotel abierto en este
+        proceso. Cada hotel tiene su propio lease ('<tarea>:<hotel_id>', en la
+        BD principal): otro worker que también lo tenga abierto lo omite.
+        Un hotel que falla no frena a los demás; el último error se relanza.
+        """
+        from .propiedades import shards_hoteles
+
+        error = None
+        for hotel_id, base in [(None, None)] + shards_hoteles.abiertas():
+            nombre = tarea.nombre if hotel_id is None else f"{tarea.nombre}:{hotel_id}"
+            try:
+                if tarea.exclusiva and not tomar_lease(nombre, vence_en):
+                    tarea.omitidas += 1
+                    continue
+                with usar_propiedad(hotel_id, base):
+                    tarea.funcion()
+            except Exception as e:
+                print(f"Error en la tarea '{tarea.nombre}'{f' del hotel {hotel_id}' if hotel_id else ''}: {e}")
+                error = e
+        if error is not None:
+            raise error
+
+    async def _ejecutar(self, tarea: Tarea, funcion=None):
+        loop = asyncio.get_running_loop()
+        inicio = time.monotonic()
+        tarea.ultima_ejecucion = datetime.now()
+        try:
+            # El timeout deja de esperar el resultado, pero el hilo no se puede
+            # matar: las tareas deben trabajar en lotes cortos.
+            await asyncio.wait_for(loop.run_in_executor(None, funcion or tarea.funcion), tarea.timeout)
+            tarea.ultimo_error = None
+        except asyncio.TimeoutError:
+            tarea.fallos += 1
+            tarea.ultimo_error = f"Timeout ({tarea.timeout}s)"
+            print(f"La tarea '{tarea.nombre}' superó el timeout de {tarea.timeout}s.")
+        except Exception as e:
+            tarea.fallos += 1
+            tarea.ultimo_error = str(e)
+            print(f"Error en la tarea '{tarea.nombre}': {e}")
+        finally:
+            tarea.ejecuciones += 1
+            tarea.ultima_duracion = time.monotonic() - inicio
+
+    def metricas(self) -> list:
+        return [tarea.metricas() for tarea in self.tareas.values()]
+
+
+planificador = Planificador()
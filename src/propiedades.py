@@ -0,0 +1,132 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from peewee import SqliteDatabase
+
+from .database import PRAGMAS_SQLITE, usar_propiedad
+from .cache import olvidar_base
+from .esquema import verificar_esquema
+
+
+# ==============================================================================
+# CONFIGURACIÓN DE PROPIEDADES (UN ARCHIVO SQLITE POR HOTEL)
+# ==============================================================================
+
+# Directorio con un archivo <hotel_id>.db por propiedad
+DIRECTORIO_HOTELES = os.getenv("HOTEL_DIRECTORIO_HOTELES", "hoteles")
+
+# Cantidad máxima de BDs de hoteles abiertas a la vez en cada proceso
+MAXIMO_HOTELES_ABIERTOS = int(os.getenv("HOTEL_MAXIMO_HOTELES_ABIERTOS", "32"))
+
+PREFIJO_RUTA_HOTEL = "/api/v1/hoteles/"
+
+ID_HOTEL_VALIDO = re.compile(r"[a-z0-9][a-z0-9_-]{0,49}")
+
+
+def ruta_hotel(hotel_id: str) -> str:
+    return os.path.join(DIRECTORIO_HOTELES, f"{hotel_id}.db")
+
+
+class ShardsPorHotel:
+    """
+    LRU acotado de bases de datos por hotel.
+
+    Cada hotel tiene su propio archivo, así que una escritura en un hotel
+    nunca bloquea a otro. Al salir del LRU se olvida el handle (y sus
+    caches); las conexiones que algún hilo todavía use se cierran cuando
+    el handle deja de estar referenciado.
+    """
+
+    def __init__(self, maximo: int = MAXIMO_HOTELES_ABIERTOS):
+        self.maximo = maximo
+        self._bases = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, hotel_id: str):
+        """Devuelve la BD del hotel, o None si el hotel no existe."""
+        with self._lock:
+            base = self._bases.get(hotel_id)
+            if base is not None:
+                self._bases.move_to_end(hotel_id)
+                return base
+
+        if not os.path.exists(ruta_hotel(hotel_id)):
+            return None
+        return self._abrir(hotel_id)
+
+    def crear(self, hotel_id: str):
+        """Crea (si hace falta) el archivo del hotel y devuelve su BD."""
+        os.makedirs(DIRECTORIO_HOTELES, exist_ok=True)
+        return self._abrir(hotel_id)
+
+    def _abrir(self, hotel_id: str):
+        base = SqliteDatabase(ruta_hotel(hotel_id), pragmas=PRAGMAS_SQLITE)
+        with usar_propiedad(hotel_id, base):
+            verificar_esquema()
+
+        with self._lock:
+            existente = self._bases.get(hotel_id)
+            if existente is not None:
+                return existente
+            self._bases[hotel_id] = base
+            while len(self._bases) > self.maximo:
+                _, vieja = self._bases.popitem(last=False)
+                olvidar_base(vieja.database)
+        return base
+
+    def abiertas(self):
+        """[(hotel_id, base)] de los hoteles abiertos en este proceso."""
+        with self._lock:
+            return list(self._bases.items())
+
+    def reiniciar(self):
+        self._bases = OrderedDict()
+        self._lock = threading.Lock()
+
+
+shards_hoteles = ShardsPorHotel()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=shards_hoteles.reiniciar)
+
+
+class MiddlewarePropiedad:
+    """
+    Middleware ASGI: las rutas /api/v1/hoteles/{hotel_id}/... se atienden con
+    los mismos endpoints que /api/v1/..., pero contra la BD de ese hotel.
+
+    La BD elegida se guarda en una ContextVar; FastAPI copia el contexto al
+    threadpool, así que los servicios (síncronos) la ven sin cambios.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(PREFIJO_RUTA_HOTEL):
+            await self.app(scope, receive, send)
+            return
+
+        hotel_id, _, resto = scope["path"][len(PREFIJO_RUTA_HOTEL):].partition("/")
+        base = shards_hoteles.obtener(hotel_id) if ID_HOTEL_VALIDO.fullmatch(hotel_id) else None
+        if base is None:
+            await self._responder_404(send)
+            return
+
+        ruta = "/api/v1/" + resto
+        scope = dict(scope, path=ruta, raw_path=ruta.encode())
+        with usar_propiedad(hotel_id, base):
+            await self.app(scope, receive, send)
+
+    async def _responder_404(self, send):
+        cuerpo = json.dumps({"detail": "Hotel no encontrado"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 404,
+            "headers": [(b"content-type", b"application/json"),
+                        (b"content-length", str(len(cuerpo)).encode())],
+        })
+        await send({"type": "http.response.body", "body": cuerpo})
@@ -0,0 +1,287 @@
+import hashlib
+import http.client
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from .captura import OCULTO, PRINCIPAL_INVALIDO
+
+
+# ==============================================================================
+# REPETICIÓN DE TRÁFICO CAPTURADO Y COMPARACIÓN ENTRE VERSIONES
+# ==============================================================================
+
+# La captura no guarda contraseñas: en la copia de la BD todos los clientes y
+# admins pasan a tener esta, y los logins / registros se repiten con ella.
+CLAVE_REPETICION = "repeticion-1234"
+
+# Campos que cambian en cada corrida y no cuentan para comparar respuestas
+CAMPOS_VOLATILES = {'access_token', 'refresh_token', 'creada_en', 'creado_en', 'registrado_en'}
+
+# Los tokens de acceso duran 60 minutos; se piden de nuevo antes
+SEGUNDOS_RENOVAR_SESION = 50 * 60
+
+DISTINTAS_A_LISTAR = 20
+
+
+def _copiar_bd(origen: str, destino: str):
+    """Copia consistente con la API de backup de SQLite (incluye lo que esté en el WAL)."""
+    fuente, copia = sqlite3.connect(origen), sqlite3.connect(destino)
+    try:
+        fuente.backup(copia)
+    finally:
+        fuente.close()
+        copia.close()
+
+
+def preparar_copia(bd: str, hoteles: str, directorio: str):
+    """
+    Copia la BD principal (y los <hotel>.db de 'hoteles', si se indica) a
+    'directorio' con la estructura que espera la app, y pone la contraseña
+    CLAVE_REPETICION a todos los clientes y admins de la copia.
+    """
+    from werkzeug.security import generate_password_hash
+
+    copias = [(bd, os.path.join(directorio, "hotel.db"))]
+    if hoteles:
+        os.makedirs(os.path.join(directorio, "hoteles"), exist_ok=True)
+        copias += [(os.path.join(hoteles, nombre), os.path.join(directorio, "hoteles", nombre))
+                   for nombre in sorted(os.listdir(hoteles)) if nombre.endswith(".db")]
+
+    password = generate_password_hash(CLAVE_REPETICION)
+    for origen, destino in copias:
+        _copiar_bd(origen, destino)
+        conexion = sqlite3.connect(destino)
+        try:
+            with conexion:
+                conexion.execute("UPDATE clientes SET password = ?", (password,))
+                conexion.execute("UPDATE admins SET password = ?", (password,))
+        finally:
+            conexion.close()
+
+
+def _url(hotel, ruta: str, consulta: str = "") -> str:
+    if hotel:
+        ruta = f"/api/v1/hoteles/{hotel}/{ruta[len('/api/v1/'):]}"
+    return f"{ruta}?{consulta}" if consulta else ruta
+
+
+def _restaurar_claves(valor):
+    if isinstance(valor, dict):
+        return {k: CLAVE_REPETICION if k == 'password' and v == OCULTO else _restaurar_claves(v)
+                for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_restaurar_claves(v) for v in valor]
+    return valor
+
+
+def _sin_volatiles(valor):
+    if isinstance(valor, dict):
+        return {k: _sin_volatiles(v) for k, v in valor.items() if k not in CAMPOS_VOLATILES}
+    if isinstance(valor, list):
+        return [_sin_volatiles(v) for v in valor]
+    return valor
+
+
+def huella_respuesta(cuerpo: bytes) -> str:
+    """Hash del cuerpo de una respuesta (JSON normalizado, sin los campos volátiles)."""
+    try:
+        normalizado = json.dumps(_sin_volatiles(json.loads(cuerpo)), sort_keys=True).encode()
+    except ValueError:
+        normalizado = cuerpo
+    return hashlib.sha1(normalizado).hexdigest()[:16]
+
+
+class _Cliente:
+    """Una conexión keep-alive al servidor (una por hilo)."""
+
+    def __init__(self, puerto: int):
+        self.puerto = puerto
+        self._conexion = None
+
+    def enviar(self, metodo: str, url: str, cuerpo: bytes = None, headers: dict = None):
+        """(estado, cuerpo, segundos). estado None si la conexión falló dos veces."""
+        for _ in range(2):
+            if self._conexion is None:
+                self._conexion = http.client.HTTPConnection("127.0.0.1", self.puerto, timeout=60)
+            inicio = time.perf_counter()
+            try:
+                self._conexion.request(metodo, url, body=cuerpo, headers=headers or {})
+                respuesta = self._conexion.getresponse()
+                contenido = respuesta.read()
+                return respuesta.status, contenido, time.perf_counter() - inicio
+            except (OSError, http.client.HTTPException):
+                self._conexion.close()
+                self._conexion = None
+        return None, b"", 0.0
+
+
+class _Sesiones:
+    """
+    Token de acceso de cada (hotel, principal) de la captura, obtenido con un
+    login real contra la copia. Se piden al primer uso: un cliente que se
+    registró durante la captura ya existe cuando aparece su primer token.
+    """
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def _email(self, hotel, dni: str):
+        ruta = os.path.join(self.directorio, "hoteles", f"{hotel}.db") if hotel else os.path.join(self.directorio, "hotel.db")
+        conexion = sqlite3.connect(ruta)
+        try:
+            fila = conexion.execute("SELECT email FROM clientes WHERE dni = ?", (dni,)).fetchone()
+        finally:
+            conexion.close()
+        return fila[0] if fila else None
+
+    def _iniciar_sesion(self, cliente: _Cliente, hotel, principal: str):
+        tipo, _, identificador = principal.partition(":")
+        if tipo == 'admin':
+            ruta, usuario = "/api/v1/admin/iniciar_sesion", identificador
+        elif tipo == 'cliente':
+            ruta, usuario = "/api/v1/clientes/iniciar_sesion", self._email(hotel, identificador)
+        else:
+            return None
+        if usuario is None:
+            return None
+        estado, cuerpo, _ = cliente.enviar(
+            "POST", _url(hotel, ruta),
+            urlencode({"username": usuario, "password": CLAVE_REPETICION}).encode(),
+            {"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        return json.loads(cuerpo)["access_token"] if estado == 200 else None
+
+    def token(self, cliente: _Cliente, hotel, principal: str):
+        with self._lock:
+            token, obtenido = self._tokens.get((hotel, principal), (None, 0.0))
+            if token is None or time.monotonic() - obtenido > SEGUNDOS_RENOVAR_SESION:
+                token = self._iniciar_sesion(cliente, hotel, principal)
+                if token is not None:
+                    self._tokens[(hotel, principal)] = (token, time.monotonic())
+            return token
+
+
+def repetir_registros(registros: list, directorio: str, puerto: int,
+                      velocidad: float = 1.0, concurrencia: int = 1) -> list:
+    """
+    Envía los registros de una captura a la app que escucha en 'puerto' (que
+    usa la copia en 'directorio') respetando los tiempos originales divididos
+    por 'velocidad' (0 = sin esperas). Con concurrencia 1 cada petición espera
+    a la anterior, así las respuestas no dependen de carreras entre escrituras
+    y dos corridas son comparables petición por petición.
+    """
+    sesiones = _Sesiones(directorio)
+    local = threading.local()
+
+    def repetir(registro):
+        cliente = getattr(local, "cliente", None)
+        if cliente is None:
+            cliente = local.cliente = _Cliente(puerto)
+
+        headers, cuerpo = {}, None
+        principal = registro.get("principal")
+        if principal == PRINCIPAL_INVALIDO:
+            headers["Authorization"] = "Bearer invalido"
+        elif principal:
+            token = sesiones.token(cliente, registro["hotel"], principal)
+            headers["Authorization"] = f"Bearer {token or 'sin-sesion'}"
+        if registro.get("formato") == "json":
+            cuerpo = json.dumps(_restaurar_claves(registro["cuerpo"])).encode()
+            headers["Content-Type"] = "application/json"
+        elif registro.get("formato") == "form":
+            cuerpo = urlencode(_restaurar_claves(registro["cuerpo"])).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        estado, contenido, segundos = cliente.enviar(
+            registro["metodo"], _url(registro["hotel"], registro["ruta"], registro.get("consulta", "")),
+            cuerpo, headers
+        )
+        return {
+            "metodo": registro["metodo"],
+            "plantilla": registro.get("plantilla") or registro["ruta"],
+            "estado": estado,
+            "ms": round(segundos * 1000, 3),
+            "huella": huella_respuesta(contenido),
+            "estado_original": registro.get("estado"),
+            "ms_original": registro.get("ms"),
+        }
+
+    inicio = time.monotonic()
+    primero = registros[0]["ts"] if registros else 0
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        futuros = []
+        for registro in registros:
+            if velocidad > 0:
+                espera = inicio + (registro["ts"] - primero) / velocidad - time.monotonic()
+                if espera > 0:
+                    time.sleep(espera)
+            futuros.append(pool.submit(repetir, registro))
+        return [futuro.result() for futuro in futuros]
+
+
+# ==============================================================================
+# COMPARACIÓN DE DOS CORRIDAS
+# ==============================================================================
+
+def _percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _distribucion(valores: list) -> dict:
+    return {
+        "cantidad": len(valores),
+        "p50": _percentil(valores, 50),
+        "p95": _percentil(valores, 95),
+        "p99": _percentil(valores, 99),
+    }
+
+
+def comparar_resultados(a: dict, b: dict) -> dict:
+    """
+    Compara dos corridas de la misma captura: latencias por ruta (p50/p95/p99)
+    y equivalencia de respuestas (estado + huella) petición por petición.
+    """
+    peticiones_a, peticiones_b = a["peticiones"], b["peticiones"]
+
+    por_ruta = {}
+    for lado, peticiones in (("a", peticiones_a), ("b", peticiones_b)):
+        for p in peticiones:
+            if p["estado"] is not None:
+                por_ruta.setdefault(f'{p["metodo"]} {p["plantilla"]}', {"a": [], "b": []})[lado].append(p["ms"])
+
+    rutas = []
+    for ruta, tiempos in sorted(por_ruta.items()):
+        dist_a, dist_b = _distribucion(tiempos["a"]), _distribucion(tiempos["b"])
+        rutas.append({
+            "ruta": ruta,
+            "a": dist_a,
+            "b": dist_b,
+            "cambio_p95": round((dist_b["p95"] / dist_a["p95"] - 1) * 100, 1) if dist_a["p95"] else None,
+        })
+
+    distintas = [
+        {"indice": i, "ruta": f'{pa["metodo"]} {pa["plantilla"]}', "estado_a": pa["estado"], "estado_b": pb["estado"]}
+        for i, (pa, pb) in enumerate(zip(peticiones_a, peticiones_b))
+        if (pa["estado"], pa["huella"]) != (pb["estado"], pb["huella"])
+    ]
+
+    return {
+        "total": {
+            "a": _distribucion([p["ms"] for p in peticiones_a if p["estado"] is not None]),
+            "b": _distribucion([p["ms"] for p in peticiones_b if p["estado"] is not None]),
+        },
+        "rutas": rutas,
+        "comparadas": min(len(peticiones_a), len(peticiones_b)),
+        "cantidad_distintas": len(distintas),
+        "distintas": distintas[:DISTINTAS_A_LISTAR],
+    }
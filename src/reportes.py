@@ -0,0 +1,192 @@
+import glob
+import os
+import sqlite3
+import threading
+import time
+
+from peewee import SqliteDatabase
+
+from .database import db_principal, propiedad_actual
+
+
+# ==============================================================================
+# CONFIGURACIÓN DEL MODO REPORTES
+# ==============================================================================
+
+# Si está activo, las consultas de solo lectura del admin se hacen contra una
+# copia (snapshot) de hotel.db, y no compiten con las escrituras de reservas.
+MODO_REPORTES_ACTIVO = os.getenv("HOTEL_MODO_REPORTES", "0") == "1"
+
+# Antigüedad máxima (en segundos) que aceptamos para el snapshot
+SEGUNDOS_MAXIMOS_SNAPSHOT = int(os.getenv("HOTEL_SNAPSHOT_SEGUNDOS", "60"))
+
+PREFIJO_SNAPSHOT = "hotel_reportes"
+
+
+class SnapshotReportes:
+    """
+    Mantiene una copia consistente de una BD (por defecto la principal),
+    hecha con la API de backup online de SQLite, y un segundo handle de
+    peewee para leerla.
+
+    Cada snapshot se escribe en un archivo nuevo (<prefijo>_<pid>_<n>.db),
+    así los hilos que todavía están leyendo el anterior no se ven afectados.
+    El pid en el nombre evita que dos workers escriban el mismo archivo.
+    """
+
+    def __init__(self, ruta_origen=None, directorio=None, prefijo=PREFIJO_SNAPSHOT):
+        self.ruta_origen = ruta_origen
+        self._directorio = directorio
+        self._prefijo = prefijo
+        self._lock = threading.Lock()
+        self._base = None
+        self._ruta = None
+        self._generacion = 0
+        self._creado_en = 0.0
+
+    def _ruta_principal(self):
+        return self.ruta_origen or db_principal.database
+
+    def _directorio_snapshots(self):
+        return self._directorio or os.path.dirname(os.path.abspath(self._ruta_principal()))
+
+    def refrescar(self):
+        """Genera un nuevo snapshot y cambia el handle de lectura hacia él."""
+        directorio = self._directorio_snapshots()
+        os.makedirs(directorio, exist_ok=True)
+        generacion = self._generacion + 1
+        ruta_nueva = os.path.join(directorio, f"{self._prefijo}_{os.getpid()}_{generacion}.db")
+
+        inicio = time.monotonic()
+        origen = sqlite3.connect(self._ruta_principal())
+        destino = sqlite3.connect(ruta_nueva)
+        try:
+            # pages=-1 copia todo en un solo paso: el snapshot es consistente
+            origen.backup(destino, pages=-1)
+            # La copia es de solo lectura: no necesita archivos -wal/-shm
+            destino.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            destino.close()
+            origen.close()
+
+        ruta_anterior = self._ruta
+        self._base = SqliteDatabase(ruta_nueva, pragmas={'query_only': 1})
+        self._ruta = ruta_nueva
+        self._generacion = generacion
+        self._creado_en = time.time()
+        print(f"Snapshot de reportes '{self._prefijo}' #{generacion} creado en {time.monotonic() - inicio:.3f}s.")
+
+        if ruta_anterior:
+            self._borrar_archivo(ruta_anterior)
+
+    def _borrar_archivo(self, ruta):
+        try:
+            os.remove(ruta)
+        except OSError:
+            # Puede seguir abierto en algún hilo (ej: en Windows); se limpia después
+            pass
+
+    def limpiar_anteriores(self):
+        """
+        Borra snapshots viejos que quedaron de ejecuciones anteriores: los de
+        procesos que ya no existen y los anteriores de este mismo proceso.
+        Los de otros workers vivos no se tocan, los están usando.
+        """
+        directorio = self._directorio_snapshots()
+        for ruta in glob.glob(os.path.join(directorio, f"{glob.escape(self._prefijo)}_*.db")):
+            if ruta == self._ruta:
+                continue
+            prefijo, pid = _dueno_del_snapshot(ruta)
+            if prefijo != self._prefijo:
+                continue  # de otro hotel cuyo id empieza igual
+            if pid is None or pid == os.getpid() or not _proceso_vivo(pid):
+                self._borrar_archivo(ruta)
+
+    def edad(self) -> float:
+        return time.time() - self._creado_en
+
+    def obtener(self):
+        """
+        Devuelve (base_de_datos, edad_en_segundos) del snapshot.
+        Si está vencido lo refresca; si otro hilo ya lo está refrescando,
+        se usa el snapshot actual para no bloquear la petición.
+        """
+        if self._base is None or self.edad() > SEGUNDOS_MAXIMOS_SNAPSHOT:
+            bloqueante = self._base is None
+            if self._lock.acquire(blocking=bloqueante):
+                try:
+                    if self._base is None or self.edad() > SEGUNDOS_MAXIMOS_SNAPSHOT:
+                        self.refrescar()
+                finally:
+                    self._lock.release()
+        return self._base, self.edad()
+
+
+def _dueno_del_snapshot(ruta):
+    """
+    (prefijo, pid) de '<prefijo>_<pid>_<n>.db'. Si el nombre no termina en
+    '_<pid>_<n>' (ej: snapshots de versiones anteriores) el pid es None.
+    """
+    nombre = os.path.basename(ruta)[:-len(".db")]
+    partes = nombre.rsplit("_", 2)
+    if len(partes) == 3 and partes[1].isdigit() and partes[2].isdigit():
+        return partes[0], int(partes[1])
+    return nombre.rsplit("_", 1)[0], None
+
+
+def _proceso_vivo(pid: int) -> bool:
+    if os.name == "nt":
+        import ctypes
+        # PROCESS_QUERY_LIMITED_INFORMATION; os.kill(pid, 0) en Windows mata el proceso
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # existe, pero es de otro usuario
+    return True
+
+
+snapshot_reportes = SnapshotReportes()
+
+
+# Snapshots de los demás hoteles, por hotel_id. Van en un subdirectorio del
+# de hoteles: un '<hotel_id>.db' suelto ahí se tomaría por otro hotel.
+_snapshots_hoteles = {}
+_lock_snapshots_hoteles = threading.Lock()
+
+
+def snapshot_de_propiedad(hotel_id, base) -> SnapshotReportes:
+    """Snapshot de la BD principal (hotel_id None) o del hotel indicado."""
+    if hotel_id is None:
+        return snapshot_reportes
+    with _lock_snapshots_hoteles:
+        snapshot = _snapshots_hoteles.get(hotel_id)
+        if snapshot is None or snapshot.ruta_origen != base.database:
+            directorio = os.path.join(os.path.dirname(os.path.abspath(base.database)), "reportes")
+            snapshot = SnapshotReportes(base.database, directorio, prefijo=hotel_id)
+            # Primer uso en este proceso: limpiamos las copias de workers que ya no están
+            snapshot.limpiar_anteriores()
+            _snapshots_hoteles[hotel_id] = snapshot
+        return snapshot
+
+
+def refrescar_snapshot_reportes():
+    """Tarea programada: refresca (si venció) el snapshot de la BD actual."""
+    snapshot_de_propiedad(*propiedad_actual()).obtener()
+
+
+def obtener_base_reportes():
+    """
+    Devuelve (base_de_datos, edad) para consultas de reportes, del snapshot
+    de la BD de la petición (la principal o la del hotel).
+    Si el modo reportes está apagado devuelve (None, None): se usa la BD principal.
+    """
+    if not MODO_REPORTES_ACTIVO:
+        return None, None
+    return snapshot_de_propiedad(*propiedad_actual()).obtener()
@@ -1,7 +1,12 @@
-from werkzeug.security import check_password_hash
-from ..models import Admin, Habitacion, TipoHabitacion
+from ..models import Admin, Habitacion, TipoHabitacion, Reserva, ReservaHistorico, Cliente, BloqueoHabitacion, RegistroAuditoria, RetencionHabitacion
 from ..database import db
+from .lista_espera_services import notificar_habitacion_liberada
+from ..cache import registrar_cambio, registrar_cambio_reservas_cliente, cache_tipos_habitacion
+from .ari_services import registrar_cambio_inventario
+from ..auditoria import auditar
+import time
 from datetime import date
+from peewee import fn, Value
 
 # 1. Importa tus modelos
 from ..models import Admin
@@ -11,6 +16,8 @@ def iniciar_sesion_admin(username, password):
     Verifica las credenciales del Administrador.
     Compara la contraseña hasheada.
     """
+    # werkzeug se importa en el primer uso para no demorar el arranque
+    from werkzeug.security import check_password_hash
 
     try:
         # Busca al admin por 'username' en lugar de 'email'
@@ -49,24 +56,28 @@ def admin_obtener_todas_las_habitaciones():
         print(f"Error al obtener todas las habitaciones: {e}")
         return []
 
-def admin_actualizar_estado_habitacion(habitacion_id: int, nuevo_estado: str):
+def admin_actualizar_estado_habitacion(habitacion_id: int, nuevo_estado: str, actor: str = 'admin'):
     """
     [Admin] Actualiza el estado de una habitación.
     Según tu nueva lógica, no validamos conflictos.
+    'actor' queda en la auditoría (ej: 'admin:hotelp').
     """
     try:
-        with db.atomic():
+        with db.atomic('IMMEDIATE'):
             habitacion = Habitacion.get_or_none(Habitacion.id == habitacion_id)
             
             if not habitacion:
                 return None, "Habitación no encontrada"
 
             # Validar que el estado sea uno de los permitidos
-            if nuevo_estado not in ['Activa', 'Mantenimiento']:
+            if nuevo_estado not in ESTADOS_HABITACION:
                 return None, "Estado no válido"
             
             # --- LÓGICA SIMPLIFICADA ---
             # Simplemente actualizamos el estado
+            if habitacion.estado != nuevo_estado:
+                registrar_cambio_inventario(habitacion.tipo_id)
+            estado_anterior = habitacion.estado
             habitacion.estado = nuevo_estado
             habitacion.save()
             
@@ -80,8 +91,398 @@ def admin_actualizar_estado_habitacion(habitacion_id: int, nuevo_estado: str):
                                .where(Habitacion.id == habitacion_id)
                                .first())
             
-            return hab_actualizada, "Estado actualizado"
+        auditar(actor, 'habitacion', habitacion_id, 'cambiar_estado',
+                {"estado": estado_anterior}, {"estado": nuevo_estado})
+        return hab_actualizada, "Estado actualizado"
 
     except Exception as e:
         print(f"Error actualizando estado: {e}")
-        return None, f"Error interno: {e}"
\ No newline at end of file
+        return None, f"Error interno: {e}"
+
+ESTADOS_HABITACION = ['Activa', 'Mantenimiento']
+
+def admin_actualizar_estados_habitaciones(cambios, actor: str = 'admin'):
+    """
+    [Admin] Actualiza el estado de varias habitaciones a la vez.
+    'cambios' es una lista de (habitacion_id, nuevo_estado).
+
+    Valida todo antes de escribir (o se aplican todos o ninguno), hace un
+    UPDATE por estado destino y devuelve las habitaciones actualizadas con
+    una sola consulta con JOIN.
+    Devuelve (habitaciones, mensaje_error).
+    """
+    # Si una habitación aparece repetida, gana el último cambio
+    estado_por_habitacion = dict(cambios)
+    if not estado_por_habitacion:
+        return [], "No se enviaron cambios"
+
+    estados_invalidos = set(estado_por_habitacion.values()) - set(ESTADOS_HABITACION)
+    if estados_invalidos:
+        return None, f"Estado no válido: {', '.join(sorted(estados_invalidos))}"
+
+    try:
+        with db.atomic('IMMEDIATE'):
+            ids = list(estado_por_habitacion)
+            # Estado y tipo actuales: para validar, para el registro ARI y para la auditoría
+            actuales = {habitacion_id: (tipo_id, estado) for habitacion_id, tipo_id, estado in (Habitacion
+                        .select(Habitacion.id, Habitacion.tipo, Habitacion.estado)
+                        .where(Habitacion.id.in_(ids))
+                        .tuples())}
+            faltantes = [i for i in ids if i not in actuales]
+            if faltantes:
+                return None, f"Habitaciones no encontradas: {faltantes}"
+
+            ids_por_estado = {}
+            for habitacion_id, estado in estado_por_habitacion.items():
+                ids_por_estado.setdefault(estado, []).append(habitacion_id)
+
+            # Un registro ARI por tipo con alguna habitación que cambia de verdad
+            tipos_afectados = {tipo_id for habitacion_id, (tipo_id, estado) in actuales.items()
+                               if estado != estado_por_habitacion[habitacion_id]}
+            for tipo_id in tipos_afectados:
+                registrar_cambio_inventario(tipo_id)
+
+            for estado, ids_estado in ids_por_estado.items():
+                Habitacion.update(estado=estado).where(Habitacion.id.in_(ids_estado)).execute()
+
+            habitaciones = list(Habitacion
+                                .select(Habitacion, TipoHabitacion)
+                                .join(TipoHabitacion)
+                                .where(Habitacion.id.in_(ids))
+                                .order_by(Habitacion.numero))
+
+        for habitacion_id, estado in estado_por_habitacion.items():
+            auditar(actor, 'habitacion', habitacion_id, 'cambiar_estado',
+                    {"estado": actuales[habitacion_id][1]}, {"estado": estado})
+
+        # Un único aviso para todo el lote
+        resumen = ", ".join(f"{len(v)} -> {k}" for k, v in ids_por_estado.items())
+        print(f"Estados de habitaciones actualizados ({resumen}).")
+        return habitaciones, "Estados actualizados"
+
+    except Exception as e:
+        print(f"Error actualizando estados en lote: {e}")
+        return None, f"Error interno: {e}"
+
+
+def admin_actualizar_tarifa_tipo(tipo_id: int, tarifa_base: int):
+    """
+    [Admin] Cambia la tarifa por noche de un tipo de habitación.
+    Las reservas ya hechas conservan su costo. Devuelve (tipo, mensaje_error).
+    """
+    if tarifa_base <= 0:
+        return None, "La tarifa debe ser mayor a cero"
+
+    try:
+        with db.atomic('IMMEDIATE'):
+            tipo = TipoHabitacion.get_or_none(TipoHabitacion.id == tipo_id)
+            if not tipo:
+                return None, "Tipo de habitación no encontrado"
+            if tipo.tarifa_base != tarifa_base:
+                tipo.tarifa_base = tarifa_base
+                tipo.save()
+                registrar_cambio('tipos_habitacion')
+                registrar_cambio_inventario(tipo.id)
+        cache_tipos_habitacion.invalidar()
+
+        print(f"Tarifa del tipo '{tipo.nombre_tipo}' actualizada a {tarifa_base}.")
+        return tipo, "Tarifa actualizada"
+
+    except Exception as e:
+        print(f"Error actualizando la tarifa del tipo {tipo_id}: {e}")
+        return None, f"Error interno: {e}"
+
+
+def admin_obtener_auditoria(entidad: str, entidad_id: str = None, limite: int = 100):
+    """[Admin] Últimos cambios auditados de una entidad (o de un registro puntual), del más nuevo al más viejo."""
+    try:
+        consulta = RegistroAuditoria.select().where(RegistroAuditoria.entidad == entidad)
+        if entidad_id is not None:
+            consulta = consulta.where(RegistroAuditoria.entidad_id == str(entidad_id))
+        return list(consulta
+                    .order_by(RegistroAuditoria.registrado_en.desc(), RegistroAuditoria.id.desc())
+                    .limit(limite))
+    except Exception as e:
+        print(f"Error al obtener la auditoría de {entidad}: {e}")
+        return []
+
+
+# ==============================================================================
+# BLOQUEOS DE HABITACIÓN (MANTENIMIENTO POR FECHAS)
+# ==============================================================================
+
+def _se_solapa(intervalos, inicio: date, fin: date) -> bool:
+    return any(i < fin and f > inicio for i, f in intervalos)
+
+
+def _reservas_con_datos_admin(condicion):
+    """Reservas con Cliente, Habitación y Tipo cargados (para 'ReservaPublicaAdmin')."""
+    return list(Reserva
+                .select(Reserva, Cliente, Habitacion, TipoHabitacion)
+                .join(Cliente)
+                .switch(Reserva)
+                .join(Habitacion)
+                .join(TipoHabitacion)
+                .where(condicion)
+                .order_by(Reserva.fecha_checkin))
+
+
+def admin_crear_bloqueo_habitacion(habitacion_id: int, fecha_inicio: date, fecha_fin: date, motivo: str = None, reasignar: bool = False):
+    """
+    [Admin] Bloquea una habitación entre 'fecha_inicio' y 'fecha_fin'.
+
+    Si hay reservas en ese rango se informan como conflictos. Con
+    'reasignar' se mueven todas a otras habitaciones del mismo tipo en la
+    misma transacción que crea el bloqueo; si alguna no entra en ninguna,
+    no se guarda nada. Solo se mueven las 'Confirmada': un huésped ya
+    alojado ('En curso') o una estadía terminada no cambian de habitación,
+    y con alguna de esas en el rango el bloqueo no se crea.
+
+    Devuelve (resultado, mensaje_error). 'resultado' es un dict con
+    'bloqueo', 'conflictos', 'no_reasignables' y 'reasignadas'; 'bloqueo'
+    es None si no se creó.
+    """
+    if fecha_fin <= fecha_inicio:
+        return None, "La fecha de fin debe ser posterior a la de inicio"
+
+    try:
+        with db.atomic('IMMEDIATE') as transaccion:
+            habitacion = Habitacion.get_or_none(Habitacion.id == habitacion_id)
+            if not habitacion:
+                return None, "Habitación no encontrada"
+
+            conflictos = _reservas_con_datos_admin(
+                (Reserva.habitacion == habitacion) &
+                (Reserva.fecha_checkin < fecha_fin) &
+                (Reserva.fecha_checkout > fecha_inicio) &
+                (Reserva.estado_reserva != 'Cancelada')
+            )
+            no_reasignables = [r for r in conflictos if r.estado_reserva != 'Confirmada']
+            resultado = {"bloqueo": None, "conflictos": conflictos,
+                         "no_reasignables": no_reasignables, "reasignadas": []}
+
+            if conflictos and not reasignar:
+                return resultado, "La habitación tiene reservas en esas fechas"
+
+            if no_reasignables:
+                return resultado, "La habitación tiene huéspedes alojados o estadías terminadas en esas fechas; no se pueden reasignar"
+
+            if conflictos:
+                asignacion = _planificar_reasignacion(habitacion, conflictos)
+                if asignacion is None:
+                    transaccion.rollback()
+                    return resultado, "No hay habitaciones del mismo tipo para reasignar todas las reservas"
+
+                # Un UPDATE por habitación destino
+                por_destino = {}
+                for reserva_id, destino_id in asignacion.items():
+                    por_destino.setdefault(destino_id, []).append(reserva_id)
+                for destino_id, ids in por_destino.items():
+                    Reserva.update(habitacion=destino_id).where(Reserva.id.in_(ids)).execute()
+
+                resultado["reasignadas"] = _reservas_con_datos_admin(Reserva.id.in_(list(asignacion)))
+                for dni in {r.cliente_id for r in resultado["reasignadas"]}:
+                    registrar_cambio_reservas_cliente(dni)
+
+            # Las retenciones vigentes en el rango se pierden: la habitación
+            # ya no se puede reservar (el cliente reserva de nuevo y obtiene otra)
+            (RetencionHabitacion
+             .delete()
+             .where(
+                 (RetencionHabitacion.habitacion == habitacion) &
+                 (RetencionHabitacion.fecha_checkin < fecha_fin) &
+                 (RetencionHabitacion.fecha_checkout > fecha_inicio)
+             )
+             .execute())
+
+            resultado["bloqueo"] = BloqueoHabitacion.create(
+                habitacion=habitacion,
+                fecha_inicio=fecha_inicio,
+                fecha_fin=fecha_fin,
+                motivo=motivo
+            )
+            registrar_cambio_inventario(habitacion.tipo_id, fecha_inicio, fecha_fin)
+            print(f"Habitación {habitacion.numero} bloqueada del {fecha_inicio} al {fecha_fin}.")
+            return resultado, "Bloqueo creado"
+
+    except Exception as e:
+        print(f"Error creando bloqueo: {e}")
+        return None, f"Error interno: {e}"
+
+
+def _planificar_reasignacion(habitacion, conflictos):
+    """
+    Busca, para cada reserva en conflicto, otra habitación activa del mismo
+    tipo libre en sus fechas. Carga de una vez las reservas, bloqueos y
+    retenciones vigentes de las habitaciones candidatas y asigna en memoria (primera que entra).
+    Devuelve {reserva_id: habitacion_destino_id} o None si alguna no entra.
+    """
+    desde = min(r.fecha_checkin for r in conflictos)
+    hasta = max(r.fecha_checkout for r in conflictos)
+
+    candidatas = list(Habitacion
+                      .select(Habitacion.id)
+                      .where(
+                          (Habitacion.tipo == habitacion.tipo) &
+                          (Habitacion.estado == 'Activa') &
+                          (Habitacion.id != habitacion.id)
+                      )
+                      .order_by(Habitacion.numero))
+    ocupacion = {h.id: [] for h in candidatas}
+
+    for r in (Reserva
+              .select(Reserva.habitacion, Reserva.fecha_checkin, Reserva.fecha_checkout)
+              .where(
+                  (Reserva.habitacion.in_(list(ocupacion))) &
+                  (Reserva.fecha_checkin < hasta) &
+                  (Reserva.fecha_checkout > desde) &
+                  (Reserva.estado_reserva != 'Cancelada')
+              )):
+        ocupacion[r.habitacion_id].append((r.fecha_checkin, r.fecha_checkout))
+
+    for b in (BloqueoHabitacion
+              .select(BloqueoHabitacion.habitacion, BloqueoHabitacion.fecha_inicio, BloqueoHabitacion.fecha_fin)
+              .where(
+                  (BloqueoHabitacion.habitacion.in_(list(ocupacion))) &
+                  (BloqueoHabitacion.fecha_inicio < hasta) &
+                  (BloqueoHabitacion.fecha_fin > desde)
+              )):
+        ocupacion[b.habitacion_id].append((b.fecha_inicio, b.fecha_fin))
+
+    # Una habitación retenida por otro cliente tampoco sirve de destino
+    for r in (RetencionHabitacion
+              .select(RetencionHabitacion.habitacion, RetencionHabitacion.fecha_checkin, RetencionHabitacion.fecha_checkout)
+              .where(
+                  (RetencionHabitacion.habitacion.in_(list(ocupacion))) &
+                  (RetencionHabitacion.fecha_checkin < hasta) &
+                  (RetencionHabitacion.fecha_checkout > desde) &
+                  (RetencionHabitacion.vence_en > time.time())
+              )):
+        ocupacion[r.habitacion_id].append((r.fecha_checkin, r.fecha_checkout))
+
+    asignacion = {}
+    for reserva in conflictos:
+        for destino_id, intervalos in ocupacion.items():
+            if not _se_solapa(intervalos, reserva.fecha_checkin, reserva.fecha_checkout):
+                intervalos.append((reserva.fecha_checkin, reserva.fecha_checkout))
+                asignacion[reserva.id] = destino_id
+                break
+        else:
+            return None
+    return asignacion
+
+
+def admin_obtener_bloqueos_habitacion(habitacion_id: int):
+    """[Admin] Lista los bloqueos de una habitación, del más próximo al más lejano."""
+    try:
+        return list(BloqueoHabitacion
+                    .select()
+                    .where(BloqueoHabitacion.habitacion == habitacion_id)
+                    .order_by(BloqueoHabitacion.fecha_inicio))
+    except Exception as e:
+        print(f"Error al obtener bloqueos de la habitación {habitacion_id}: {e}")
+        return []
+
+
+def admin_eliminar_bloqueo_habitacion(bloqueo_id: int):
+    """[Admin] Elimina un bloqueo. Devuelve el bloqueo eliminado o None."""
+    try:
+        with db.atomic('IMMEDIATE'):
+            bloqueo = BloqueoHabitacion.get_or_none(BloqueoHabitacion.id == bloqueo_id)
+            if not bloqueo:
+                return None
+            bloqueo.delete_instance()
+            registrar_cambio_inventario(bloqueo.habitacion.tipo_id, bloqueo.fecha_inicio, bloqueo.fecha_fin)
+
+        # La habitación vuelve a estar disponible en esas fechas
+        notificar_habitacion_liberada(bloqueo.habitacion_id, bloqueo.fecha_inicio, bloqueo.fecha_fin)
+        return bloqueo
+    except Exception as e:
+        print(f"Error eliminando bloqueo {bloqueo_id}: {e}")
+        return None
+
+
+# ==============================================================================
+# LÍNEA DE TIEMPO DE OCUPACIÓN (VISTA GANTT)
+# ==============================================================================
+
+def _desplazamientos(inicio, fin, desde: date, dias: int):
+    """
+    Expresiones SQL con el inicio y el fin como días desde 'desde', ya
+    recortados a la ventana. Se calculan en SQLite: así no se convierte
+    ninguna fecha a 'date' en Python (es lo que más cuesta por fila).
+    """
+    base = fn.julianday(desde)
+    desplazamiento_inicio = fn.MAX((fn.julianday(inicio) - base).cast('INTEGER'), 0)
+    desplazamiento_fin = fn.MIN((fn.julianday(fin) - base).cast('INTEGER'), dias)
+    return desplazamiento_inicio, desplazamiento_fin
+
+
+def _agrupar_por_habitacion(filas):
+    """
+    Agrupa filas (habitacion_id, inicio, fin, clase, id, detalle) ya ordenadas
+    por (habitacion_id, inicio) en una sola pasada. Cada segmento queda como
+    [desplazamiento, largo, clase, id, detalle].
+    """
+    por_habitacion = {}
+    habitacion_actual, segmentos = None, None
+    for habitacion_id, inicio, fin, clase, id_, detalle in filas:
+        if habitacion_id != habitacion_actual:
+            habitacion_actual = habitacion_id
+            segmentos = por_habitacion.setdefault(habitacion_id, [])
+        segmentos.append([inicio, fin - inicio, clase, id_, detalle])
+    return por_habitacion
+
+
+def admin_obtener_linea_de_tiempo(desde: date, hasta: date):
+    """
+    [Admin] Para cada habitación, sus segmentos ocupados entre 'desde' y
+    'hasta' (exclusivo): reservas ('R', id, DNI) y bloqueos ('B', id, motivo).
+
+    Son consultas fijas: habitaciones, reservas que se solapan (por el
+    índice de fecha_checkout, también en el historial) y bloqueos. Después
+    se ordena una vez y se recorre una sola vez agrupando por habitación.
+    """
+    dias = (hasta - desde).days
+    try:
+        habitaciones = list(Habitacion
+                            .select(Habitacion.id, Habitacion.numero, Habitacion.tipo, Habitacion.estado)
+                            .order_by(Habitacion.numero)
+                            .tuples())
+
+        filas = []
+        for modelo in (Reserva, ReservaHistorico):
+            inicio, fin = _desplazamientos(modelo.fecha_checkin, modelo.fecha_checkout, desde, dias)
+            # db.execute() devuelve el cursor crudo: filas de enteros, sin
+            # pasar cada valor por los conversores de peewee
+            filas.extend(db.execute(modelo
+                         .select(modelo.habitacion_id, inicio, fin, Value('R'), modelo.id, modelo.cliente_id)
+                         .where(
+                             (modelo.fecha_checkout > desde) &
+                             (modelo.fecha_checkin < hasta) &
+                             (modelo.estado_reserva != 'Cancelada')
+                         )).fetchall())
+        inicio, fin = _desplazamientos(BloqueoHabitacion.fecha_inicio, BloqueoHabitacion.fecha_fin, desde, dias)
+        filas.extend(db.execute(BloqueoHabitacion
+                     .select(BloqueoHabitacion.habitacion_id, inicio, fin, Value('B'),
+                             BloqueoHabitacion.id, BloqueoHabitacion.motivo)
+                     .where(
+                         (BloqueoHabitacion.fecha_fin > desde) &
+                         (BloqueoHabitacion.fecha_inicio < hasta)
+                     )).fetchall())
+        filas.sort(key=lambda fila: (fila[0], fila[1]))
+        por_habitacion = _agrupar_por_habitacion(filas)
+
+        return [
+            {
+                "id": habitacion_id,
+                "numero": numero,
+                "tipo_id": tipo_id,
+                "estado": estado,
+                "segmentos": por_habitacion.get(habitacion_id, []),
+            }
+            for habitacion_id, numero, tipo_id, estado in habitaciones
+        ]
+    except Exception as e:
+        print(f"Error al armar la línea de tiempo de ocupación: {e}")
+        return None
@@ -0,0 +1,197 @@
+from contextlib import contextmanager
+from datetime import date
+from typing import List, Optional
+
+from peewee import fn
+
+from ..models import Habitacion, CambioReserva
+from ..database import db
+
+
+# ==============================================================================
+# REGISTRO DE CAMBIOS DE RESERVAS
+# ==============================================================================
+
+# Horas que se conservan las filas de 'reservas_cambios'. Un worker que no
+# refrescó su almacén en ese tiempo simplemente lo recarga completo.
+HORAS_REGISTRO_CAMBIOS = 24
+
+# 'reserva_id' que no existe: pide a los almacenes en memoria recargar todo
+# en lugar de releer ids sueltos (ver cambios_reservas_en_bloque)
+MARCA_RECARGA_COMPLETA = 0
+
+
+def crear_registro_cambios_reservas():
+    """
+    Crea (si no existen) los triggers que anotan en 'reservas_cambios' el id
+    de cada reserva insertada, modificada o borrada, tanto en 'reservas' como
+    en 'reservas_historico' (el archivado borra de una e inserta en la otra).
+    """
+    with db.atomic():
+        for tabla in ('reservas', 'reservas_historico'):
+            for sufijo, evento, fila in (('ai', 'INSERT', 'new'), ('au', 'UPDATE', 'new'), ('ad', 'DELETE', 'old')):
+                db.execute_sql(f"""
+                    CREATE TRIGGER IF NOT EXISTS {tabla}_cambios_{sufijo} AFTER {evento} ON {tabla} BEGIN
+                        INSERT INTO reservas_cambios(reserva_id) VALUES ({fila}.id);
+                    END
+                """)
+
+
+@contextmanager
+def cambios_reservas_en_bloque():
+    """
+    Para inserciones masivas en 'reservas' dentro de una transacción: quita
+    el trigger de INSERT mientras dura el bloque (una fila de registro por
+    reserva es buena parte del costo) y al final deja una sola
+    MARCA_RECARGA_COMPLETA. Si la transacción se revierte, el trigger vuelve
+    con ella: en SQLite el DDL también es transaccional.
+    """
+    db.execute_sql("DROP TRIGGER IF EXISTS reservas_cambios_ai")
+    yield
+    crear_registro_cambios_reservas()
+    CambioReserva.insert(reserva_id=MARCA_RECARGA_COMPLETA).execute()
+
+
+def podar_registro_cambios(horas: int = HORAS_REGISTRO_CAMBIOS) -> int:
+    """Borra las filas de 'reservas_cambios' con más de 'horas' horas."""
+    with db.atomic():
+        borradas = (CambioReserva
+                    .delete()
+                    .where(CambioReserva.registrado_en < fn.datetime('now', f"-{int(horas)} hours"))
+                    .execute())
+    if borradas:
+        print(f"Registro de cambios de reservas: {borradas} filas podadas.")
+    return borradas
+
+
+# ==============================================================================
+# REPORTES AGREGADOS (SOBRE EL ALMACÉN COLUMNAR)
+# ==============================================================================
+
+# numpy se importa recién en el primer reporte (no en el arranque)
+
+def _inicios_de_mes(desde: date, hasta: date) -> List[date]:
+    """Primer día de cada mes entre 'desde' y 'hasta', más el del mes siguiente al último."""
+    meses = []
+    anio, mes = desde.year, desde.month
+    while (anio, mes) <= (hasta.year, hasta.month):
+        meses.append(date(anio, mes, 1))
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+    meses.append(date(anio, mes, 1))
+    return meses
+
+
+def _filtro_base(columnas, tipo_id: Optional[int]):
+    from ..analitica import BORRADA
+    filtro = columnas['estado'] != BORRADA
+    if tipo_id is not None:
+        filtro &= columnas['tipo'] == tipo_id
+    return filtro
+
+
+def obtener_ocupacion_mensual(desde: date, hasta: date, tipo_id: Optional[int] = None) -> Optional[list]:
+    """
+    Noches ocupadas / noches disponibles por mes, entre el mes de 'desde' y
+    el de 'hasta' (inclusive). No cuenta reservas canceladas.
+
+    Se arma la ocupación de cada día con dos bincount (entradas y salidas)
+    y una suma acumulada: el costo es O(reservas + días), sin recorrer
+    objetos Reserva.
+    """
+    import numpy as np
+    from ..analitica import consultar_almacen, CANCELADA
+
+    meses = _inicios_de_mes(desde, hasta)
+    inicio, fin = meses[0].toordinal(), meses[-1].toordinal()
+    dias = fin - inicio
+    cortes = np.array([m.toordinal() - inicio for m in meses[:-1]])
+
+    def calcular(columnas):
+        filtro = _filtro_base(columnas, tipo_id)
+        filtro &= columnas['estado'] != CANCELADA
+        filtro &= (columnas['checkin'] < fin) & (columnas['checkout'] > inicio)
+        entradas = np.clip(columnas['checkin'][filtro], inicio, fin) - inicio
+        salidas = np.clip(columnas['checkout'][filtro], inicio, fin) - inicio
+        por_dia = np.cumsum(np.bincount(entradas, minlength=dias + 1) - np.bincount(salidas, minlength=dias + 1))
+        return np.add.reduceat(por_dia[:dias], cortes).tolist()
+
+    try:
+        noches_ocupadas = consultar_almacen(calcular)
+        habitaciones = Habitacion.select()
+        if tipo_id is not None:
+            habitaciones = habitaciones.where(Habitacion.tipo == tipo_id)
+        cantidad_habitaciones = habitaciones.count()
+    except Exception as e:
+        print(f"Error al calcular la ocupación mensual: {e}")
+        return None
+
+    resultado = []
+    for mes, siguiente, ocupadas in zip(meses, meses[1:], noches_ocupadas):
+        disponibles = cantidad_habitaciones * (siguiente - mes).days
+        resultado.append({
+            "mes": mes.strftime("%Y-%m"),
+            "noches_ocupadas": ocupadas,
+            "noches_disponibles": disponibles,
+            "ocupacion": round(ocupadas / disponibles, 4) if disponibles else 0.0,
+        })
+    return resultado
+
+
+def obtener_estadisticas_mensuales(desde: date, hasta: date, tipo_id: Optional[int] = None) -> Optional[list]:
+    """
+    Por mes de check-in: reservas, canceladas, estadía promedio (noches),
+    anticipación promedio (días entre la creación y el check-in) e ingresos.
+    Las reservas anteriores a 'creada_en' no cuentan para la anticipación.
+    """
+    import numpy as np
+    from ..analitica import consultar_almacen, CANCELADA, SIN_FECHA
+
+    meses = _inicios_de_mes(desde, hasta)
+    limites = np.array([m.toordinal() for m in meses])
+    cantidad_meses = len(meses) - 1
+
+    def sumar(indices, pesos=None):
+        return np.bincount(indices, weights=pesos, minlength=cantidad_meses)[:cantidad_meses]
+
+    def calcular(columnas):
+        filtro = _filtro_base(columnas, tipo_id)
+        filtro &= (columnas['checkin'] >= limites[0]) & (columnas['checkin'] < limites[-1])
+        mes = np.searchsorted(limites, columnas['checkin'][filtro], side='right') - 1
+        canceladas = columnas['estado'][filtro] == CANCELADA
+        validas = ~canceladas
+
+        mes_validas = mes[validas]
+        checkin = columnas['checkin'][filtro][validas]
+        noches = (columnas['checkout'][filtro][validas] - checkin).astype(np.int64)
+        creada = columnas['creada'][filtro][validas]
+        con_fecha = creada != SIN_FECHA
+        anticipacion = (checkin[con_fecha] - creada[con_fecha]).astype(np.int64)
+
+        return {
+            "reservas": sumar(mes_validas).tolist(),
+            "canceladas": sumar(mes[canceladas]).tolist(),
+            "noches": sumar(mes_validas, noches).tolist(),
+            "ingresos": sumar(mes_validas, columnas['costo'][filtro][validas]).tolist(),
+            "con_fecha": sumar(mes_validas[con_fecha]).tolist(),
+            "anticipacion": sumar(mes_validas[con_fecha], anticipacion).tolist(),
+        }
+
+    try:
+        totales = consultar_almacen(calcular)
+    except Exception as e:
+        print(f"Error al calcular las estadísticas mensuales: {e}")
+        return None
+
+    resultado = []
+    for i, mes in enumerate(meses[:-1]):
+        reservas = totales["reservas"][i]
+        con_fecha = totales["con_fecha"][i]
+        resultado.append({
+            "mes": mes.strftime("%Y-%m"),
+            "reservas": reservas,
+            "canceladas": totales["canceladas"][i],
+            "estadia_promedio": round(totales["noches"][i] / reservas, 2) if reservas else None,
+            "anticipacion_promedio": round(totales["anticipacion"][i] / con_fecha, 2) if con_fecha else None,
+            "ingresos": int(totales["ingresos"][i]),
+        })
+    return resultado
@@ -0,0 +1,194 @@
+import os
+from datetime import date, timedelta
+from typing import Optional
+
+from peewee import fn
+
+from ..models import TipoHabitacion, Habitacion, Reserva, BloqueoHabitacion, CambioInventario
+from ..database import db
+
+
+# ==============================================================================
+# REGISTRO DE CAMBIOS DE DISPONIBILIDAD Y TARIFAS (ARI)
+# ==============================================================================
+
+# Días hacia adelante (desde hoy) que se publican a los channel managers
+HORIZONTE_ARI_DIAS = int(os.getenv("HOTEL_HORIZONTE_ARI_DIAS", "365"))
+
+# Días que se conservan las filas de 'ari_cambios'. Un canal con un cursor
+# más viejo tiene que pedir la foto completa.
+DIAS_REGISTRO_ARI = 7
+
+LIMITE_CAMBIOS_ARI = 500
+
+
+def registrar_cambio_inventario(tipo_id: int, desde: date = None, hasta: date = None):
+    """
+    Anota que cambió la disponibilidad o la tarifa de 'tipo_id' en las
+    noches [desde, hasta). Sin fechas, desde hoy hasta el horizonte (ej: una
+    habitación pasó a mantenimiento o cambió la tarifa del tipo).
+    Llamar dentro de la transacción del cambio.
+    """
+    if desde is None:
+        desde = date.today()
+        hasta = desde + timedelta(days=HORIZONTE_ARI_DIAS)
+    CambioInventario.insert(tipo=tipo_id, fecha_desde=desde, fecha_hasta=hasta).execute()
+
+
+def podar_registro_ari(dias: int = DIAS_REGISTRO_ARI) -> int:
+    """Borra las filas de 'ari_cambios' con más de 'dias' días."""
+    with db.atomic():
+        borradas = (CambioInventario
+                    .delete()
+                    .where(CambioInventario.registrado_en < fn.datetime('now', f"-{int(dias)} days"))
+                    .execute())
+    if borradas:
+        print(f"Registro ARI: {borradas} filas podadas.")
+    return borradas
+
+
+# ==============================================================================
+# FEED INCREMENTAL PARA CHANNEL MANAGERS
+# ==============================================================================
+
+def _libres_por_noche(tipo_id: int, desde: date, hasta: date) -> list:
+    """
+    Habitaciones activas de 'tipo_id' libres en cada noche de [desde, hasta).
+    Una consulta de reservas y otra de bloqueos; cada habitación se cuenta
+    una sola vez por noche aunque tenga una reserva y un bloqueo a la vez.
+    """
+    dias = (hasta - desde).days
+    habitaciones = Habitacion.select(Habitacion.id).where(
+        (Habitacion.tipo == tipo_id) & (Habitacion.estado == 'Activa')
+    )
+    cantidad = habitaciones.count()
+    if not cantidad:
+        return [0] * dias
+
+    ocupados = {}
+    for habitacion_id, inicio, fin in (Reserva
+                                       .select(Reserva.habitacion, Reserva.fecha_checkin, Reserva.fecha_checkout)
+                                       .where(
+                                           (Reserva.habitacion.in_(habitaciones)) &
+                                           (Reserva.fecha_checkin < hasta) &
+                                           (Reserva.fecha_checkout > desde) &
+                                           (Reserva.estado_reserva != 'Cancelada')
+                                       )
+                                       .tuples()):
+        ocupados.setdefault(habitacion_id, []).append(((inicio - desde).days, (fin - desde).days))
+    for habitacion_id, inicio, fin in (BloqueoHabitacion
+                                       .select(BloqueoHabitacion.habitacion, BloqueoHabitacion.fecha_inicio,
+                                               BloqueoHabitacion.fecha_fin)
+                                       .where(
+                                           (BloqueoHabitacion.habitacion.in_(habitaciones)) &
+                                           (BloqueoHabitacion.fecha_inicio < hasta) &
+                                           (BloqueoHabitacion.fecha_fin > desde)
+                                       )
+                                       .tuples()):
+        ocupados.setdefault(habitacion_id, []).append(((inicio - desde).days, (fin - desde).days))
+
+    # Entradas/salidas por noche y suma acumulada (solo la parte de cada
+    # intervalo que no pisa al anterior de la misma habitación)
+    delta = [0] * (dias + 1)
+    for intervalos in ocupados.values():
+        cubierto = 0
+        for inicio, fin in sorted(intervalos):
+            inicio, fin = max(inicio, cubierto), min(fin, dias)
+            if inicio < fin:
+                delta[inicio] += 1
+                delta[fin] -= 1
+                cubierto = fin
+
+    libres, ocupadas = [], 0
+    for cambio in delta[:dias]:
+        ocupadas += cambio
+        libres.append(cantidad - ocupadas)
+    return libres
+
+
+def _armar_celdas(fechas_por_tipo: dict) -> list:
+    """Disponibilidad y tarifa actuales de cada (tipo, fecha) pedida."""
+    tarifas = dict(TipoHabitacion
+                   .select(TipoHabitacion.id, TipoHabitacion.tarifa_base)
+                   .where(TipoHabitacion.id.in_(list(fechas_por_tipo)))
+                   .tuples())
+    celdas = []
+    for tipo_id in sorted(fechas_por_tipo):
+        if tipo_id not in tarifas:
+            continue  # el tipo se borró
+        fechas = sorted(fechas_por_tipo[tipo_id])
+        libres = _libres_por_noche(tipo_id, fechas[0], fechas[-1] + timedelta(days=1))
+        for fecha in fechas:
+            celdas.append({
+                "tipo_id": tipo_id,
+                "fecha": fecha,
+                "disponibles": libres[(fecha - fechas[0]).days],
+                "tarifa": tarifas[tipo_id],
+            })
+    return celdas
+
+
+def obtener_cambios_inventario(desde_seq: Optional[int] = None, limite: int = LIMITE_CAMBIOS_ARI):
+    """
+    Feed incremental de disponibilidad y tarifas (ARI) para channel managers.
+
+    Con 'desde_seq' devuelve solo las celdas (tipo, fecha) afectadas por las
+    filas de 'ari_cambios' posteriores a ese cursor (hasta 'limite' filas),
+    con sus valores actuales. Sin 'desde_seq' devuelve la foto completa del
+    horizonte y el cursor actual, para empezar a pedir cambios desde ahí.
+    Las fechas pasadas o más allá del horizonte no se informan.
+
+    Todo se lee en una transacción: los valores reflejan al menos los cambios
+    hasta el cursor devuelto. Si un cambio se confirma mientras tanto, vuelve
+    a aparecer en la próxima consulta (las celdas son idempotentes).
+
+    Devuelve (resultado, mensaje_error). 'resultado' es un dict con
+    'cursor', 'hay_mas' y 'celdas'.
+    """
+    hoy = date.today()
+    horizonte = hoy + timedelta(days=HORIZONTE_ARI_DIAS)
+
+    try:
+        with db.atomic():
+            ultimo = db.execute_sql(
+                "SELECT seq FROM sqlite_sequence WHERE name = ?", (CambioInventario._meta.table_name,)
+            ).fetchone()
+            ultimo = ultimo[0] if ultimo else 0
+
+            if desde_seq is None:
+                todas = {hoy + timedelta(days=i) for i in range(HORIZONTE_ARI_DIAS)}
+                tipos = [tipo_id for (tipo_id,) in TipoHabitacion.select(TipoHabitacion.id).tuples()]
+                return {"cursor": ultimo, "hay_mas": False, "celdas": _armar_celdas({t: todas for t in tipos})}, None
+
+            if desde_seq > ultimo:
+                return None, "Cursor desconocido"
+            primero = CambioInventario.select(fn.MIN(CambioInventario.seq)).scalar()
+            if desde_seq < ultimo and (primero or ultimo + 1) > desde_seq + 1:
+                return None, "El cursor es anterior al registro conservado; pedir la foto completa"
+
+            filas = list(CambioInventario
+                         .select(CambioInventario.seq, CambioInventario.tipo,
+                                 CambioInventario.fecha_desde, CambioInventario.fecha_hasta)
+                         .where(CambioInventario.seq > desde_seq)
+                         .order_by(CambioInventario.seq)
+                         .limit(limite + 1)
+                         .tuples())
+            hay_mas = len(filas) > limite
+            filas = filas[:limite]
+
+            fechas_por_tipo = {}
+            for _, tipo_id, inicio, fin in filas:
+                inicio, fin = max(inicio, hoy), min(fin, horizonte)
+                fechas = fechas_por_tipo.setdefault(tipo_id, set())
+                fechas.update(inicio + timedelta(days=i) for i in range((fin - inicio).days))
+            fechas_por_tipo = {t: f for t, f in fechas_por_tipo.items() if f}
+
+            return {
+                "cursor": filas[-1][0] if filas else desde_seq,
+                "hay_mas": hay_mas,
+                "celdas": _armar_celdas(fechas_por_tipo) if fechas_por_tipo else [],
+            }, None
+
+    except Exception as e:
+        print(f"Error al obtener los cambios de inventario: {e}")
+        return None, f"Error interno: {e}"
@@ -1,15 +1,20 @@
 from peewee import IntegrityError
-from werkzeug.security import generate_password_hash, check_password_hash
 
 # 1. Importa tus modelos y la base de datos
 from ..models import Cliente
 from ..database import db
+from ..cache import registrar_cambio, cache_clientes
+from .token_services import revocar_tokens_de_sujeto
+from ..auditoria import auditar
 
 def registrar_cliente(dni, nombre, apellido, email, password, telefono):
     """
     Registra un nuevo cliente en la base de datos.
     Hashea la contraseña para seguridad.
     """
+    # werkzeug se importa en el primer uso para no demorar el arranque
+    from werkzeug.security import generate_password_hash
+
     try:
         # 2. Hashear la contraseña
         # En lugar de guardar la 'password' en texto plano...
@@ -56,6 +61,7 @@ def iniciar_sesion(email, password):
     Verifica las credenciales del cliente para iniciar sesión.
     Compara la contraseña hasheada.
     """
+    from werkzeug.security import check_password_hash
 
     try:
         cliente = Cliente.get(Cliente.email == email)
@@ -81,6 +87,8 @@ def modificar_cliente_datos(dni_cliente, email=None, telefono=None, password=Non
     Modifica los datos de un cliente (email, telefono, password).
     Los campos que se pasan como None no se modifican.
     """
+    from werkzeug.security import generate_password_hash
+
     try:
         # 1. Usar db.atomic() para una transacción segura
         with db.atomic():
@@ -92,6 +100,7 @@ def modificar_cliente_datos(dni_cliente, email=None, telefono=None, password=Non
                 print(f"No existe un cliente con el DNI: {dni_cliente}")
                 return None
             
+            antes = {"email": cliente.email, "telefono": cliente.telefono, "password": cliente.password}
             campos_actualizados = 0
             
             # 2. Actualizar solo los campos que no son None
@@ -106,17 +115,25 @@ def modificar_cliente_datos(dni_cliente, email=None, telefono=None, password=Non
             if password is not None:
                 # 3. Hashear la nueva contraseña
                 cliente.password = generate_password_hash(password)
+                # Las sesiones abiertas (refresh tokens) dejan de valer
+                revocar_tokens_de_sujeto(str(cliente.dni))
                 campos_actualizados += 1
 
             # 4. Guardar solo si algo cambió
             if campos_actualizados > 0:
                 cliente.save()
-                print(f"Datos del cliente {dni_cliente} actualizados.")
-                return cliente
+                # Avisa a los demás workers que sus caches de clientes quedaron viejas
+                registrar_cambio('clientes')
             else:
                 print("No se proporcionaron datos nuevos para modificar.")
                 return cliente # Devuelve el cliente sin cambios
 
+        cache_clientes.invalidar()
+        auditar(f"cliente:{dni_cliente}", 'cliente', dni_cliente, 'modificar', antes,
+                {"email": cliente.email, "telefono": cliente.telefono, "password": cliente.password})
+        print(f"Datos del cliente {dni_cliente} actualizados.")
+        return cliente
+
     except IntegrityError as e:
         # Esto atrapará si el nuevo email ya existe
         if "clientes.email" in str(e):
@@ -130,13 +147,115 @@ def modificar_cliente_datos(dni_cliente, email=None, telefono=None, password=Non
         return None
     
 
-def obtener_todos_los_clientes():
+def obtener_todos_los_clientes(base_datos=None):
     """
     (Admin) Obtiene una lista de todos los clientes.
+    Si se pasa 'base_datos' (snapshot de reportes), se consulta ahí.
     """
     try:
         # Devuelve una lista de todos los objetos Cliente
-        return list(Cliente.select())
+        return list(Cliente.select().bind(base_datos or db))
     except Exception as e:
         print(f"Error al obtener todos los clientes: {e}")
-        return []
\ No newline at end of file
+        return []
+
+
+def obtener_cliente_por_dni(dni_cliente: int, base_datos=None):
+    """
+    (Admin) Busca un cliente por DNI. Devuelve None si no existe.
+    """
+    return (Cliente
+            .select()
+            .where(Cliente.dni == dni_cliente)
+            .bind(base_datos or db)
+            .first())
+
+# ==============================================================================
+# BÚSQUEDA DE CLIENTES (FTS5)
+# ==============================================================================
+
+def crear_indice_busqueda_clientes():
+    """
+    Crea (si no existe) la tabla virtual FTS5 'clientes_fts' sobre 'clientes'
+    y los triggers que la mantienen sincronizada con cada INSERT/UPDATE/DELETE.
+
+    Es una tabla de 'contenido externo': no duplica los datos, solo guarda
+    el índice invertido. El DNI se indexa como texto para permitir
+    búsquedas por DNI parcial (prefijo).
+    """
+    existia = db.execute_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'clientes_fts'"
+    ).fetchone()
+
+    with db.atomic():
+        db.execute_sql("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS clientes_fts USING fts5(
+                dni, nombre, apellido, email,
+                content='clientes', content_rowid='dni',
+                prefix='2 3 4',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        db.execute_sql("""
+            CREATE TRIGGER IF NOT EXISTS clientes_fts_ai AFTER INSERT ON clientes BEGIN
+                INSERT INTO clientes_fts(rowid, dni, nombre, apellido, email)
+                VALUES (new.dni, new.dni, new.nombre, new.apellido, new.email);
+            END
+        """)
+        db.execute_sql("""
+            CREATE TRIGGER IF NOT EXISTS clientes_fts_ad AFTER DELETE ON clientes BEGIN
+                INSERT INTO clientes_fts(clientes_fts, rowid, dni, nombre, apellido, email)
+                VALUES ('delete', old.dni, old.dni, old.nombre, old.apellido, old.email);
+            END
+        """)
+        db.execute_sql("""
+            CREATE TRIGGER IF NOT EXISTS clientes_fts_au AFTER UPDATE ON clientes BEGIN
+                INSERT INTO clientes_fts(clientes_fts, rowid, dni, nombre, apellido, email)
+                VALUES ('delete', old.dni, old.dni, old.nombre, old.apellido, old.email);
+                INSERT INTO clientes_fts(rowid, dni, nombre, apellido, email)
+                VALUES (new.dni, new.dni, new.nombre, new.apellido, new.email);
+            END
+        """)
+
+        # Si el índice es nuevo, lo llenamos con los clientes ya existentes
+        if not existia:
+            db.execute_sql("INSERT INTO clientes_fts(clientes_fts) VALUES ('rebuild')")
+            print("Índice de búsqueda de clientes creado.")
+
+
+def _armar_consulta_fts(texto: str):
+    """
+    Convierte el texto del buscador en una consulta FTS5:
+    cada palabra se busca como prefijo y todas deben coincidir (AND).
+    Las comillas se escapan para que el usuario no pueda inyectar sintaxis FTS.
+    """
+    terminos = []
+    for palabra in texto.split():
+        palabra = palabra.replace('"', '""')
+        terminos.append(f'"{palabra}"*')
+    return " ".join(terminos)
+
+
+def buscar_clientes(texto: str, pagina: int = 1, por_pagina: int = 20, base_datos=None):
+    """
+    (Admin) Busca clientes por nombre, apellido, prefijo de email o DNI parcial.
+    Los resultados vienen ordenados por relevancia (bm25) y paginados.
+    """
+    consulta = _armar_consulta_fts(texto)
+    if not consulta:
+        return []
+
+    try:
+        return list(Cliente.raw(
+            """
+            SELECT c.* FROM clientes_fts
+            JOIN clientes AS c ON c.dni = clientes_fts.rowid
+            WHERE clientes_fts MATCH ?
+            ORDER BY clientes_fts.rank
+            LIMIT ? OFFSET ?
+            """,
+            consulta, por_pagina, (pagina - 1) * por_pagina
+        ).bind(base_datos or db))
+    except Exception as e:
+        print(f"Error al buscar clientes con '{texto}': {e}")
+        return []
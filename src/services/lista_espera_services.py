@@ -0,0 +1,252 @@
+import bisect
+import queue
+import threading
+import time
+from datetime import date
+from typing import List
+
+from ..models import TipoHabitacion, Habitacion, Reserva, ListaEspera, BloqueoHabitacion, RetencionHabitacion
+from ..database import db, propiedad_actual, usar_propiedad
+from ..cache import registrar_cambio_reservas_cliente
+from .ari_services import registrar_cambio_inventario
+from ..outbox import encolar_evento_reserva, trabajador_outbox
+
+
+def agregar_a_lista_espera(dni_cliente: int, tipo_habitacion_id: int, fecha_checkin: date, fecha_checkout: date, total_personas: int):
+    """
+    Guarda un pedido de reserva que no tuvo disponibilidad.
+    Valida fechas, tipo y capacidad igual que crear_reserva.
+    """
+    if fecha_checkout <= fecha_checkin:
+        print("Error: La fecha de check-out debe ser posterior a la de check-in.")
+        return None
+
+    try:
+        tipo_hab = TipoHabitacion.get_or_none(TipoHabitacion.id == tipo_habitacion_id)
+        if not tipo_hab:
+            print(f"Error: El tipo de habitación {tipo_habitacion_id} no existe.")
+            return None
+
+        if total_personas > tipo_hab.capacidad_maxima:
+            print(f"Error: El número de personas ({total_personas}) excede la capacidad máxima ({tipo_hab.capacidad_maxima}).")
+            return None
+
+        with db.atomic():
+            solicitud = ListaEspera.create(
+                cliente=dni_cliente,
+                tipo=tipo_hab,
+                fecha_checkin=fecha_checkin,
+                fecha_checkout=fecha_checkout,
+                total_personas=total_personas
+            )
+
+        print(f"Solicitud {solicitud.id} agregada a la lista de espera.")
+        return solicitud
+
+    except Exception as e:
+        print(f"Ocurrió un error inesperado en agregar_a_lista_espera: {e}")
+        return None
+
+
+def obtener_lista_espera_por_cliente(dni_cliente: int) -> List[ListaEspera]:
+    """Obtiene las solicitudes en lista de espera de un cliente."""
+    try:
+        return list(ListaEspera
+                    .select(ListaEspera, TipoHabitacion)
+                    .join(TipoHabitacion)
+                    .where(ListaEspera.cliente == dni_cliente)
+                    .order_by(ListaEspera.creada_en.desc()))
+    except Exception as e:
+        print(f"Error al obtener la lista de espera del DNI {dni_cliente}: {e}")
+        return []
+
+
+# ==============================================================================
+# ASIGNACIÓN AUTOMÁTICA
+# ==============================================================================
+
+class IntervalosLibres:
+    """
+    Huecos libres de una habitación, como listas ordenadas de inicios y fines.
+    Permite saber en O(log n) si un rango entra completo en algún hueco, y
+    partir el hueco cuando se asigna.
+    """
+
+    def __init__(self, desde: date, hasta: date, ocupados):
+        self.inicios = []
+        self.fines = []
+        cursor = desde
+        for checkin, checkout in sorted(ocupados):
+            if checkin > cursor:
+                self.inicios.append(cursor)
+                self.fines.append(min(checkin, hasta))
+            cursor = max(cursor, checkout)
+        if cursor < hasta:
+            self.inicios.append(cursor)
+            self.fines.append(hasta)
+
+    def contiene(self, checkin: date, checkout: date) -> bool:
+        i = bisect.bisect_right(self.inicios, checkin) - 1
+        return i >= 0 and checkout <= self.fines[i]
+
+    def ocupar(self, checkin: date, checkout: date):
+        i = bisect.bisect_right(self.inicios, checkin) - 1
+        inicio, fin = self.inicios[i], self.fines[i]
+        del self.inicios[i], self.fines[i]
+        # Volvemos a insertar los pedazos que sobran a cada lado
+        if checkout < fin:
+            self.inicios.insert(i, checkout)
+            self.fines.insert(i, fin)
+        if inicio < checkin:
+            self.inicios.insert(i, inicio)
+            self.fines.insert(i, checkin)
+
+
+def asignar_lista_espera(habitacion_id: int, fecha_checkin: date, fecha_checkout: date) -> int:
+    """
+    Intenta cubrir pedidos pendientes con una habitación que se liberó
+    entre 'fecha_checkin' y 'fecha_checkout'.
+
+    Los pedidos se toman en orden de llegada (FIFO); los que empiezan antes
+    de hoy ya no se asignan. Con una consulta de reservas y otra de bloqueos
+    se arman los huecos libres de la habitación; cada pedido que entra
+    completo en un hueco se convierte en una reserva.
+    Devuelve la cantidad de pedidos asignados.
+    """
+    pendientes = ((ListaEspera.estado == 'Pendiente') &
+                  (ListaEspera.fecha_checkin < fecha_checkout) &
+                  (ListaEspera.fecha_checkout > fecha_checkin) &
+                  (ListaEspera.fecha_checkin >= date.today()))
+
+    # Chequeo previo sin lock: si no hay nadie esperando no tomamos el de escritura
+    hay_pendientes = (ListaEspera
+                      .select()
+                      .where(pendientes &
+                             (ListaEspera.tipo == Habitacion.select(Habitacion.tipo).where(Habitacion.id == habitacion_id)))
+                      .exists())
+    if not hay_pendientes:
+        return 0
+
+    asignados = 0
+    # Candidatos y habitación se leen dentro de la transacción IMMEDIATE:
+    # otro worker que procesa la misma liberación espera el lock y después
+    # ya no ve como 'Pendiente' los pedidos que asignó este.
+    with db.atomic('IMMEDIATE'):
+        habitacion = (Habitacion
+                      .select(Habitacion, TipoHabitacion)
+                      .join(TipoHabitacion)
+                      .where(Habitacion.id == habitacion_id)
+                      .first())
+        if not habitacion or habitacion.estado != 'Activa':
+            return 0
+
+        candidatos = list(ListaEspera
+                          .select()
+                          .where(pendientes & (ListaEspera.tipo == habitacion.tipo))
+                          .order_by(ListaEspera.creada_en, ListaEspera.id))
+        if not candidatos:
+            return 0
+
+        desde = min(c.fecha_checkin for c in candidatos)
+        hasta = max(c.fecha_checkout for c in candidatos)
+        ocupados = [(r.fecha_checkin, r.fecha_checkout) for r in (Reserva
+                    .select(Reserva.fecha_checkin, Reserva.fecha_checkout)
+                    .where(
+                        (Reserva.habitacion == habitacion) &
+                        (Reserva.fecha_checkin < hasta) &
+                        (Reserva.fecha_checkout > desde) &
+                        (Reserva.estado_reserva != 'Cancelada')
+                    ))]
+        ocupados += [(b.fecha_inicio, b.fecha_fin) for b in (BloqueoHabitacion
+                     .select(BloqueoHabitacion.fecha_inicio, BloqueoHabitacion.fecha_fin)
+                     .where(
+                         (BloqueoHabitacion.habitacion == habitacion) &
+                         (BloqueoHabitacion.fecha_inicio < hasta) &
+                         (BloqueoHabitacion.fecha_fin > desde)
+                     ))]
+        ocupados += [(r.fecha_checkin, r.fecha_checkout) for r in (RetencionHabitacion
+                     .select(RetencionHabitacion.fecha_checkin, RetencionHabitacion.fecha_checkout)
+                     .where(
+                         (RetencionHabitacion.habitacion == habitacion) &
+                         (RetencionHabitacion.fecha_checkin < hasta) &
+                         (RetencionHabitacion.fecha_checkout > desde) &
+                         (RetencionHabitacion.vence_en > time.time())
+                     ))]
+        libres = IntervalosLibres(desde, hasta, ocupados)
+
+        for solicitud in candidatos:
+            if not libres.contiene(solicitud.fecha_checkin, solicitud.fecha_checkout):
+                continue
+
+            dias_estadia = (solicitud.fecha_checkout - solicitud.fecha_checkin).days
+            reserva = Reserva.create(
+                cliente=solicitud.cliente_id,
+                habitacion=habitacion,
+                fecha_checkin=solicitud.fecha_checkin,
+                fecha_checkout=solicitud.fecha_checkout,
+                total_personas=solicitud.total_personas,
+                costo_total=dias_estadia * habitacion.tipo.tarifa_base,
+                estado_reserva='Confirmada'
+            )
+            solicitud.estado = 'Asignada'
+            solicitud.reserva = reserva
+            solicitud.save()
+            registrar_cambio_reservas_cliente(solicitud.cliente_id)
+            registrar_cambio_inventario(habitacion.tipo_id, solicitud.fecha_checkin, solicitud.fecha_checkout)
+            encolar_evento_reserva('reserva_creada', reserva, habitacion.numero)
+            libres.ocupar(solicitud.fecha_checkin, solicitud.fecha_checkout)
+            asignados += 1
+            print(f"Lista de espera: solicitud {solicitud.id} asignada (reserva {reserva.id}, habitación {habitacion.numero}).")
+
+    if asignados:
+        trabajador_outbox.despertar()
+    return asignados
+
+
+class TrabajadorListaEspera:
+    """
+    Hilo en segundo plano que procesa las habitaciones liberadas.
+    Cancelar o modificar una reserva solo encola (O(1)); el cruce con la
+    lista de espera se hace acá, fuera de la petición HTTP.
+    """
+
+    def __init__(self):
+        self._cola = queue.Queue()
+        self._hilo = None
+
+    def notificar(self, habitacion_id: int, fecha_checkin: date, fecha_checkout: date):
+        # Guardamos el hotel de la petición: el hilo trabaja contra esa misma BD
+        self._cola.put((propiedad_actual(), habitacion_id, fecha_checkin, fecha_checkout))
+
+    def iniciar(self):
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._hilo = threading.Thread(target=self._bucle, name="lista-espera", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        if self._hilo and self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join(timeout=5)
+
+    def _bucle(self):
+        while True:
+            item = self._cola.get()
+            if item is None:
+                break
+            propiedad, *liberacion = item
+            try:
+                with usar_propiedad(*propiedad):
+                    asignar_lista_espera(*liberacion)
+            except Exception as e:
+                print(f"Error procesando la lista de espera: {e}")
+        if not db.is_closed():
+            db.close()
+
+
+trabajador_lista_espera = TrabajadorListaEspera()
+
+
+def notificar_habitacion_liberada(habitacion_id: int, fecha_checkin: date, fecha_checkout: date):
+    """Encola una habitación liberada para revisar la lista de espera."""
+    trabajador_lista_espera.notificar(habitacion_id, fecha_checkin, fecha_checkout)
@@ -1,10 +1,63 @@
+import time
 from peewee import *
-from datetime import date
+from datetime import date, timedelta
 from typing import List
 
 # 1. Importa todos los modelos necesarios y la base de datos
-from ..models import Cliente, TipoHabitacion, Habitacion, Reserva
+from ..models import Cliente, TipoHabitacion, Habitacion, Reserva, ReservaHistorico, BloqueoHabitacion, RetencionHabitacion
 from ..database import db
+from .lista_espera_services import notificar_habitacion_liberada
+from ..cache import cache_tipos_habitacion, registrar_cambio, registrar_cambio_reservas_cliente
+from .ari_services import registrar_cambio_inventario
+from ..auditoria import auditar
+from ..outbox import encolar_evento_reserva, trabajador_outbox
+
+def obtener_todos_los_tipos_habitacion() -> List[TipoHabitacion]:
+    """
+    Obtiene el catálogo de tipos de habitación.
+    Casi nunca cambia, así que se guarda en la cache compartida.
+    """
+    try:
+        return cache_tipos_habitacion.obtener(
+            'todos',
+            lambda: list(TipoHabitacion.select().order_by(TipoHabitacion.id))
+        )
+    except Exception as e:
+        print(f"Error al obtener los tipos de habitación: {e}")
+        return []
+
+def buscar_habitacion_libre(tipo_hab: TipoHabitacion, fecha_checkin: date, fecha_checkout: date):
+    """
+    Primera habitación activa del tipo sin reservas, bloqueos ni retenciones
+    vigentes en [fecha_checkin, fecha_checkout), o None.
+    Llamar dentro de la transacción que va a ocupar la habitación.
+    """
+    reservas_solapadas = Reserva.select(Reserva.habitacion).where(
+        (Reserva.fecha_checkin < fecha_checkout) &
+        (Reserva.fecha_checkout > fecha_checkin) &
+        (Reserva.estado_reserva != 'Cancelada')
+    )
+
+    # Las habitaciones con un bloqueo (mantenimiento) en esas fechas tampoco sirven
+    habitaciones_bloqueadas = BloqueoHabitacion.select(BloqueoHabitacion.habitacion).where(
+        (BloqueoHabitacion.fecha_inicio < fecha_checkout) &
+        (BloqueoHabitacion.fecha_fin > fecha_checkin)
+    )
+
+    # Ni las que otro cliente tiene apartadas mientras termina de reservar
+    habitaciones_retenidas = RetencionHabitacion.select(RetencionHabitacion.habitacion).where(
+        (RetencionHabitacion.fecha_checkin < fecha_checkout) &
+        (RetencionHabitacion.fecha_checkout > fecha_checkin) &
+        (RetencionHabitacion.vence_en > time.time())
+    )
+
+    return Habitacion.select().where(
+        (Habitacion.tipo == tipo_hab) &
+        (Habitacion.estado == 'Activa') &
+        (Habitacion.id.not_in(reservas_solapadas)) &
+        (Habitacion.id.not_in(habitaciones_bloqueadas)) &
+        (Habitacion.id.not_in(habitaciones_retenidas))
+    ).first() # .first() nos da el primer resultado o None si no hay
 
 def crear_reserva(dni_cliente: int, tipo_habitacion_id: int, fecha_checkin: date, fecha_checkout: date, total_personas: int):
     """
@@ -22,7 +75,10 @@ def crear_reserva(dni_cliente: int, tipo_habitacion_id: int, fecha_checkin: date
     try:
         # 2. Usar db.atomic() para una transacción segura
         # O todo funciona, o nada se guarda si hay un error.
-        with db.atomic():
+        # IMMEDIATE toma el lock de escritura al empezar: si otra conexión
+        # (ej: el trabajador del outbox) escribe mientras leemos, esperamos
+        # con busy_timeout en vez de fallar con 'database is locked' al escribir.
+        with db.atomic('IMMEDIATE'):
             
             # 3. Obtener el tipo de habitación y verificar capacidad
             try:
@@ -37,20 +93,7 @@ def crear_reserva(dni_cliente: int, tipo_habitacion_id: int, fecha_checkin: date
                 print(f"Error: El número de personas ({total_personas}) excede la capacidad máxima ({tipo_hab.capacidad_maxima}).")
                 return None
 
-         
-            reservas_solapadas = Reserva.select(Reserva.habitacion).where(
-                (Reserva.fecha_checkin < fecha_checkout) &
-                (Reserva.fecha_checkout > fecha_checkin) &
-                (Reserva.estado_reserva != 'Cancelada') 
-            )
-          
-            habitaciones_ocupadas_ids = [r.habitacion.id for r in reservas_solapadas]
-            
-            habitacion_disponible = Habitacion.select().where(
-                (Habitacion.tipo == tipo_hab) &
-                (Habitacion.estado == 'Activa') &
-                (Habitacion.id.not_in(habitaciones_ocupadas_ids))
-            ).first() # .first() nos da el primer resultado o None si no hay
+            habitacion_disponible = buscar_habitacion_libre(tipo_hab, fecha_checkin, fecha_checkout)
 
             # Si no se encontró ninguna, no hay disponibilidad
             if not habitacion_disponible:
@@ -71,9 +114,14 @@ def crear_reserva(dni_cliente: int, tipo_habitacion_id: int, fecha_checkin: date
                 costo_total=costo_calculado,
                 estado_reserva='Confirmada' # Estado por defecto al crear
             )
+            registrar_cambio_reservas_cliente(dni_cliente)
+            registrar_cambio_inventario(tipo_hab.id, fecha_checkin, fecha_checkout)
+            # La confirmación sale del outbox, fuera de la petición
+            encolar_evento_reserva('reserva_creada', nueva_reserva, habitacion_disponible.numero)
             
-            print(f"¡Reserva {nueva_reserva.id} creada exitosamente para la habitación {habitacion_disponible.numero}!")
-            return nueva_reserva
+        trabajador_outbox.despertar()
+        print(f"¡Reserva {nueva_reserva.id} creada exitosamente para la habitación {habitacion_disponible.numero}!")
+        return nueva_reserva
 
     except IntegrityError as e:
         # Esto podría pasar si hay algún problema con las FK (ej. cliente no existe)
@@ -86,30 +134,190 @@ def crear_reserva(dni_cliente: int, tipo_habitacion_id: int, fecha_checkin: date
         return None
     
 
+# Tramos máximos de una estadía dividida (3 = el huésped cambia de habitación hasta dos veces)
+MAXIMO_TRAMOS_ESTADIA = 3
+
+
+def _plan_estadia_dividida(tipo_id: int, fecha_checkin: date, fecha_checkout: date):
+    """
+    Menor cantidad de tramos en habitaciones activas de 'tipo_id' que cubren
+    las noches [fecha_checkin, fecha_checkout). Devuelve una lista de
+    (habitacion_id, numero, desde, hasta), o None si alguna noche no tiene
+    ninguna habitación libre.
+
+    Para cada habitación se calcula hasta qué noche sigue libre desde cada
+    noche. Después, desde el check-in, se elige siempre la habitación que
+    llega más lejos (greedy de cobertura de intervalos: da el mínimo de
+    cambios). Son cuatro consultas y O(habitaciones x noches) en memoria.
+    """
+    noches = (fecha_checkout - fecha_checkin).days
+    habitaciones = dict(Habitacion
+                        .select(Habitacion.id, Habitacion.numero)
+                        .where((Habitacion.tipo == tipo_id) & (Habitacion.estado == 'Activa'))
+                        .order_by(Habitacion.id)
+                        .tuples())
+    if not habitaciones:
+        return None
+
+    ocupadas = {habitacion_id: bytearray(noches) for habitacion_id in habitaciones}
+    reservas = (Reserva
+                .select(Reserva.habitacion, Reserva.fecha_checkin, Reserva.fecha_checkout)
+                .where(
+                    (Reserva.habitacion.in_(list(habitaciones))) &
+                    (Reserva.fecha_checkin < fecha_checkout) &
+                    (Reserva.fecha_checkout > fecha_checkin) &
+                    (Reserva.estado_reserva != 'Cancelada')
+                )
+                .tuples())
+    bloqueos = (BloqueoHabitacion
+                .select(BloqueoHabitacion.habitacion, BloqueoHabitacion.fecha_inicio, BloqueoHabitacion.fecha_fin)
+                .where(
+                    (BloqueoHabitacion.habitacion.in_(list(habitaciones))) &
+                    (BloqueoHabitacion.fecha_inicio < fecha_checkout) &
+                    (BloqueoHabitacion.fecha_fin > fecha_checkin)
+                )
+                .tuples())
+    retenciones = (RetencionHabitacion
+                   .select(RetencionHabitacion.habitacion, RetencionHabitacion.fecha_checkin, RetencionHabitacion.fecha_checkout)
+                   .where(
+                       (RetencionHabitacion.habitacion.in_(list(habitaciones))) &
+                       (RetencionHabitacion.fecha_checkin < fecha_checkout) &
+                       (RetencionHabitacion.fecha_checkout > fecha_checkin) &
+                       (RetencionHabitacion.vence_en > time.time())
+                   )
+                   .tuples())
+    for consulta in (reservas, bloqueos, retenciones):
+        for habitacion_id, inicio, fin in consulta:
+            desde = max(0, (inicio - fecha_checkin).days)
+            hasta = min(noches, (fin - fecha_checkin).days)
+            if desde < hasta:
+                ocupadas[habitacion_id][desde:hasta] = b"\x01" * (hasta - desde)
+
+    # libre_hasta[h][i]: primera noche ocupada de 'h' desde la noche i (noches si ninguna)
+    libre_hasta = {}
+    for habitacion_id, marcas in ocupadas.items():
+        alcance, siguiente = [0] * noches, noches
+        for i in range(noches - 1, -1, -1):
+            if marcas[i]:
+                siguiente = i
+            alcance[i] = siguiente
+        libre_hasta[habitacion_id] = alcance
+
+    tramos, noche = [], 0
+    while noche < noches:
+        # En un empate gana la de menor id (el dict está ordenado por id)
+        elegida = max(libre_hasta, key=lambda h: libre_hasta[h][noche])
+        fin = libre_hasta[elegida][noche]
+        if fin == noche:
+            return None
+        tramos.append((elegida, habitaciones[elegida],
+                       fecha_checkin + timedelta(days=noche), fecha_checkin + timedelta(days=fin)))
+        noche = fin
+    return tramos
+
+
+def crear_reserva_dividida(dni_cliente: int, tipo_habitacion_id: int, fecha_checkin: date, fecha_checkout: date, total_personas: int):
+    """
+    Reserva una estadía cambiando de habitación (mismo tipo) cuando ninguna
+    está libre todas las noches. Usa la menor cantidad de tramos posible, hasta
+    MAXIMO_TRAMOS_ESTADIA, y los crea en una sola transacción, unidos por
+    'grupo_estadia' (el id del primer tramo).
+
+    Devuelve (lista de reservas ordenadas por fecha, mensaje_error).
+    """
+    if fecha_checkout <= fecha_checkin:
+        return None, "La fecha de check-out debe ser posterior a la de check-in."
+
+    try:
+        with db.atomic('IMMEDIATE'):
+            tipo_hab = TipoHabitacion.get_or_none(TipoHabitacion.id == tipo_habitacion_id)
+            if tipo_hab is None:
+                return None, f"El tipo de habitación {tipo_habitacion_id} no existe."
+            if total_personas > tipo_hab.capacidad_maxima:
+                return None, f"El número de personas ({total_personas}) excede la capacidad máxima ({tipo_hab.capacidad_maxima})."
+
+            plan = _plan_estadia_dividida(tipo_hab.id, fecha_checkin, fecha_checkout)
+            if plan is None:
+                return None, "No hay habitaciones de ese tipo libres en alguna de las noches."
+            if len(plan) > MAXIMO_TRAMOS_ESTADIA:
+                return None, f"La estadía necesitaría {len(plan)} habitaciones distintas (máximo {MAXIMO_TRAMOS_ESTADIA})."
+
+            tramos = []
+            for habitacion_id, numero, desde, hasta in plan:
+                tramo = Reserva.create(
+                    cliente=dni_cliente,
+                    habitacion=habitacion_id,
+                    fecha_checkin=desde,
+                    fecha_checkout=hasta,
+                    total_personas=total_personas,
+                    costo_total=(hasta - desde).days * tipo_hab.tarifa_base,
+                    estado_reserva='Confirmada',
+                    grupo_estadia=tramos[0].id if tramos else None
+                )
+                tramos.append(tramo)
+                encolar_evento_reserva('reserva_creada', tramo, numero)
+            if len(tramos) > 1:
+                Reserva.update(grupo_estadia=tramos[0].id).where(Reserva.id == tramos[0].id).execute()
+                tramos[0].grupo_estadia = tramos[0].id
+
+            registrar_cambio_reservas_cliente(dni_cliente)
+            registrar_cambio_inventario(tipo_hab.id, fecha_checkin, fecha_checkout)
+
+        trabajador_outbox.despertar()
+        print(f"¡Estadía dividida creada: reservas {[t.id for t in tramos]} "
+              f"en las habitaciones {[numero for _, numero, _, _ in plan]}!")
+        return tramos, None
+
+    except IntegrityError as e:
+        print(f"Error de integridad al crear la estadía dividida: {e}")
+        return None, "Error de integridad al crear la reserva."
+
+    except Exception as e:
+        print(f"Ocurrió un error inesperado en crear_reserva_dividida: {e}")
+        return None, f"Error interno: {e}"
+
+
 def obtener_reservas_por_cliente(dni_cliente: int) -> List[Reserva]:
     """
     Obtiene todas las reservas de un cliente específico.
     
     Realiza un JOIN para incluir los datos de la habitación 
     y el tipo de habitación, que son necesarios para el 
-    schema 'ReservaPublica' de la API.
+    schema 'ReservaPublica' de la API. Se seleccionan las tres tablas para
+    que serializar no dispare una consulta por reserva (N+1).
     """
     try:
       
         reservas_query = (Reserva
-                          .select()
+                          .select(Reserva, Habitacion, TipoHabitacion)
                           .join(Habitacion)
                           .join(TipoHabitacion)
                           .where(Reserva.cliente == dni_cliente)
                           .order_by(Reserva.fecha_checkin.desc())) # Opcional: ordenar
         
+        # Las reservas archivadas también son del cliente (búsqueda por índice de cliente)
+        historicas_query = (ReservaHistorico
+                            .select(ReservaHistorico, Habitacion, TipoHabitacion)
+                            .join(Habitacion)
+                            .join(TipoHabitacion)
+                            .where(ReservaHistorico.cliente == dni_cliente))
+        
         # 2. Devolvemos la lista de resultados
-        return list(reservas_query)
+        return _unir_con_historial(list(reservas_query), historicas_query, descendente=True)
 
     except Exception as e:
         print(f"Error al obtener reservas para el DNI {dni_cliente}: {e}")
         return [] # Devolver una lista vacía en caso de error
     
+def _datos_auditables(reserva) -> dict:
+    return {
+        "fecha_checkin": reserva.fecha_checkin,
+        "fecha_checkout": reserva.fecha_checkout,
+        "total_personas": reserva.total_personas,
+        "costo_total": reserva.costo_total,
+        "estado_reserva": reserva.estado_reserva,
+    }
+
 def modificar_reserva(reserva_id: int, dni_cliente: int, nueva_fecha_checkin: date, nueva_fecha_checkout: date, nuevo_total_personas: int):
     """
     Modifica una reserva existente, si es del cliente correcto
@@ -122,7 +330,7 @@ def modificar_reserva(reserva_id: int, dni_cliente: int, nueva_fecha_checkin: da
         return None
 
     try:
-        with db.atomic():
+        with db.atomic('IMMEDIATE'):
             # 2. Encontrar la reserva y verificar propiedad
             # Hacemos JOIN para obtener el tipo de habitación y su capacidad
             reserva = (Reserva
@@ -138,6 +346,11 @@ def modificar_reserva(reserva_id: int, dni_cliente: int, nueva_fecha_checkin: da
             if not reserva:
                 print(f"Error: No se encontró la reserva {reserva_id} o no pertenece al cliente {dni_cliente}.")
                 return None
+
+            # Cambiar las fechas de un tramo rompería la continuidad de la estadía
+            if reserva.grupo_estadia is not None:
+                print(f"Error: La reserva {reserva_id} es parte de una estadía dividida; hay que cancelarla y reservar de nuevo.")
+                return None
             
             # 3. Verificar nueva capacidad
             tipo_hab = reserva.habitacion.tipo
@@ -156,7 +369,20 @@ def modificar_reserva(reserva_id: int, dni_cliente: int, nueva_fecha_checkin: da
                 (Reserva.id != reserva_id) # <-- Excluir esta misma reserva
             )
 
-            if reservas_solapadas.exists():
+            bloqueos_solapados = BloqueoHabitacion.select().where(
+                (BloqueoHabitacion.habitacion == reserva.habitacion) &
+                (BloqueoHabitacion.fecha_inicio < nueva_fecha_checkout) &
+                (BloqueoHabitacion.fecha_fin > nueva_fecha_checkin)
+            )
+
+            retenciones_solapadas = RetencionHabitacion.select().where(
+                (RetencionHabitacion.habitacion == reserva.habitacion) &
+                (RetencionHabitacion.fecha_checkin < nueva_fecha_checkout) &
+                (RetencionHabitacion.fecha_checkout > nueva_fecha_checkin) &
+                (RetencionHabitacion.vence_en > time.time())
+            )
+
+            if reservas_solapadas.exists() or bloqueos_solapados.exists() or retenciones_solapadas.exists():
                 print(f"Error: La habitación {reserva.habitacion.numero} no está disponible para las nuevas fechas.")
                 return None
                 
@@ -166,15 +392,30 @@ def modificar_reserva(reserva_id: int, dni_cliente: int, nueva_fecha_checkin: da
             dias_estadia = (nueva_fecha_checkout - nueva_fecha_checkin).days
             costo_calculado = dias_estadia * tipo_hab.tarifa_base
 
+            fechas_anteriores = (reserva.fecha_checkin, reserva.fecha_checkout)
+            antes = _datos_auditables(reserva)
+
             reserva.fecha_checkin = nueva_fecha_checkin
             reserva.fecha_checkout = nueva_fecha_checkout
             reserva.total_personas = nuevo_total_personas
             reserva.costo_total = costo_calculado
             
             reserva.save()
+            registrar_cambio_reservas_cliente(dni_cliente)
+            if fechas_anteriores != (nueva_fecha_checkin, nueva_fecha_checkout):
+                registrar_cambio_inventario(tipo_hab.id, *fechas_anteriores)
+                registrar_cambio_inventario(tipo_hab.id, nueva_fecha_checkin, nueva_fecha_checkout)
+            encolar_evento_reserva('reserva_modificada', reserva, reserva.habitacion.numero)
             
-            print(f"Reserva {reserva_id} modificada exitosamente.")
-            return reserva
+        trabajador_outbox.despertar()
+        auditar(f"cliente:{dni_cliente}", 'reserva', reserva_id, 'modificar', antes, _datos_auditables(reserva))
+
+        # Si cambiaron las fechas, parte del rango anterior pudo quedar libre
+        if fechas_anteriores != (nueva_fecha_checkin, nueva_fecha_checkout):
+            notificar_habitacion_liberada(reserva.habitacion_id, *fechas_anteriores)
+
+        print(f"Reserva {reserva_id} modificada exitosamente.")
+        return reserva
 
     except Exception as e:
         print(f"Ocurrió un error inesperado en modificar_reserva: {e}")
@@ -183,10 +424,11 @@ def modificar_reserva(reserva_id: int, dni_cliente: int, nueva_fecha_checkin: da
 def cancelar_reserva(reserva_id: int, dni_cliente: int):
     """
     Cambia el estado de una reserva a 'Cancelada'.
-    Verifica que la reserva pertenezca al cliente.
+    Verifica que la reserva pertenezca al cliente. Si es un tramo de una
+    estadía dividida, se cancelan todos los tramos.
     """
     try:
-        with db.atomic():
+        with db.atomic('IMMEDIATE'):
             reserva = Reserva.get_or_none(
                 (Reserva.id == reserva_id) &
                 (Reserva.cliente == dni_cliente)
@@ -200,17 +442,42 @@ def cancelar_reserva(reserva_id: int, dni_cliente: int):
                 print(f"La reserva {reserva_id} ya estaba cancelada.")
                 return reserva
 
-            reserva.estado_reserva = 'Cancelada'
-            reserva.save()
+            tramos = [reserva]
+            if reserva.grupo_estadia is not None:
+                tramos += list(Reserva.select().where(
+                    (Reserva.cliente == dni_cliente) &
+                    (Reserva.grupo_estadia == reserva.grupo_estadia) &
+                    (Reserva.id != reserva.id) &
+                    (Reserva.estado_reserva != 'Cancelada')
+                ))
+
+            cambios = []
+            for tramo in tramos:
+                antes = _datos_auditables(tramo)
+                tramo.estado_reserva = 'Cancelada'
+                tramo.save()
+                registrar_cambio_inventario(tramo.habitacion.tipo_id, tramo.fecha_checkin, tramo.fecha_checkout)
+                encolar_evento_reserva('reserva_cancelada', tramo, tramo.habitacion.numero)
+                cambios.append((tramo, antes))
+            registrar_cambio_reservas_cliente(dni_cliente)
             
-            print(f"Reserva {reserva_id} cancelada exitosamente.")
-            return reserva
+        trabajador_outbox.despertar()
+        for tramo, antes in cambios:
+            auditar(f"cliente:{dni_cliente}", 'reserva', tramo.id, 'cancelar', antes, _datos_auditables(tramo))
+
+            # Con la transacción ya confirmada, la habitación queda libre
+            # para la lista de espera (se procesa en segundo plano)
+            notificar_habitacion_liberada(tramo.habitacion_id, tramo.fecha_checkin, tramo.fecha_checkout)
+
+        print(f"Reserva {reserva_id} cancelada exitosamente"
+              f"{f' (con {len(tramos) - 1} tramos más de la estadía)' if len(tramos) > 1 else ''}.")
+        return reserva
 
     except Exception as e:
         print(f"Ocurrió un error inesperado en cancelar_reserva: {e}")
         return None
     
-def obtener_reservas_por_dni_admin(dni_cliente: int) -> List[Reserva]:
+def obtener_reservas_por_dni_admin(dni_cliente: int, base_datos=None) -> List[Reserva]:
     """
     (Admin) Obtiene todas las reservas de un DNI de cliente específico.
     
@@ -218,10 +485,11 @@ def obtener_reservas_por_dni_admin(dni_cliente: int) -> List[Reserva]:
     necesarios para el schema 'ReservaPublicaAdmin'.
     
     (Ahora filtra las canceladas)
+    Si se pasa 'base_datos' (snapshot de reportes), las consultas se hacen ahí.
     """
     try:
         query = (Reserva
-                 .select()
+                 .select(Reserva, Cliente, Habitacion, TipoHabitacion)
                  .join(Cliente)
                  .switch(Reserva) 
                  .join(Habitacion)
@@ -230,23 +498,35 @@ def obtener_reservas_por_dni_admin(dni_cliente: int) -> List[Reserva]:
                      (Reserva.cliente == dni_cliente) & 
                      (Reserva.estado_reserva != 'Cancelada')
                  )
-                 .order_by(Reserva.fecha_checkin.desc()))
+                 .order_by(Reserva.fecha_checkin.desc())
+                 .bind(base_datos or db))
     
+        historicas_query = (ReservaHistorico
+                            .select(ReservaHistorico, Cliente, Habitacion, TipoHabitacion)
+                            .join(Cliente)
+                            .switch(ReservaHistorico)
+                            .join(Habitacion)
+                            .join(TipoHabitacion)
+                            .where(
+                                (ReservaHistorico.cliente == dni_cliente) &
+                                (ReservaHistorico.estado_reserva != 'Cancelada')
+                            )
+                            .bind(base_datos or db))
         
-        return list(query)
+        return _unir_con_historial(list(query), historicas_query, descendente=True)
 
     except Exception as e:
         print(f"Error al obtener reservas (admin) para DNI {dni_cliente}: {e}")
         return []
 
-def obtener_reservas_por_fechas_admin(fecha_inicio: date, fecha_fin: date) -> List[Reserva]:
+def obtener_reservas_por_fechas_admin(fecha_inicio: date, fecha_fin: date, base_datos=None) -> List[Reserva]:
     """
     (Admin) Obtiene todas las reservas entre un rango de fechas.
-    ...
+    Si se pasa 'base_datos' (snapshot de reportes), las consultas se hacen ahí.
     """
     try:
         query = (Reserva
-                 .select()
+                 .select(Reserva, Cliente, Habitacion, TipoHabitacion)
                  .join(Cliente)
                  .switch(Reserva)
                  .join(Habitacion)
@@ -256,9 +536,159 @@ def obtener_reservas_por_fechas_admin(fecha_inicio: date, fecha_fin: date) -> Li
                      (Reserva.fecha_checkout > fecha_inicio) &
                      (Reserva.estado_reserva != 'Cancelada')
                  )
-                 .order_by(Reserva.fecha_checkin.asc()))
-        return list(query)
+                 .order_by(Reserva.fecha_checkin.asc())
+                 .bind(base_datos or db))
+        reservas = list(query)
+
+        # Solo consultamos el historial si el rango llega a fechas ya archivadas
+        if not _rango_requiere_historial(fecha_inicio, base_datos):
+            return reservas
+
+        historicas_query = (ReservaHistorico
+                            .select(ReservaHistorico, Cliente, Habitacion, TipoHabitacion)
+                            .join(Cliente)
+                            .switch(ReservaHistorico)
+                            .join(Habitacion)
+                            .join(TipoHabitacion)
+                            .where(
+                                (ReservaHistorico.fecha_checkin < fecha_fin) &
+                                (ReservaHistorico.fecha_checkout > fecha_inicio) &
+                                (ReservaHistorico.estado_reserva != 'Cancelada')
+                            )
+                            .bind(base_datos or db))
+        return _unir_con_historial(reservas, historicas_query, descendente=False)
 
     except Exception as e:
         print(f"Error al obtener reservas (admin) por fechas: {e}")
         return []
+
+
+
+# ==============================================================================
+# TRANSICIONES DE ESTADO (tarea programada)
+# ==============================================================================
+
+def actualizar_estados_reservas(hoy: date = None):
+    """
+    Pasa las reservas a 'En curso' (check-in alcanzado) y a 'Finalizada'
+    (check-out alcanzado). Son dos UPDATE en lote, no un save() por fila.
+    Devuelve (cantidad_en_curso, cantidad_finalizadas).
+    """
+    hoy = hoy or date.today()
+    with db.atomic():
+        en_curso = (Reserva
+                    .update(estado_reserva='En curso')
+                    .where(
+                        (Reserva.estado_reserva == 'Confirmada') &
+                        (Reserva.fecha_checkin <= hoy) &
+                        (Reserva.fecha_checkout > hoy)
+                    )
+                    .execute())
+        finalizadas = (Reserva
+                       .update(estado_reserva='Finalizada')
+                       .where(
+                           (Reserva.estado_reserva.in_(['Confirmada', 'En curso'])) &
+                           (Reserva.fecha_checkout <= hoy)
+                       )
+                       .execute())
+        if en_curso or finalizadas:
+            # Toca a muchos clientes a la vez: en vez de un contador por
+            # cliente se sube uno global que también forma parte del ETag
+            registrar_cambio('reservas_clientes')
+
+    if en_curso or finalizadas:
+        print(f"Estados actualizados: {en_curso} en curso, {finalizadas} finalizadas.")
+    return en_curso, finalizadas
+
+
+# ==============================================================================
+# ARCHIVADO DE RESERVAS (reservas -> reservas_historico)
+# ==============================================================================
+
+DIAS_ANTES_DE_ARCHIVAR = 30
+TAMANO_LOTE_ARCHIVADO = 5000
+
+_CAMPOS_ARCHIVADOS = [
+    'id', 'cliente', 'habitacion', 'fecha_checkin', 'fecha_checkout',
+    'total_personas', 'costo_total', 'estado_reserva', 'creada_en', 'grupo_estadia',
+]
+
+
+def _rango_requiere_historial(fecha_inicio: date, base_datos=None) -> bool:
+    """
+    Indica si un rango que empieza en 'fecha_inicio' puede incluir reservas
+    archivadas (no canceladas). Usa el índice de fecha_checkout del historial.
+    """
+    ultimo_checkout = (ReservaHistorico
+                       .select(fn.MAX(ReservaHistorico.fecha_checkout))
+                       .where(ReservaHistorico.estado_reserva != 'Cancelada')
+                       .bind(base_datos or db)
+                       .scalar())
+    return ultimo_checkout is not None and fecha_inicio < ultimo_checkout
+
+
+def _unir_con_historial(reservas: list, historicas_query, descendente: bool) -> list:
+    """Agrega las reservas del historial (si hay) y reordena por check-in."""
+    historicas = list(historicas_query)
+    if not historicas:
+        return reservas
+    combinadas = reservas + historicas
+    combinadas.sort(key=lambda r: r.fecha_checkin, reverse=descendente)
+    return combinadas
+
+
+def archivar_reservas(dias_antiguedad: int = DIAS_ANTES_DE_ARCHIVAR, tamano_lote: int = TAMANO_LOTE_ARCHIVADO) -> int:
+    """
+    Mueve a 'reservas_historico' las reservas canceladas y las que hicieron
+    check-out hace más de 'dias_antiguedad' días.
+
+    Trabaja en lotes (INSERT ... SELECT + DELETE por lote, cada uno en su
+    propia transacción) para no bloquear la BD durante mucho tiempo.
+    Devuelve la cantidad de reservas archivadas.
+    """
+    fecha_corte = date.today() - timedelta(days=dias_antiguedad)
+    condicion = (
+        (Reserva.fecha_checkout < fecha_corte) |
+        (Reserva.estado_reserva == 'Cancelada')
+    )
+    campos_origen = [getattr(Reserva, campo) for campo in _CAMPOS_ARCHIVADOS]
+    campos_destino = [getattr(ReservaHistorico, campo) for campo in _CAMPOS_ARCHIVADOS]
+
+    total_archivadas = 0
+    try:
+        # SQLite asigna los ids nuevos como MAX(id) + 1: si nunca archivamos la
+        # reserva con el id más alto, un id archivado no puede volver a usarse.
+        id_maximo = Reserva.select(fn.MAX(Reserva.id)).scalar()
+        if id_maximo is None:
+            return 0
+        condicion = condicion & (Reserva.id < id_maximo)
+
+        while True:
+            # IMMEDIATE: una reserva confirmada entre el SELECT y el INSERT
+            # haría fallar el lote con 'database is locked' (no espera)
+            with db.atomic('IMMEDIATE'):
+                ids_lote = [r.id for r in (Reserva
+                                           .select(Reserva.id)
+                                           .where(condicion)
+                                           .order_by(Reserva.id)
+                                           .limit(tamano_lote))]
+                if not ids_lote:
+                    break
+
+                # Mismo filtro acotado por rango de ids (nadie escribe en el
+                # medio): sin un parámetro por id, que con lotes grandes pasa
+                # el límite de variables de SQLite
+                filtro_lote = condicion & Reserva.id.between(ids_lote[0], ids_lote[-1])
+                (ReservaHistorico
+                 .insert_from(Reserva.select(*campos_origen).where(filtro_lote), campos_destino)
+                 .execute())
+                Reserva.delete().where(filtro_lote).execute()
+
+            total_archivadas += len(ids_lote)
+
+        print(f"Archivado terminado: {total_archivadas} reservas movidas al historial.")
+        return total_archivadas
+
+    except Exception as e:
+        print(f"Ocurrió un error inesperado al archivar reservas: {e}")
+        return total_archivadas
@@ -0,0 +1,262 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import date
+
+from peewee import IntegrityError
+
+from ..models import TipoHabitacion, Habitacion, Reserva, BloqueoHabitacion, RetencionHabitacion
+from ..database import db, propiedad_actual, usar_propiedad
+from ..cache import registrar_cambio_reservas_cliente
+from .ari_services import registrar_cambio_inventario
+from .lista_espera_services import notificar_habitacion_liberada
+from .reserva_services import buscar_habitacion_libre
+from ..outbox import encolar_evento_reserva, trabajador_outbox
+
+
+# ==============================================================================
+# RETENCIONES DE INVENTARIO (HABITACIÓN APARTADA MIENTRAS SE RESERVA)
+# ==============================================================================
+
+# Minutos que dura una retención si el cliente no pide otra cosa
+MINUTOS_RETENCION = int(os.getenv("HOTEL_MINUTOS_RETENCION", "10"))
+MAXIMO_MINUTOS_RETENCION = 30
+
+# Retenciones vigentes por cliente (evita que uno solo aparte todo el hotel)
+MAXIMO_RETENCIONES_CLIENTE = 2
+
+
+def crear_retencion(dni_cliente: int, tipo_habitacion_id: int, fecha_checkin: date, fecha_checkout: date,
+                    total_personas: int, minutos: int = MINUTOS_RETENCION):
+    """
+    Aparta una habitación libre del tipo por 'minutos' minutos. Mientras la
+    retención está vigente ninguna otra reserva, estadía dividida ni
+    asignación de la lista de espera puede tomar esa habitación en esas fechas.
+
+    Devuelve (retencion, mensaje_error).
+    """
+    if fecha_checkout <= fecha_checkin:
+        return None, "La fecha de check-out debe ser posterior a la de check-in."
+    minutos = max(1, min(minutos, MAXIMO_MINUTOS_RETENCION))
+
+    try:
+        with db.atomic('IMMEDIATE'):
+            tipo_hab = TipoHabitacion.get_or_none(TipoHabitacion.id == tipo_habitacion_id)
+            if tipo_hab is None:
+                return None, f"El tipo de habitación {tipo_habitacion_id} no existe."
+            if total_personas > tipo_hab.capacidad_maxima:
+                return None, f"El número de personas ({total_personas}) excede la capacidad máxima ({tipo_hab.capacidad_maxima})."
+
+            vigentes = (RetencionHabitacion
+                        .select()
+                        .where((RetencionHabitacion.cliente == dni_cliente) &
+                               (RetencionHabitacion.vence_en > time.time()))
+                        .count())
+            if vigentes >= MAXIMO_RETENCIONES_CLIENTE:
+                return None, f"Ya tiene {vigentes} retenciones vigentes (máximo {MAXIMO_RETENCIONES_CLIENTE})."
+
+            habitacion = buscar_habitacion_libre(tipo_hab, fecha_checkin, fecha_checkout)
+            if habitacion is None:
+                return None, "No hay habitaciones de ese tipo disponibles para las fechas seleccionadas."
+
+            retencion = RetencionHabitacion.create(
+                cliente=dni_cliente,
+                habitacion=habitacion,
+                fecha_checkin=fecha_checkin,
+                fecha_checkout=fecha_checkout,
+                total_personas=total_personas,
+                vence_en=time.time() + minutos * 60
+            )
+
+        vencimiento_retenciones.agregar(retencion)
+        print(f"Retención {retencion.id}: habitación {habitacion.numero} apartada {minutos} minutos.")
+        return retencion, None
+
+    except IntegrityError as e:
+        print(f"Error de integridad al crear la retención: {e}")
+        return None, "Error de integridad al crear la retención."
+
+    except Exception as e:
+        print(f"Ocurrió un error inesperado en crear_retencion: {e}")
+        return None, f"Error interno: {e}"
+
+
+def liberar_retencion(retencion_id: int, dni_cliente: int) -> bool:
+    """Suelta una retención del cliente antes de que venza. True si existía."""
+    try:
+        with db.atomic('IMMEDIATE'):
+            retencion = RetencionHabitacion.get_or_none(
+                (RetencionHabitacion.id == retencion_id) &
+                (RetencionHabitacion.cliente == dni_cliente)
+            )
+            if retencion is None:
+                return False
+            retencion.delete_instance()
+
+        if retencion.vence_en > time.time():
+            notificar_habitacion_liberada(retencion.habitacion_id, retencion.fecha_checkin, retencion.fecha_checkout)
+        return True
+
+    except Exception as e:
+        print(f"Ocurrió un error inesperado en liberar_retencion: {e}")
+        return False
+
+
+def confirmar_retencion(retencion_id: int, dni_cliente: int):
+    """
+    Convierte una retención vigente en una reserva confirmada.
+    No busca disponibilidad: mientras la retención estuvo vigente ninguna
+    reserva pudo ocupar esa habitación en esas fechas, así que alcanza con
+    leer la fila (un lookup por clave primaria), confirmar que un admin no
+    la sacó de servicio y crear la reserva.
+
+    Devuelve (reserva, mensaje_error).
+    """
+    try:
+        with db.atomic('IMMEDIATE'):
+            retencion = (RetencionHabitacion
+                         .select(RetencionHabitacion, Habitacion, TipoHabitacion)
+                         .join(Habitacion)
+                         .join(TipoHabitacion)
+                         .where(
+                             (RetencionHabitacion.id == retencion_id) &
+                             (RetencionHabitacion.cliente == dni_cliente) &
+                             (RetencionHabitacion.vence_en > time.time())
+                         ).first())
+            if retencion is None:
+                return None, "La retención no existe o ya venció."
+
+            habitacion = retencion.habitacion
+            tipo_hab = habitacion.tipo
+            # Un admin pudo pasar la habitación a mantenimiento mientras tanto
+            # (o bloquearla en esas fechas: una consulta por el índice de la habitación)
+            bloqueada = BloqueoHabitacion.select().where(
+                (BloqueoHabitacion.habitacion == habitacion) &
+                (BloqueoHabitacion.fecha_inicio < retencion.fecha_checkout) &
+                (BloqueoHabitacion.fecha_fin > retencion.fecha_checkin)
+            ).exists()
+            if habitacion.estado != 'Activa' or bloqueada:
+                retencion.delete_instance()
+                return None, f"La habitación {habitacion.numero} ya no está disponible."
+
+            reserva = Reserva.create(
+                cliente=dni_cliente,
+                habitacion=habitacion,
+                fecha_checkin=retencion.fecha_checkin,
+                fecha_checkout=retencion.fecha_checkout,
+                total_personas=retencion.total_personas,
+                costo_total=(retencion.fecha_checkout - retencion.fecha_checkin).days * tipo_hab.tarifa_base,
+                estado_reserva='Confirmada'
+            )
+            retencion.delete_instance()
+            registrar_cambio_reservas_cliente(dni_cliente)
+            registrar_cambio_inventario(tipo_hab.id, retencion.fecha_checkin, retencion.fecha_checkout)
+            encolar_evento_reserva('reserva_creada', reserva, habitacion.numero)
+
+        trabajador_outbox.despertar()
+        print(f"¡Reserva {reserva.id} creada desde la retención {retencion_id} (habitación {habitacion.numero})!")
+        return reserva, None
+
+    except IntegrityError as e:
+        print(f"Error de integridad al confirmar la retención: {e}")
+        return None, "Error de integridad al crear la reserva."
+
+    except Exception as e:
+        print(f"Ocurrió un error inesperado en confirmar_retencion: {e}")
+        return None, f"Error interno: {e}"
+
+
+def podar_retenciones() -> int:
+    """
+    Borra las retenciones vencidas de la BD actual. Normalmente las borra
+    VencimientoRetenciones al vencer; esto limpia las de un worker que se
+    reinició antes (igual ya no contaban para la disponibilidad).
+    """
+    with db.atomic('IMMEDIATE'):
+        borradas = RetencionHabitacion.delete().where(RetencionHabitacion.vence_en <= time.time()).execute()
+    if borradas:
+        print(f"Retenciones: {borradas} vencidas borradas.")
+    return borradas
+
+
+class VencimientoRetenciones:
+    """
+    Hilo que borra cada retención cuando vence y avisa a la lista de espera.
+
+    Las retenciones creadas en este proceso van a un heap ordenado por
+    'vence_en': agregar y sacar la próxima son O(log n), y el hilo duerme
+    hasta el próximo vencimiento (o hasta que llega una que vence antes).
+    Las confirmadas o liberadas antes de tiempo quedan en el heap y se
+    descartan al salir (su fila ya no está). Las consultas de disponibilidad
+    no dependen de este hilo: todas filtran por 'vence_en'.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._orden = itertools.count()  # desempate: las propiedades no se comparan
+        self._condicion = threading.Condition()
+        self._hilo = None
+        self._detenido = False
+        self.vencidas = 0
+
+    def agregar(self, retencion):
+        # Guardamos el hotel de la petición: el hilo borra en esa misma BD
+        item = (retencion.vence_en, next(self._orden), propiedad_actual(), retencion.id,
+                retencion.habitacion_id, retencion.fecha_checkin, retencion.fecha_checkout)
+        with self._condicion:
+            heapq.heappush(self._heap, item)
+            if self._heap[0] is item:
+                self._condicion.notify()
+
+    def iniciar(self):
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._detenido = False
+        self._hilo = threading.Thread(target=self._bucle, name="retenciones", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        if self._hilo and self._hilo.is_alive():
+            with self._condicion:
+                self._detenido = True
+                self._condicion.notify()
+            self._hilo.join(timeout=5)
+
+    def _proximas_vencidas(self) -> list:
+        """Espera hasta que venza al menos una retención y las saca del heap. [] al detener."""
+        with self._condicion:
+            while not self._detenido:
+                if self._heap and self._heap[0][0] <= time.time():
+                    vencidas = []
+                    while self._heap and self._heap[0][0] <= time.time():
+                        vencidas.append(heapq.heappop(self._heap))
+                    return vencidas
+                self._condicion.wait(self._heap[0][0] - time.time() if self._heap else None)
+            return []
+
+    def _bucle(self):
+        while True:
+            vencidas = self._proximas_vencidas()
+            if not vencidas:
+                break
+            for vence_en, _, propiedad, retencion_id, habitacion_id, fecha_checkin, fecha_checkout in vencidas:
+                try:
+                    with usar_propiedad(*propiedad):
+                        # SQLite reutiliza ids borrados: 'vence_en' asegura que es la misma fila
+                        borradas = (RetencionHabitacion
+                                    .delete()
+                                    .where((RetencionHabitacion.id == retencion_id) &
+                                           (RetencionHabitacion.vence_en == vence_en))
+                                    .execute())
+                        if borradas:
+                            self.vencidas += 1
+                            notificar_habitacion_liberada(habitacion_id, fecha_checkin, fecha_checkout)
+                except Exception as e:
+                    print(f"Error al vencer la retención {retencion_id}: {e}")
+        if not db.is_closed():
+            db.close()
+
+
+vencimiento_retenciones = VencimientoRetenciones()
@@ -0,0 +1,137 @@
+import hashlib
+import hmac
+import secrets
+from datetime import datetime, timedelta
+
+from ..models import TokenRefresco
+from ..database import db
+from ..cache import registrar_cambio, cache_tokens_revocados
+
+
+DIAS_EXPIRACION_REFRESCO = 30
+
+
+def _hash_id(token_id: str) -> str:
+    return hashlib.sha256(token_id.encode()).hexdigest()
+
+
+def _firma(token_id: str, clave: str) -> str:
+    return hmac.new(clave.encode(), token_id.encode(), hashlib.sha256).hexdigest()
+
+
+def emitir_token_refresco(sujeto: str, es_admin: bool, clave: str, familia: str = None):
+    """
+    Crea un refresh token '<id>.<firma>' y guarda el hash del id.
+    Sin 'familia' se abre una nueva (un login nuevo).
+    Devuelve (token, familia).
+    """
+    token_id = secrets.token_urlsafe(24)
+    familia = familia or secrets.token_hex(16)
+    TokenRefresco.create(
+        id_hash=_hash_id(token_id),
+        familia=familia,
+        sujeto=sujeto,
+        es_admin=es_admin,
+        vence_en=datetime.utcnow() + timedelta(days=DIAS_EXPIRACION_REFRESCO)
+    )
+    return f"{token_id}.{_firma(token_id, clave)}", familia
+
+
+def _buscar_token(token: str, clave: str):
+    """Verifica la firma (sin tocar la BD) y busca el token por el hash de su id."""
+    token_id, _, firma = token.partition(".")
+    if not token_id or not hmac.compare_digest(firma, _firma(token_id, clave)):
+        return None
+    return TokenRefresco.get_or_none(TokenRefresco.id_hash == _hash_id(token_id))
+
+
+def rotar_token_refresco(token: str, clave: str):
+    """
+    Canjea un refresh token por uno nuevo de la misma familia.
+    Devuelve ((sujeto, es_admin, familia, token_nuevo), None) o (None, mensaje_error).
+
+    Si el token ya había sido usado, alguien lo copió: se revoca la familia
+    entera (el dueño legítimo también tendrá que volver a iniciar sesión).
+    """
+    try:
+        # IMMEDIATE: el segundo de dos canjes simultáneos espera al primero y
+        # su UPDATE condicional no marca nada (reuso), en vez de fallar con
+        # 'database is locked' al pasar de lectura a escritura
+        with db.atomic('IMMEDIATE'):
+            registro = _buscar_token(token, clave)
+            if registro is None:
+                return None, "Refresh token inválido"
+            if registro.revocado:
+                return None, "Refresh token revocado"
+            if registro.vence_en < datetime.utcnow():
+                return None, "Refresh token vencido"
+
+            # El UPDATE condicional evita que dos canjes simultáneos ganen los dos
+            marcados = (TokenRefresco
+                        .update(usado=True)
+                        .where((TokenRefresco.id_hash == registro.id_hash) &
+                               (TokenRefresco.usado == False))
+                        .execute())
+            if not marcados:
+                _revocar(TokenRefresco.familia == registro.familia)
+                print(f"Reuso de refresh token detectado: familia {registro.familia} revocada.")
+                return None, "Refresh token reutilizado; sesión revocada"
+
+            nuevo, _ = emitir_token_refresco(registro.sujeto, registro.es_admin, clave, familia=registro.familia)
+
+        return (registro.sujeto, registro.es_admin, registro.familia, nuevo), None
+
+    except Exception as e:
+        print(f"Ocurrió un error inesperado en rotar_token_refresco: {e}")
+        return None, "Error interno al refrescar el token"
+
+
+def _revocar(condicion) -> int:
+    """Marca como revocados los tokens que cumplen 'condicion' (dentro de una transacción)."""
+    revocados = TokenRefresco.update(revocado=True).where(condicion & (TokenRefresco.revocado == False)).execute()
+    if revocados:
+        registrar_cambio('tokens_revocados')
+    return revocados
+
+
+def revocar_token_refresco(token: str, clave: str) -> bool:
+    """Cierra la sesión: revoca la familia del token. Devuelve False si el token no es válido."""
+    with db.atomic('IMMEDIATE'):
+        registro = _buscar_token(token, clave)
+        if registro is None:
+            return False
+        _revocar(TokenRefresco.familia == registro.familia)
+    cache_tokens_revocados.invalidar()
+    return True
+
+
+def revocar_tokens_de_sujeto(sujeto: str, es_admin: bool = False) -> int:
+    """
+    Revoca todas las sesiones de un usuario (ej: cambió la contraseña).
+    Llamar dentro de la transacción del cambio.
+    """
+    return _revocar((TokenRefresco.sujeto == sujeto) & (TokenRefresco.es_admin == es_admin))
+
+
+def familias_revocadas() -> frozenset:
+    """
+    Familias revocadas que todavía no vencieron. Se consulta en cada petición
+    autenticada, así que se sirve desde la cache compartida.
+    """
+    return cache_tokens_revocados.obtener('familias', lambda: frozenset(
+        fila[0] for fila in (TokenRefresco
+                             .select(TokenRefresco.familia)
+                             .where((TokenRefresco.revocado == True) &
+                                    (TokenRefresco.vence_en > datetime.utcnow()))
+                             .distinct()
+                             .tuples())
+    ))
+
+
+def podar_tokens_vencidos() -> int:
+    """Borra los refresh tokens vencidos (ya no sirven ni para detectar reuso)."""
+    with db.atomic():
+        borrados = TokenRefresco.delete().where(TokenRefresco.vence_en < datetime.utcnow()).execute()
+    if borrados:
+        print(f"Refresh tokens vencidos borrados: {borrados}.")
+    return borrados
@@ -0,0 +1,31 @@
+import pytest
+from peewee import SqliteDatabase
+
+from src.database import PRAGMAS_SQLITE, usar_propiedad
+from src.esquema import verificar_esquema, sembrar_datos_iniciales
+from src.models import Cliente, Habitacion
+
+
+@pytest.fixture
+def bd(tmp_path):
+    """BD nueva y sembrada por test; los modelos apuntan a ella mientras dura."""
+    base = SqliteDatabase(str(tmp_path / "hotel.db"), pragmas=PRAGMAS_SQLITE)
+    with usar_propiedad(None, base):
+        verificar_esquema()
+        sembrar_datos_iniciales()
+        for dni in (1, 2, 3):
+            Cliente.create(dni=dni, nombre="Cliente", apellido=str(dni), email=f"c{dni}@test.com",
+                           password="x", telefono="123")
+        yield base
+    base.close()
+
+
+@pytest.fixture
+def habitaciones(bd):
+    """
+    Deja activas solo las tres primeras habitaciones del tipo 1 (101, 102 y
+    103) y devuelve sus ids, para armar la ocupación a mano.
+    """
+    ids = [h.id for h in Habitacion.select().where(Habitacion.tipo == 1).order_by(Habitacion.numero)]
+    Habitacion.update(estado='Mantenimiento').where(Habitacion.id.in_(ids[3:])).execute()
+    return ids[:3]
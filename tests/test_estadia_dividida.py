@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+
+from src.models import Reserva
+from src.services.reserva_services import (
+    _plan_estadia_dividida, crear_reserva_dividida, cancelar_reserva, MAXIMO_TRAMOS_ESTADIA
+)
+
+CHECKIN = date(2030, 3, 1)
+
+
+def noche(n: int) -> date:
+    return CHECKIN + timedelta(days=n)
+
+
+def ocupar(habitacion_id: int, desde: int, hasta: int, dni: int = 3):
+    return Reserva.create(cliente=dni, habitacion=habitacion_id, fecha_checkin=noche(desde),
+                          fecha_checkout=noche(hasta), total_personas=1, costo_total=0,
+                          estado_reserva='Confirmada')
+
+
+def test_noche_sin_ninguna_habitacion_libre(habitaciones):
+    for habitacion_id in habitaciones:
+        ocupar(habitacion_id, 2, 3)
+
+    assert _plan_estadia_dividida(1, noche(0), noche(5)) is None
+
+
+def test_elige_la_menor_cantidad_de_tramos(habitaciones):
+    a, b, c = habitaciones
+    # a libre 0-2, b libre 0-4, c libre 3-6. Tomar siempre la primera libre
+    # daría tres tramos (a, b, c); el óptimo son dos: b hasta la noche 4 y c.
+    ocupar(a, 2, 6)
+    ocupar(b, 4, 6)
+    ocupar(c, 0, 3)
+
+    plan = _plan_estadia_dividida(1, noche(0), noche(6))
+
+    assert [(h, desde, hasta) for h, _, desde, hasta in plan] == [(b, noche(0), noche(4)), (c, noche(4), noche(6))]
+
+
+def test_no_usa_habitaciones_inactivas(habitaciones):
+    a, b, c = habitaciones
+    ocupar(a, 0, 4)
+    ocupar(b, 0, 4)
+    ocupar(c, 0, 4)
+
+    # Las otras siete del tipo están en mantenimiento
+    assert _plan_estadia_dividida(1, noche(0), noche(4)) is None
+
+
+def test_rechaza_planes_con_mas_tramos_que_el_maximo(habitaciones):
+    a, b, c = habitaciones
+    # Cada habitación libre de a una noche en rotación: hace falta un tramo por noche
+    noches = MAXIMO_TRAMOS_ESTADIA + 1
+    for n in range(noches):
+        for h in (a, b, c):
+            if h != habitaciones[n % 3]:
+                ocupar(h, n, n + 1)
+
+    assert len(_plan_estadia_dividida(1, noche(0), noche(noches))) == noches
+    tramos, error = crear_reserva_dividida(1, 1, noche(0), noche(noches), 1)
+
+    assert tramos is None
+    assert f"máximo {MAXIMO_TRAMOS_ESTADIA}" in error
+    assert Reserva.select().where(Reserva.cliente == 1).count() == 0
+
+
+def test_crea_los_tramos_unidos_por_grupo(habitaciones):
+    a, b, c = habitaciones
+    ocupar(a, 2, 6)
+    ocupar(b, 4, 6)
+    ocupar(c, 0, 3)
+
+    tramos, error = crear_reserva_dividida(1, 1, noche(0), noche(6), 2)
+
+    assert error is None
+    assert [(t.habitacion_id, t.fecha_checkin, t.fecha_checkout) for t in tramos] == [
+        (b, noche(0), noche(4)), (c, noche(4), noche(6))
+    ]
+    assert {t.grupo_estadia for t in tramos} == {tramos[0].id}
+    assert sum(t.costo_total for t in tramos) == 6 * 9000
+
+
+def test_cancelar_un_tramo_cancela_toda_la_estadia(habitaciones):
+    a, b, c = habitaciones
+    ocupar(a, 2, 6)
+    ocupar(b, 4, 6)
+    ocupar(c, 0, 3)
+    otra = ocupar(a, 0, 1, dni=1)
+    tramos, _ = crear_reserva_dividida(1, 1, noche(1), noche(6), 1)
+
+    assert cancelar_reserva(tramos[-1].id, 1) is not None
+
+    estados = {r.id: r.estado_reserva for r in Reserva.select().where(Reserva.cliente == 1)}
+    assert all(estados[t.id] == 'Cancelada' for t in tramos)
+    # Otra reserva del mismo cliente, fuera del grupo, no se toca
+    assert estados[otra.id] == 'Confirmada'
@@ -0,0 +1,29 @@
+from src.limitador import ip_cliente, LimitadorTokenBucket
+
+
+def test_sin_proxies_confiables_se_usa_la_ip_de_la_conexion():
+    assert ip_cliente("10.0.0.1", "1.2.3.4", proxies=0) == "10.0.0.1"
+
+
+def test_detras_de_un_proxy_se_usa_la_ip_que_agrego():
+    assert ip_cliente("10.0.0.1", "1.2.3.4", proxies=1) == "1.2.3.4"
+    # Lo que el cliente escribió a la izquierda no cuenta
+    assert ip_cliente("10.0.0.1", "6.6.6.6, 1.2.3.4", proxies=1) == "1.2.3.4"
+
+
+def test_con_dos_proxies_se_salta_el_intermedio():
+    assert ip_cliente("10.0.0.1", "6.6.6.6, 1.2.3.4, 10.0.0.2", proxies=2) == "1.2.3.4"
+
+
+def test_sin_cabecera_se_usa_la_ip_de_la_conexion():
+    assert ip_cliente("10.0.0.1", None, proxies=1) == "10.0.0.1"
+    assert ip_cliente("10.0.0.1", " , ", proxies=1) == "10.0.0.1"
+
+
+def test_cada_ip_tiene_su_balde():
+    limitador = LimitadorTokenBucket(capacidad=2, recarga_por_segundo=0.001)
+    assert limitador.consumir("ip:1.2.3.4") == 0
+    assert limitador.consumir("ip:1.2.3.4") == 0
+    assert limitador.consumir("ip:1.2.3.4") > 0
+    # Otro cliente detrás del mismo proxy no se ve afectado
+    assert limitador.consumir("ip:5.6.7.8") == 0
@@ -0,0 +1,49 @@
+import threading
+from datetime import date, timedelta
+
+from src.database import db, propiedad_actual, usar_propiedad
+from src.models import Reserva, ListaEspera
+from src.services.lista_espera_services import agregar_a_lista_espera, asignar_lista_espera
+
+CHECKIN = date(2030, 3, 1)
+CHECKOUT = date(2030, 3, 4)
+
+
+def test_asigna_en_orden_de_llegada(habitaciones):
+    primera = agregar_a_lista_espera(1, 1, CHECKIN, CHECKOUT, 1)
+    segunda = agregar_a_lista_espera(2, 1, CHECKIN, CHECKOUT, 1)
+
+    assert asignar_lista_espera(habitaciones[0], CHECKIN, CHECKOUT) == 1
+    assert ListaEspera.get_by_id(primera.id).estado == 'Asignada'
+    assert ListaEspera.get_by_id(segunda.id).estado == 'Pendiente'
+    # Una segunda pasada por la misma liberación ya no encuentra lugar
+    assert asignar_lista_espera(habitaciones[0], CHECKIN, CHECKOUT) == 0
+
+
+def test_no_asigna_pedidos_que_ya_empezaron(habitaciones):
+    ayer = date.today() - timedelta(days=1)
+    solicitud = agregar_a_lista_espera(1, 1, ayer, ayer + timedelta(days=3), 1)
+
+    assert asignar_lista_espera(habitaciones[0], ayer, ayer + timedelta(days=3)) == 0
+    assert ListaEspera.get_by_id(solicitud.id).estado == 'Pendiente'
+
+
+def test_dos_workers_no_asignan_dos_veces_el_mismo_pedido(habitaciones):
+    solicitud = agregar_a_lista_espera(1, 1, CHECKIN, CHECKOUT, 1)
+    propiedad = propiedad_actual()
+    resultados = []
+
+    def worker(habitacion_id):
+        with usar_propiedad(*propiedad):
+            resultados.append(asignar_lista_espera(habitacion_id, CHECKIN, CHECKOUT))
+            db.close()
+
+    hilos = [threading.Thread(target=worker, args=(h,)) for h in habitaciones[:2]]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert sorted(resultados) == [0, 1]
+    assert Reserva.select().where(Reserva.cliente == 1).count() == 1
+    assert ListaEspera.get_by_id(solicitud.id).estado == 'Asignada'
@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from src import propiedades
+from src.database import hotel_actual
+from src.models import LeaseTarea
+from src.planificador import Planificador, Tarea
+from src.propiedades import shards_hoteles
+
+
+@pytest.fixture
+def dos_hoteles(bd, tmp_path, monkeypatch):
+    monkeypatch.setattr(propiedades, "DIRECTORIO_HOTELES", str(tmp_path / "hoteles"))
+    shards_hoteles.crear("norte")
+    shards_hoteles.crear("sur")
+    yield
+    shards_hoteles.reiniciar()
+
+
+def test_la_tarea_por_hotel_corre_en_cada_bd_con_su_lease(dos_hoteles):
+    vistos = []
+    tarea = Tarea("podar", lambda: vistos.append(hotel_actual()), intervalo=60, por_hotel=True)
+
+    Planificador._en_cada_hotel(tarea, time.time() + 60)
+
+    assert vistos == [None, "norte", "sur"]
+    assert sorted(l.nombre for l in LeaseTarea.select()) == ["podar", "podar:norte", "podar:sur"]
+
+
+def test_un_hotel_con_el_lease_tomado_se_omite(dos_hoteles):
+    LeaseTarea.create(nombre="podar:norte", dueno="otro-worker", vence_en=time.time() + 60)
+    vistos = []
+    tarea = Tarea("podar", lambda: vistos.append(hotel_actual()), intervalo=60, por_hotel=True)
+
+    Planificador._en_cada_hotel(tarea, time.time() + 60)
+
+    assert vistos == [None, "sur"]
+    assert tarea.omitidas == 1
+
+
+def test_un_hotel_que_falla_no_frena_a_los_demas(dos_hoteles):
+    vistos = []
+
+    def funcion():
+        if hotel_actual() == "norte":
+            raise RuntimeError("falla")
+        vistos.append(hotel_actual())
+
+    tarea = Tarea("podar", funcion, intervalo=60, por_hotel=True)
+    with pytest.raises(RuntimeError):
+        Planificador._en_cada_hotel(tarea, time.time() + 60)
+    assert vistos == [None, "sur"]
@@ -0,0 +1,200 @@
+import io
+import json
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from src.models import Reserva, RetencionHabitacion, BloqueoHabitacion
+from src.services.reserva_services import crear_reserva, crear_reserva_dividida, modificar_reserva
+from src.services.admin_services import admin_crear_bloqueo_habitacion
+from src.services.importacion_services import importar_reservas
+from src.services.retencion_services import (
+    crear_retencion, confirmar_retencion, liberar_retencion, podar_retenciones,
+    VencimientoRetenciones, MAXIMO_RETENCIONES_CLIENTE
+)
+
+CHECKIN = date(2030, 3, 1)
+CHECKOUT = date(2030, 3, 4)
+
+
+def retener(dni=1, checkin=CHECKIN, checkout=CHECKOUT):
+    retencion, error = crear_retencion(dni, 1, checkin, checkout, 1)
+    assert error is None
+    return retencion
+
+
+def vencer(retencion):
+    RetencionHabitacion.update(vence_en=time.time() - 1).where(RetencionHabitacion.id == retencion.id).execute()
+
+
+@pytest.fixture
+def una_habitacion(bd):
+    """Solo la 101 activa en el tipo 1."""
+    from src.models import Habitacion
+    primera = Habitacion.select().where(Habitacion.tipo == 1).order_by(Habitacion.numero).first()
+    Habitacion.update(estado='Mantenimiento').where((Habitacion.tipo == 1) & (Habitacion.id != primera.id)).execute()
+    return primera.id
+
+
+def test_la_habitacion_retenida_no_se_ofrece_a_otro(una_habitacion):
+    retencion = retener()
+
+    assert retencion.habitacion_id == una_habitacion
+    assert crear_reserva(2, 1, CHECKIN, CHECKOUT, 1) is None
+    assert crear_reserva_dividida(2, 1, CHECKIN, CHECKOUT, 1)[0] is None
+    assert crear_retencion(2, 1, CHECKIN, CHECKOUT, 1)[0] is None
+    # Fuera de las fechas retenidas sí está libre
+    assert crear_reserva(2, 1, CHECKOUT, CHECKOUT + timedelta(days=2), 1) is not None
+
+
+def test_modificar_no_pisa_una_retencion(una_habitacion):
+    reserva = crear_reserva(2, 1, CHECKOUT, CHECKOUT + timedelta(days=2), 1)
+    retener()
+
+    assert modificar_reserva(reserva.id, 2, CHECKIN, CHECKOUT + timedelta(days=2), 1) is None
+
+
+def test_una_retencion_vencida_no_cuenta(una_habitacion):
+    vencer(retener())
+
+    assert crear_reserva(2, 1, CHECKIN, CHECKOUT, 1) is not None
+    assert podar_retenciones() == 1
+
+
+def test_maximo_de_retenciones_por_cliente(habitaciones):
+    for _ in range(MAXIMO_RETENCIONES_CLIENTE):
+        retener()
+
+    retencion, error = crear_retencion(1, 1, CHECKIN, CHECKOUT, 1)
+    assert retencion is None
+    assert "retenciones vigentes" in error
+
+
+def test_confirmar_crea_la_reserva_en_la_habitacion_retenida(una_habitacion):
+    retencion = retener()
+
+    reserva, error = confirmar_retencion(retencion.id, 1)
+
+    assert error is None
+    assert (reserva.habitacion_id, reserva.fecha_checkin, reserva.fecha_checkout) == (una_habitacion, CHECKIN, CHECKOUT)
+    assert reserva.costo_total == 3 * 9000
+    assert RetencionHabitacion.select().count() == 0
+    # Solo una vez, y solo su dueño
+    assert confirmar_retencion(retencion.id, 1)[0] is None
+
+
+def test_no_se_confirma_una_retencion_ajena_ni_vencida(una_habitacion):
+    retencion = retener()
+    assert confirmar_retencion(retencion.id, 2)[0] is None
+
+    vencer(retencion)
+    assert confirmar_retencion(retencion.id, 1)[0] is None
+    assert Reserva.select().count() == 0
+
+
+def test_liberar(una_habitacion):
+    retencion = retener()
+
+    assert liberar_retencion(retencion.id, 2) is False
+    assert liberar_retencion(retencion.id, 1) is True
+    assert liberar_retencion(retencion.id, 1) is False
+    assert crear_reserva(2, 1, CHECKIN, CHECKOUT, 1) is not None
+
+
+def test_bloquear_la_habitacion_anula_la_retencion(una_habitacion):
+    retencion = retener()
+
+    resultado, _ = admin_crear_bloqueo_habitacion(una_habitacion, CHECKIN, CHECKOUT)
+
+    assert resultado["bloqueo"] is not None
+    assert confirmar_retencion(retencion.id, 1)[0] is None
+    assert Reserva.select().count() == 0
+
+
+def test_no_se_confirma_sobre_un_bloqueo(una_habitacion):
+    retencion = retener()
+    # Un bloqueo que no pasó por admin_crear_bloqueo_habitacion (ej: otro proceso en carrera)
+    BloqueoHabitacion.create(habitacion=una_habitacion, fecha_inicio=CHECKIN + timedelta(days=1),
+                             fecha_fin=CHECKOUT + timedelta(days=1))
+
+    reserva, error = confirmar_retencion(retencion.id, 1)
+
+    assert reserva is None
+    assert "no está disponible" in error
+    assert Reserva.select().count() == 0
+
+
+def test_reasignar_no_mueve_reservas_a_una_habitacion_retenida(habitaciones):
+    a, b, c = habitaciones
+    retencion = retener()                                   # cliente 1 retiene la 101
+    reserva = crear_reserva(2, 1, CHECKIN, CHECKOUT, 1)     # cliente 2 queda en la 102
+    assert (retencion.habitacion_id, reserva.habitacion_id) == (a, b)
+
+    resultado, _ = admin_crear_bloqueo_habitacion(b, CHECKIN, CHECKOUT, reasignar=True)
+
+    assert [r.habitacion_id for r in resultado["reasignadas"]] == [c]
+    confirmada, error = confirmar_retencion(retencion.id, 1)
+    assert error is None
+    ocupadas = [r.habitacion_id for r in Reserva.select().where(Reserva.estado_reserva == 'Confirmada')]
+    assert sorted(ocupadas) == [a, c]
+
+
+def test_reasignar_falla_si_el_unico_destino_esta_retenido(habitaciones):
+    a, b, c = habitaciones
+    retener()                                               # 101
+    crear_reserva(2, 1, CHECKIN, CHECKOUT, 1)               # 102
+    retener(dni=3)                                          # 103
+
+    resultado, error = admin_crear_bloqueo_habitacion(b, CHECKIN, CHECKOUT, reasignar=True)
+
+    assert resultado["bloqueo"] is None
+    assert "No hay habitaciones" in error
+
+
+def test_la_importacion_rechaza_filas_sobre_una_retencion(una_habitacion):
+    retener()
+    archivo = io.StringIO(json.dumps({"dni": 2, "habitacion": "101", "fecha_checkin": str(CHECKIN),
+                                      "fecha_checkout": str(CHECKOUT), "total_personas": 1}) + "\n")
+
+    resumen = importar_reservas(archivo, 'ndjson', io.StringIO())
+
+    assert (resumen["importadas"], resumen["rechazadas"]) == (0, 1)
+
+
+def test_el_hilo_de_vencimiento_borra_la_retencion(una_habitacion):
+    vencimiento = VencimientoRetenciones()
+    vencimiento.iniciar()
+    try:
+        retencion = retener()
+        RetencionHabitacion.update(vence_en=time.time() + 0.2).where(RetencionHabitacion.id == retencion.id).execute()
+        vencimiento.agregar(RetencionHabitacion.get_by_id(retencion.id))
+
+        limite = time.time() + 5
+        while vencimiento.vencidas == 0 and time.time() < limite:
+            time.sleep(0.05)
+    finally:
+        vencimiento.detener()
+
+    assert vencimiento.vencidas == 1
+    assert RetencionHabitacion.select().count() == 0
+
+
+def test_el_hilo_de_vencimiento_no_borra_una_fila_con_el_id_reutilizado(una_habitacion):
+    vencimiento = VencimientoRetenciones()
+    vieja = retener()
+    vieja.vence_en = time.time() + 0.2
+    vencimiento.agregar(vieja)
+    # La vieja se confirmó y SQLite reutilizó su id para una nueva
+    confirmar_retencion(vieja.id, 1)
+    nueva = retener(checkin=CHECKOUT, checkout=CHECKOUT + timedelta(days=1))
+    assert nueva.id == vieja.id
+
+    vencimiento.iniciar()
+    try:
+        time.sleep(0.5)
+    finally:
+        vencimiento.detener()
+
+    assert vencimiento.vencidas == 0
+    assert RetencionHabitacion.get_or_none(RetencionHabitacion.id == nueva.id) is not None